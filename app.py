@@ -1,15 +1,8 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from dotenv import load_dotenv
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.memory import ConversationBufferMemory
-from shoppinggpt.router.lib_semantic_router import (
-    SemanticRouter,
-    PRODUCT_ROUTE_NAME,
-    CHITCHAT_ROUTE_NAME
-)
-from shoppinggpt.chain import create_chitchat_chain
-from shoppinggpt.agent import ShoppingAgent
+from shoppinggpt.service import ShoppingAssistant
+from shoppinggpt.tracing import TRACER
 
 # Load environment variables
 load_dotenv()
@@ -17,45 +10,16 @@ load_dotenv(r"E:\chatbot\ShoppingGPT\.env")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-# LLM and Embedding setup
-LLM = ChatGoogleGenerativeAI(temperature=0, model="gemini-1.5-flash")
-
-# Memory setup
-SHARED_MEMORY = ConversationBufferMemory(return_messages=True)
-
-# Initialize SemanticRouter
-SEMANTIC_ROUTER = SemanticRouter()
+# LLM, memory and router are built on first use so that importing the app
+# (and serving static pages) does not load LangChain or semantic_router.
+# For production, serve the same assistant with `python -m shoppinggpt.asgi`.
+assistant = ShoppingAssistant("gemini")
 
 app = Flask(__name__)
 
 def handle_query(query: str) -> dict:
     """Handle user query and return response."""
-    guided_route = SEMANTIC_ROUTER.guide(query)
-    
-    if guided_route == CHITCHAT_ROUTE_NAME:
-        chitchat_chain = create_chitchat_chain(LLM, SHARED_MEMORY)
-        response = chitchat_chain.invoke({"input": query})
-    elif guided_route == PRODUCT_ROUTE_NAME:
-        agent = ShoppingAgent(LLM, SHARED_MEMORY)
-        response = agent.invoke(query)
-    else:
-        response = "Unknown query type"
-    
-    # Get content from response
-    content = (
-        response.content if hasattr(response, 'content')
-        else response['output'] if isinstance(response, dict) and 'output' in response
-        else str(response)
-    )
-    
-    # Update shared memory
-    SHARED_MEMORY.chat_memory.add_user_message(query)
-    SHARED_MEMORY.chat_memory.add_ai_message(content)
-    
-    return {
-        'response': content,
-        'type': guided_route
-    }
+    return assistant.handle_query(query)
 
 @app.route('/')
 def home():
@@ -69,5 +33,9 @@ def get_bot_response():
     print(f"Bot response: {response}")
     return jsonify(response)
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(TRACER.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
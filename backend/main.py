@@ -1,13 +1,13 @@
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
-import pandas as pd
+import sys
 from dotenv import load_dotenv
 from langchain_community.chat_models import AzureChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage
 import logging
 import json
-import re
 from typing import Dict, Any, List, Optional
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationChain
@@ -15,8 +15,28 @@ import uuid
 from fastapi import Depends
 from openai.types import embedding_model
 
+# The backend is started from backend/ (see start.sh); make the shared
+# shoppinggpt package importable from there.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shoppinggpt.accounting import attribute, usage_report
+from shoppinggpt.catalog.payloads import CatalogPayloads, negotiate
+from shoppinggpt.catalog.bundles import BundleEngine, BundleWeights, DEFAULT_WEIGHTS, explain
+from shoppinggpt.catalog.index import CatalogIndex
+from shoppinggpt.catalog.snapshot import CatalogStore
+from shoppinggpt.llm.json_stream import ainvoke_recommendation, astream_recommendation
+from shoppinggpt.llm.prompt_budget import CATALOG, HISTORY, TOOL_OUTPUT, Part, budget_for, budget_stats, fit_prompt, model_of
+from shoppinggpt.llm.rate_limit import RateLimitExceeded, limiter_stats
+from shoppinggpt.llm.singleflight import coalescing_stats
+from shoppinggpt.llm.factory import create_llm
+from shoppinggpt.llm.wrappers import PooledChatModel
+from shoppinggpt.loop_lag import LoopLagMonitor
+from shoppinggpt.tracing import TRACER, span, traced
+
 load_dotenv()
 
+# Ask providers that support it for schema-constrained JSON output
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() == "true"
+
 app = FastAPI()
 
 # CORS for frontend - explicitly add localhost:3000
@@ -33,17 +53,15 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Load products/plans from CSV - use try/except to catch file not found errors
-try:
-    devices_df = pd.read_csv("data/devices.csv")
-    plans_df = pd.read_csv("data/plans.csv")
-except FileNotFoundError:
-    import os
-    print(f"Current working directory: {os.getcwd()}")
-    print("Error: CSV files not found. Make sure data/devices.csv and data/plans.csv exist.")
-    # Create empty dataframes as fallback
-    devices_df = pd.DataFrame(columns=["id", "name", "brand", "color", "storage", "price", "image", "features"])
-    plans_df = pd.DataFrame(columns=["id", "name", "type", "price", "data", "features"])
+# Devices and plans are compiled from the CSVs into a memory-mapped snapshot
+# shared by all workers, and swapped in when a CSV changes (see startup).
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+catalog = CatalogStore(
+    {"devices": os.path.join(DATA_DIR, "devices.csv"), "plans": os.path.join(DATA_DIR, "plans.csv")},
+    os.getenv("CATALOG_SNAPSHOT", os.path.join(DATA_DIR, "catalog.snapshot")),
+    poll_interval=float(os.getenv("CATALOG_POLL_INTERVAL", "1")),
+)
+catalog.refresh()
 
 # First, add this import if not already present
 from langchain.schema import HumanMessage, SystemMessage
@@ -62,11 +80,11 @@ try:
     # Override with environment variable that LangChain expects
     os.environ["OPENAI_API_VERSION"] = api_version
     
-    chat_model = AzureChatOpenAI(
-        azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        api_version=api_version,
+    # Azure by default; LLM_PROVIDERS=azure,gemini,... builds a latency-aware
+    # provider pool. Identical concurrent prompts (e.g. the same first
+    # question during a campaign spike) share a single upstream call.
+    chat_model = create_llm(
+        "azure",
         temperature=0.7,  # Higher temperature for more creative responses
     )
 
@@ -89,26 +107,42 @@ except Exception as e:
 def read_root():
     return {"status": "ok", "message": "ShoppingGPT API is running"}
 
-@app.get("/api/devices")
-def get_devices():
-    if devices_df.empty:
-        return []
-    devices = devices_df.copy()
-    # Handle case where features might be missing or not a string
-    devices["features"] = devices["features"].apply(
-        lambda x: x.split(";") if isinstance(x, str) else []
+# The frontend fetches these on every page load: serve JSON prebuilt per
+# catalog version and answer revalidations with 304.
+catalog_payloads = CatalogPayloads(catalog, ("devices", "plans"))
+
+def catalog_response(name: str, request: Request) -> Response:
+    status, body, headers = negotiate(
+        catalog_payloads.get(name),
+        request.headers.get("if-none-match"),
+        request.headers.get("accept-encoding"),
     )
-    return devices.to_dict(orient="records")
+    return Response(content=body, status_code=status, headers=headers, media_type="application/json")
+
+@app.get("/api/devices")
+async def get_devices(request: Request):
+    return catalog_response("devices", request)
 
 @app.get("/api/plans")
-def get_plans():
-    if plans_df.empty:
-        return []
-    plans = plans_df.copy()
-    plans["features"] = plans["features"].apply(
-        lambda x: x.split(";") if isinstance(x, str) else []
-    )
-    return plans.to_dict(orient="records")
+async def get_plans(request: Request):
+    return catalog_response("plans", request)
+
+@app.get("/api/search")
+def search_catalog(q: str = "", limit: Optional[int] = None):
+    """Devices and plans matching constraints parsed from `q`, cheapest first."""
+    return {"version": catalog.version, **catalog_index().search(q, limit)}
+
+@app.get("/api/metrics/catalog")
+def get_catalog_metrics():
+    return {**catalog.stats(), "payloads": catalog_payloads.stats()}
+
+@app.on_event("startup")
+def start_catalog_watcher():
+    catalog.start()
+
+@app.on_event("shutdown")
+def stop_catalog_watcher():
+    catalog.stop()
 
 # Test the Azure OpenAI connection at startup
 def test_azure_openai_connection() -> bool:
@@ -149,76 +183,76 @@ def get_conversation_memory(session_id: str = None):
     return session_id, conversation_memories[session_id]
 
 # Helper function to format devices and plans for prompt
-def format_devices_for_prompt():
-    devices_text = "Available Devices:\n"
-    for _, device in devices_df.iterrows():
-        features = device["features"].split(";") if isinstance(device["features"], str) else []
-        devices_text += f"- {device['name']} (id:{device['id']}, brand:{device['brand']}): €{device['price']} - {', '.join(features)}\n"
-    return devices_text
-
-def format_plans_for_prompt():
-    plans_text = "Available Plans:\n"
-    for _, plan in plans_df.iterrows():
-        features = plan["features"].split(";") if isinstance(plan["features"], str) else []
-        plans_text += f"- {plan['name']} (id:{plan['id']}, type:{plan['type']}): €{plan['price']} - {plan['data']} - {', '.join(features)}\n"
-    return plans_text
+def device_line(device) -> str:
+    return f"- {device['name']} (id:{device['id']}, brand:{device['brand']}): €{device['price']} - {', '.join(device['features'])}\n"
 
-# Updated chat endpoint with session management
-@app.post("/api/chat")
-async def chat(request: Request):
-    try:
-        data = await request.json()
-        user_message = data.get("message", "")
-        session_id = data.get("session_id", None)
-        reset_conversation = data.get("reset", False)
-        
-        logger.info(f"Received chat request with message: '{user_message}', session_id: {session_id}, reset: {reset_conversation}")
-        
-        # Reset conversation if requested
-        if reset_conversation and session_id in conversation_memories:
-            del conversation_memories[session_id]
-            logger.info(f"Reset conversation for session {session_id}")
-            return {"response": "Conversation has been reset.", "session_id": session_id, "reset": True}
-        
-        # Get or create conversation memory
-        session_id, memory = get_conversation_memory(session_id)
-        
-        # If Azure OpenAI is not available, return a mock response
-        if not azure_openai_available or chat_model is None:
-            logger.warning("Azure OpenAI unavailable, returning mock response")
-            mock_result = {
-                "response": "I found these options based on your request.",
-                "devices": [
-                    {"id": "1", "name": "iPhone 15 Pro", "reasoning": "High-end device with excellent camera and performance."},
-                    {"id": "2", "name": "Galaxy S24", "reasoning": "Great Android option with AI features and good value."}
-                ],
-                "plans": [
-                    {"id": "101", "name": "MagentaMobil S", "reasoning": "Good balance of data and price."}
-                ],
-                "session_id": session_id
-            }
-            return mock_result
-            
-        # Dynamically generate device and plan information
-        devices_context = format_devices_for_prompt()
-        plans_context = format_plans_for_prompt()
-        
-        # Get conversation history
-        history = memory.load_memory_variables({})
-        history_text = history.get("history", "")
-        
-        # Create system prompt for the LLM with dynamic data
-        system_message = SystemMessage(content=f"""You are a mobile phone shopping assistant for customers. Help them find the best phone and plan based on their needs.
+def plan_line(plan) -> str:
+    return f"- {plan['name']} (id:{plan['id']}, type:{plan['type']}): €{plan['price']} - {plan['data']} - {', '.join(plan['features'])}\n"
+
+@catalog.cached
+def format_devices_for_prompt(snapshot):
+    return "Available Devices:\n" + "".join(device_line(device) for device in snapshot.table("devices").records())
+
+@catalog.cached
+def format_plans_for_prompt(snapshot):
+    return "Available Plans:\n" + "".join(plan_line(plan) for plan in snapshot.table("plans").records())
 
-{devices_context}
-{plans_context}
+catalog_index = catalog.cached(CatalogIndex)
 
+def catalog_context_for(message: str):
+    """Device and plan prompt sections, narrowed to the products matching the message.
+
+    Constraints parsed from the message (budget, features, brand, storage,
+    data) pre-filter each list; without constraints, or if nothing
+    matches, the full list is used.
+    """
+    index = catalog_index()
+    constraints = index.parse(message)
+    devices = index.devices.search(constraints["devices"]) if constraints["devices"] else []
+    plans = index.plans.search(constraints["plans"]) if constraints["plans"] else []
+    devices_context = (
+        "Devices matching the customer's request:\n" + "".join(device_line(device) for device in devices)
+        if devices else format_devices_for_prompt()
+    )
+    plans_context = (
+        "Plans matching the customer's request:\n" + "".join(plan_line(plan) for plan in plans)
+        if plans else format_plans_for_prompt()
+    )
+    return devices_context, plans_context
+
+@catalog.cached
+def bundle_engine(snapshot):
+    return BundleEngine(catalog_index())
+
+def rank_bundles(message: str, top: int = 3, weights: BundleWeights = DEFAULT_WEIGHTS):
+    return bundle_engine().rank(catalog_index().parse(message), top, weights)
+
+def picks_from_bundles(bundles, kind: str):
+    """Distinct devices or plans of the ranked bundles, in rank order, in the chat response shape."""
+    picks = {}
+    for b in bundles:
+        picks.setdefault(b[f"{kind}_id"], {"id": str(b[f"{kind}_id"]), "name": b[kind], "reasoning": explain(b)})
+    return list(picks.values())
+
+def format_bundles_for_prompt(bundles) -> str:
+    lines = [
+        f"{rank}. {b['device']} (id:{b['device_id']}) + {b['plan']} (id:{b['plan_id']}), "
+        f"score {b['score']:.2f}: {', '.join(b['reasons']) or 'good overall match'}\n"
+        for rank, b in enumerate(bundles, 1)
+    ]
+    return "Ranked bundles for this request (best first):\n" + "".join(lines)
+
+CHAT_SYSTEM_PROMPT = """You are a mobile phone shopping assistant for customers. Help them find the best phone and plan based on their needs.
+
+{devices}
+{plans}
+{bundles}
 CONVERSATION HISTORY:
-{history_text}
+{history}
 
 INSTRUCTIONS:
 1. If the user needs to provide more details for a good recommendation, ask specific clarifying questions.
-2. Only recommend products from the available list.
+2. Only recommend products from the available list. The ranked bundles are already scored for this request: recommend them in that order and use their reasons in your explanation instead of ranking products yourself.
 3. Always include device ID and plan ID in your recommendations.
 4. If the user's query is vague, don't guess - ask for clarification.
 
@@ -243,50 +277,114 @@ Respond with your recommendation in this JSON format:
 }}
 
 If you need more information, set needs_clarification to true and ask specific questions.
-""")
+"""
 
-        user_msg = HumanMessage(content=user_message)
-        
-        # Log the request being sent to Azure OpenAI
-        logger.info("Sending request to Azure OpenAI")
+def chat_messages(user_message: str, memory):
+    """System and user messages for one chat turn, plus the ranked bundles they cite."""
+    with span("chat.prompt_assembly"):
+        # Dynamically generate device and plan information
+        devices_context, plans_context = catalog_context_for(user_message)
+        bundles = rank_bundles(user_message)
+        bundles_context = format_bundles_for_prompt(bundles)
+
+        # Get conversation history
+        history = memory.load_memory_variables({})
+        history_text = history.get("history", "")
+
+        # Trim the history first, then the catalog lists, then the
+        # bundles, until the prompt fits the model's budget.
+        fitted = fit_prompt([
+            Part("instructions", CHAT_SYSTEM_PROMPT),
+            Part("message", user_message),
+            Part("bundles", bundles_context, TOOL_OUTPUT),
+            Part("devices", devices_context, CATALOG),
+            Part("plans", plans_context, CATALOG),
+            Part("history", history_text, HISTORY, keep="tail"),
+        ], budget_for(model_of(chat_model)), "chat")
+        system_message = SystemMessage(content=CHAT_SYSTEM_PROMPT.format(**fitted.texts))
+    return [system_message, HumanMessage(content=user_message)], bundles
+
+
+def finish_chat(user_message: str, memory, session_id: str, bundles, raw_content: str, result):
+    """Save the turn to memory and build the /api/chat response body."""
+    # Update conversation memory
+    memory.save_context({"input": user_message}, {"output": raw_content})
+    
+    # Log the raw response
+    logger.info(f"Raw LLM response: {raw_content}")
+    
+    if result is not None:
+        logger.info(f"Successfully parsed JSON response: {json.dumps(result, indent=2)}")
+    else:
+        # Return text response if no valid JSON found
+        logger.warning("No valid JSON found in response, using raw text")
+        result = {
+            "response": raw_content,
+            "needs_clarification": True
+        }
+    
+    # Add session_id and the ranked bundles to response
+    result["session_id"] = session_id
+    result["bundles"] = bundles
+    return result
+
+# Updated chat endpoint with session management
+@app.post("/api/chat")
+@traced("chat")
+async def chat(request: Request):
+    try:
+        data = await request.json()
+        user_message = data.get("message", "")
+        session_id = data.get("session_id", None)
+        reset_conversation = data.get("reset", False)
         
-        # Send to Azure OpenAI
-        response = chat_model.invoke([system_message, user_msg])
+        logger.info(f"Received chat request with message: '{user_message}', session_id: {session_id}, reset: {reset_conversation}")
         
-        # Update conversation memory
-        memory.save_context({"input": user_message}, {"output": response.content})
+        # Reset conversation if requested
+        if reset_conversation and session_id in conversation_memories:
+            del conversation_memories[session_id]
+            logger.info(f"Reset conversation for session {session_id}")
+            return {"response": "Conversation has been reset.", "session_id": session_id, "reset": True}
         
-        # Log the raw response
-        logger.info(f"Raw LLM response: {response.content}")
+        # Get or create conversation memory
+        session_id, memory = get_conversation_memory(session_id)
         
-        # Parse the response to extract JSON
-        try:
-            # Try to extract JSON with regex
-            json_match = re.search(r'```json\s*([\s\S]*?)\s*```|({[\s\S]*})', response.content)
-            if json_match:
-                json_str = json_match.group(1) or json_match.group(2)
-                result = json.loads(json_str)
-                logger.info(f"Successfully parsed JSON response: {json.dumps(result, indent=2)}")
-            else:
-                # Return text response if no JSON found
-                logger.warning("No JSON found in response, using raw text")
-                result = {
-                    "response": response.content,
-                    "needs_clarification": True
-                }
-        except Exception as parse_error:
-            logger.error(f"Error parsing JSON: {str(parse_error)}")
-            # Return raw response if JSON parsing fails
-            result = {
-                "response": response.content,
-                "needs_clarification": True
+        # If Azure OpenAI is not available, return a mock response
+        if not azure_openai_available or chat_model is None:
+            logger.warning("Azure OpenAI unavailable, returning the ranked bundles unphrased")
+            bundles = rank_bundles(user_message)
+            mock_result = {
+                "response": " ".join(explain(bundle) for bundle in bundles) or "I found these options based on your request.",
+                "devices": picks_from_bundles(bundles, "device"),
+                "plans": picks_from_bundles(bundles, "plan"),
+                "bundles": bundles,
+                "session_id": session_id
             }
+            return mock_result
+            
+        messages, bundles = chat_messages(user_message, memory)
+        
+        # Log the request being sent to Azure OpenAI
+        logger.info("Sending request to Azure OpenAI")
         
-        # Add session_id to response
-        result["session_id"] = session_id
+        # Send to Azure OpenAI
+        with span("chat.recommendation", structured_output=STRUCTURED_OUTPUT), \
+                attribute(session=session_id, route="recommendation"):
+            raw_content, result = await ainvoke_recommendation(
+                chat_model,
+                messages,
+                structured_output=STRUCTURED_OUTPUT,
+                config={"metadata": {"session_id": session_id}},
+            )
         
-        return result
+        return finish_chat(user_message, memory, session_id, bundles, raw_content, result)
         
+    except RateLimitExceeded as e:
+        logger.warning(f"Chat request shed by rate limiter: {e}")
+        return {
+            "response": "We are receiving a lot of requests right now. Please try again in a moment.",
+            "error": "rate_limited"
+        }
     except Exception as e:
         logger.exception(f"Error in chat endpoint: {e}")
         return {
@@ -294,6 +392,60 @@ If you need more information, set needs_clarification to true and ask specific q
             "error": str(e)
         }
 
+def ndjson_event(kind: str, body: Dict[str, Any]) -> bytes:
+    return (json.dumps({"type": kind, **body}, ensure_ascii=False) + "\n").encode("utf-8")
+
+# Streaming variant of /api/chat: newline-delimited JSON events. Each
+# "partial" event carries the recommendation parsed so far, so the UI can
+# show devices and the response text while the model is still writing;
+# the last event is "final" with the same body /api/chat returns.
+@app.post("/api/chat/stream")
+async def chat_stream(request: Request):
+    data = await request.json()
+    user_message = data.get("message", "")
+    session_id, memory = get_conversation_memory(data.get("session_id", None))
+
+    async def events():
+        if not azure_openai_available or chat_model is None:
+            bundles = rank_bundles(user_message)
+            yield ndjson_event("final", {
+                "response": " ".join(explain(bundle) for bundle in bundles) or "I found these options based on your request.",
+                "devices": picks_from_bundles(bundles, "device"),
+                "plans": picks_from_bundles(bundles, "plan"),
+                "bundles": bundles,
+                "session_id": session_id,
+            })
+            return
+        try:
+            with span("chat.stream") as stream_span, attribute(session=session_id, route="recommendation"):
+                messages, bundles = chat_messages(user_message, memory)
+                partials = 0
+                async for kind, value in astream_recommendation(
+                    chat_model, messages, config={"metadata": {"session_id": session_id}}
+                ):
+                    if kind == "partial":
+                        partials += 1
+                        yield ndjson_event("partial", {"recommendation": value, "session_id": session_id})
+                    else:
+                        raw_content, result = value
+                        yield ndjson_event("final", finish_chat(user_message, memory, session_id, bundles,
+                                                                raw_content, result))
+                stream_span.set_attribute("partials", partials)
+        except RateLimitExceeded as e:
+            logger.warning(f"Chat stream shed by rate limiter: {e}")
+            yield ndjson_event("error", {
+                "response": "We are receiving a lot of requests right now. Please try again in a moment.",
+                "error": "rate_limited",
+            })
+        except Exception as e:
+            logger.exception(f"Error in chat stream endpoint: {e}")
+            yield ndjson_event("error", {
+                "response": "I encountered an error processing your request. Please try again.",
+                "error": str(e),
+            })
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 # Add a clear conversation endpoint
 @app.post("/api/clear-conversation")
 async def clear_conversation(request: Request):
@@ -336,27 +488,68 @@ async def voice(request: Request):
         if not transcript:
             return {"response": "Please provide a transcript"}
             
-        response = chat_model.invoke([HumanMessage(content=transcript)])
+        with attribute(session=data.get("session_id"), route="voice"):
+            response = await chat_model.ainvoke([HumanMessage(content=transcript)])
         return {"response": response.content}
     except Exception as e:
         print(f"Error in voice endpoint: {e}")
         return {"response": f"Sorry, I encountered an error. Please try again later."}
 
+@app.get("/api/metrics/coalescing")
+def get_coalescing_metrics():
+    return coalescing_stats()
+
+@app.get("/api/metrics/rate-limits")
+def get_rate_limit_metrics():
+    return limiter_stats()
+
+@app.get("/api/metrics/prompt-budget")
+def get_prompt_budget_metrics():
+    return budget_stats()
+
+@app.get("/api/metrics/providers")
+def get_provider_metrics():
+    pooled = getattr(chat_model, "model", None)
+    if not isinstance(pooled, PooledChatModel):
+        return {}
+    return pooled.model.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return TRACER.render_prometheus()
+
+@app.get("/api/metrics/latency")
+def get_latency_metrics():
+    return TRACER.stats()
+
+loop_lag = LoopLagMonitor()
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    loop_lag.start()
+
+@app.get("/api/metrics/loop-lag")
+def get_loop_lag_metrics(reset: bool = False):
+    stats = loop_lag.stats()
+    if reset:
+        loop_lag.reset()
+    return stats
+
+@app.get("/api/metrics/usage")
+def get_usage_metrics(top: int = 10):
+    return usage_report(top)
+
 @app.get("/api/bundles")
-def get_bundles():
-    if devices_df.empty or plans_df.empty:
-        return []
-        
-    bundles = []
-    for _, device in devices_df.iterrows():
-        for _, plan in plans_df.iterrows():
-            bundles.append({
-                "device": device["name"],
-                "plan": plan["name"],
-                "price": float(device["price"]) + float(plan["price"]),
-                "device_image": device["image"]
-            })
-    return bundles
+def get_bundles(q: str = "", top: int = 10, weights: Optional[str] = None):
+    """Device x plan bundles ranked for the request in `q`, with per-factor scores.
+
+    `weights` overrides the scoring weights, e.g. "budget=0.5,value=0.3".
+    """
+    try:
+        bundle_weights = BundleWeights.parse(weights, DEFAULT_WEIGHTS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return rank_bundles(q, top, bundle_weights)
 
 if __name__ == "__main__":
     import uvicorn
@@ -117,10 +117,13 @@ const SmartSearchBar = ({ devices, plans }) => {
     if (query.trim()) {
       setIsLoading(true);
       setError(null);
+      // Set once the bot message is added; the catch block fills it with the error
+      let updateBotMessage = null;
       
       try {
-        // Call backend chat API with session ID
-        const response = await fetch('http://localhost:8000/api/chat', {
+        // Stream the answer: the backend sends newline-delimited JSON events,
+        // "partial" ones while the model writes and a "final" one at the end.
+        const response = await fetch('http://localhost:8000/api/chat/stream', {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify({ 
@@ -133,7 +136,39 @@ const SmartSearchBar = ({ devices, plans }) => {
           throw new Error(`Server responded with ${response.status}: ${response.statusText}`);
         }
         
-        const data = await response.json();
+        // Add the question and a bot message that fills in as text arrives
+        setChatHistory(prev => [...prev, { type: 'user', content: query }, { type: 'bot', content: '' }]);
+        updateBotMessage = (content) => setChatHistory(prev => [
+          ...prev.slice(0, -1),
+          { type: 'bot', content }
+        ]);
+        
+        let data = null;
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        for (;;) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffered += decoder.decode(value, { stream: true });
+          const lines = buffered.split('\n');
+          buffered = lines.pop();
+          for (const line of lines.filter(Boolean)) {
+            const event = JSON.parse(line);
+            if (event.type === 'partial') {
+              if (event.recommendation.response) {
+                updateBotMessage(event.recommendation.response);
+              }
+            } else if (event.type === 'error') {
+              throw new Error(event.error);
+            } else {
+              data = event;
+            }
+          }
+        }
+        if (!data) {
+          throw new Error('The response stream ended early');
+        }
         console.log("LLM response:", data); // Debug logging
         
         // Store or update session ID
@@ -141,18 +176,7 @@ const SmartSearchBar = ({ devices, plans }) => {
           setSessionId(data.session_id);
         }
         
-        // Add message to chat history
-        const newMessage = {
-          type: 'user',
-          content: query
-        };
-        
-        const botResponse = {
-          type: 'bot',
-          content: data.response
-        };
-        
-        setChatHistory(prev => [...prev, newMessage, botResponse]);
+        updateBotMessage(data.response);
         
         // Clear the input field after sending
         setQuery('');
@@ -192,6 +216,10 @@ const SmartSearchBar = ({ devices, plans }) => {
       } catch (err) {
         console.error("Error calling API:", err);
         setError("Failed to get recommendations. Please try again.");
+        // Don't leave an empty or half-written answer in the chat
+        if (updateBotMessage) {
+          updateBotMessage(`Sorry, something went wrong: ${err.message}`);
+        }
         // Still show fallback recommendations on error
         const fallbackResults = generateFallbackRecommendations(query);
         setResults(fallbackResults);
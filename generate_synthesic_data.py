@@ -1,14 +1,14 @@
-import os
-import time
-import random
-import json
+import argparse
 import asyncio
 import aiohttp
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
 from langchain.schema import AIMessage
+from shoppinggpt.synthetic.dedup import NearDuplicateFilter
+from shoppinggpt.synthetic.scheduler import QuotaScheduler, Slot
+from shoppinggpt.synthetic.writer import JSONLWriter, iter_jsonl, jsonl_to_json, remaining_per_category
 
 # Tải biến môi trường
 load_dotenv()
@@ -32,21 +32,12 @@ GROQ_MODELS = [
     {"name": "llama-3.2-90b-text-preview", "rpm": 30, "tpm": 7000, "max_tokens": 7000, "daily_limit": 500000},
 ]
 
-class ModelManager:
-    def __init__(self):
-        self.last_request_time = {model['name']: {key: 0 for key in GROQ_API_KEYS} for model in GROQ_MODELS}
-        self.requests_this_minute = {model['name']: {key: 0 for key in GROQ_API_KEYS} for model in GROQ_MODELS}
-
-    async def can_make_request(self, model_name: str, api_key: str) -> bool:
-        current_time = time.time()
-        if current_time - self.last_request_time[model_name][api_key] >= 60:
-            self.requests_this_minute[model_name][api_key] = 0
-            self.last_request_time[model_name][api_key] = current_time
-        model_info = next(model for model in GROQ_MODELS if model['name'] == model_name)
-        return self.requests_this_minute[model_name][api_key] < model_info['rpm']
-
-    async def increment_request(self, model_name: str, api_key: str) -> None:
-        self.requests_this_minute[model_name][api_key] += 1
+def create_slots() -> List[Slot]:
+    return [
+        Slot(model["name"], api_key, rpm=model["rpm"], tpm=model["tpm"], daily_limit=model["daily_limit"])
+        for api_key in GROQ_API_KEYS
+        for model in GROQ_MODELS
+    ]
 
 def create_prompt(category: str) -> str:
     prompts = f"""
@@ -99,73 +90,70 @@ async def generate_conversation(session: aiohttp.ClientSession, llm: ChatGroq, p
     chain = prompt | llm
     return await chain.ainvoke({})
 
-async def generate_data(session: aiohttp.ClientSession, api_key: str, model_name: str, model_manager: ModelManager, categories: List[str], total_data: int, data_queue: asyncio.Queue) -> None:
-    while True:
-        if await model_manager.can_make_request(model_name, api_key):
-            llm = ChatGroq(temperature=0.9, model=model_name, groq_api_key=api_key, client=session)
-            category = random.choice(categories)
-            prompt = PromptTemplate(input_variables=[], template=create_prompt(category))
-            
-            try:
-                conversation = await generate_conversation(session, llm, prompt)
-                await model_manager.increment_request(model_name, api_key)
-                
-                ai_response = conversation.content if isinstance(conversation, AIMessage) else str(conversation)
-                cleaned_response = ai_response.replace("Human:", "\nHuman:").replace("AI:", "\nAI:").strip()
-                
-                data = {
-                    "conversation": cleaned_response,
-                    "category": category
-                }
-                await data_queue.put(data)
-                print(f"Generated ({category}) using {model_name} with API key {api_key[-4:]}:\n{cleaned_response}\n---")
-                
-                if data_queue.qsize() >= total_data:
-                    return
-            except Exception as e:
-                print(f"Error with model {model_name} and API key {api_key[-4:]}: {str(e)}")
-        else:
-            await asyncio.sleep(1)
-
-async def append_to_json(data: List[dict], filename: str = "synthetic_conversations.json") -> None:
-    existing_data = []
-    if os.path.exists(filename):
-        try:
-            with open(filename, "r", encoding="utf-8") as f:
-                existing_data = json.load(f)
-        except json.JSONDecodeError:
-            print(f"Warning: {filename} is empty or contains invalid JSON. Starting with an empty list.")
-    
-    existing_data.extend(data)
-    
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(existing_data, f, ensure_ascii=False, indent=4)
-    
-    print(f"Đã thêm {len(data)} hội thoại mới vào file {filename}. Tổng số hội thoại: {len(existing_data)}.")
-
-async def main() -> None:
-    model_manager = ModelManager()
+def make_generator(session: aiohttp.ClientSession):
+    async def generate(slot: Slot, category: str) -> Tuple[dict, Optional[int]]:
+        if slot.client is None:
+            slot.client = ChatGroq(temperature=0.9, model=slot.model, groq_api_key=slot.api_key, client=session)
+        prompt = PromptTemplate(input_variables=[], template=create_prompt(category))
+        conversation = await generate_conversation(session, slot.client, prompt)
+
+        ai_response = conversation.content if isinstance(conversation, AIMessage) else str(conversation)
+        cleaned_response = ai_response.replace("Human:", "\nHuman:").replace("AI:", "\nAI:").strip()
+        usage = getattr(conversation, "usage_metadata", None) or {}
+        print(f"Generated ({category}) using {slot.model} with API key {slot.api_key[-4:]}:\n{cleaned_response}\n---")
+        return {"conversation": cleaned_response, "category": category}, usage.get("total_tokens")
+    return generate
+
+# Fields every record needs; lines without them are counted as corrupt
+# and not resumed from.
+REQUIRED_FIELDS = ("category", "conversation")
+
+
+async def main(output: str = "synthetic_conversations.jsonl", total_data: int = 1000) -> None:
     categories = ["product", "chitchat"]
-    total_data = 1000
-    data_queue: asyncio.Queue = asyncio.Queue()
-    
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for api_key in GROQ_API_KEYS:
-            for model in GROQ_MODELS:
-                task = asyncio.create_task(generate_data(session, api_key, model['name'], model_manager, categories, total_data, data_queue))
-                tasks.append(task)
-        
-        all_data = []
-        while len(all_data) < total_data:
-            data = await data_queue.get()
-            all_data.append(data)
-            if len(all_data) >= total_data:
-                for task in tasks:
-                    task.cancel()
-                break
-        
-        await append_to_json(all_data[:total_data])
+
+    with JSONLWriter(output, required=REQUIRED_FIELDS) as writer:
+        # Records already on disk from an earlier (possibly crashed) run count
+        # towards the target.
+        remaining = remaining_per_category(writer.counts, categories, total_data)
+        print(f"Resuming with {writer.total} conversations in {output}; still needed: {remaining}")
+        if writer.corrupt:
+            print(f"Skipped {writer.corrupt} corrupt or incomplete lines in {output}; they are left in place")
+        if not any(remaining.values()):
+            return
+
+        # Near-duplicates are rejected before they count towards the target;
+        # conversations from earlier runs are indexed first.
+        dedup = NearDuplicateFilter()
+        for record in iter_jsonl(output, REQUIRED_FIELDS):
+            dedup.add(record["conversation"])
+
+        def accept(record: dict) -> bool:
+            if not dedup.check(record["conversation"], record["category"]):
+                print(f"Rejected near-duplicate ({record['category']})")
+                return False
+            writer.write(record)
+            checked = sum(dedup.accepted.values()) + sum(dedup.rejected.values())
+            if checked % 50 == 0:
+                print(f"Dedup accept/reject per category: {dedup.rates()}")
+            return True
+
+        async with aiohttp.ClientSession() as session:
+            scheduler = QuotaScheduler(create_slots(), remaining, make_generator(session), accept)
+            await scheduler.run()
+        print(f"Scheduler stats: {scheduler.stats()}")
+        print(f"Dedup accept/reject per category: {dedup.rates()}")
+
+    print(f"Đã lưu {writer.total} hội thoại vào file {output}.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Generate synthetic routing conversations")
+    parser.add_argument("--output", default="synthetic_conversations.jsonl")
+    parser.add_argument("--total", type=int, default=1000)
+    parser.add_argument("--to-json", metavar="JSONL", help="convert a JSONL file to the legacy JSON array and exit")
+    args = parser.parse_args()
+
+    if args.to_json:
+        print(f"Wrote {jsonl_to_json(args.to_json)}")
+    else:
+        asyncio.run(main(args.output, args.total))
@@ -0,0 +1,249 @@
+import atexit
+import contextvars
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# USD per million (prompt, completion) tokens; override with
+# LLM_PRICE_<MODEL>="prompt,completion", e.g. LLM_PRICE_GEMMA_7B_IT="0.07,0.07".
+PRICES_PER_MILLION = {
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemma-7b-it": (0.07, 0.07),
+    "gpt-35-turbo": (0.50, 1.50),
+    "gpt-4o": (2.50, 10.00),
+}
+
+PROMPT_PREVIEW_CHARS = 200
+
+_ATTRIBUTION: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("usage_attribution", default={})
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_usage (
+    ts REAL NOT NULL,
+    session TEXT,
+    route TEXT,
+    tool TEXT,
+    provider TEXT,
+    model TEXT,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    total_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    estimated INTEGER NOT NULL,
+    prompt_hash TEXT,
+    prompt_preview TEXT
+);
+CREATE INDEX IF NOT EXISTS llm_usage_session ON llm_usage (session);
+CREATE INDEX IF NOT EXISTS llm_usage_prompt ON llm_usage (prompt_hash);
+"""
+
+
+@contextmanager
+def attribute(**labels: Optional[str]) -> Iterator[None]:
+    """Attribute LLM calls made inside the block to a session, route and/or tool."""
+    merged = dict(_ATTRIBUTION.get())
+    merged.update({key: str(value) for key, value in labels.items() if value is not None})
+    token = _ATTRIBUTION.set(merged)
+    try:
+        yield
+    finally:
+        _ATTRIBUTION.reset(token)
+
+
+def current_attribution() -> Dict[str, str]:
+    return dict(_ATTRIBUTION.get())
+
+
+def price_for(model: Optional[str]) -> Tuple[float, float]:
+    if not model:
+        return 0.0, 0.0
+    override = os.getenv("LLM_PRICE_" + "".join(c if c.isalnum() else "_" for c in model).upper())
+    if override:
+        prompt, completion = override.split(",")
+        return float(prompt), float(completion)
+    return PRICES_PER_MILLION.get(model, (0.0, 0.0))
+
+
+class LLMUsage(NamedTuple):
+    ts: float
+    session: Optional[str]
+    route: Optional[str]
+    tool: Optional[str]
+    provider: Optional[str]
+    model: Optional[str]
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    cost: float
+    estimated: bool
+    prompt_hash: str
+    prompt_preview: str
+
+
+class UsageAccountant:
+    """Collects token usage per LLM call and flushes it to SQLite.
+
+    Calls are buffered in memory and written in one transaction every
+    `flush_every` records or `flush_interval` seconds, so recording never
+    touches the disk on the request path. Reports flush first and then
+    query the table.
+    """
+
+    def __init__(self, db_path: str, flush_every: int = 200, flush_interval: float = 30.0,
+                 clock=time.time, background: bool = True):
+        self.db_path = db_path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.recorded = 0
+        self._pending: List[LLMUsage] = []
+        self._totals: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "tokens": 0})
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+        if background:
+            threading.Thread(target=self._run, name="usage-flush", daemon=True).start()
+            atexit.register(self.flush)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def record(self, provider: Optional[str], model: Optional[str], prompt: str,
+               prompt_tokens: int, completion_tokens: int, estimated: bool = False,
+               labels: Optional[Dict[str, str]] = None) -> LLMUsage:
+        labels = current_attribution() if labels is None else labels
+        prompt_price, completion_price = price_for(model)
+        usage = LLMUsage(
+            ts=self.clock(),
+            session=labels.get("session"),
+            route=labels.get("route"),
+            tool=labels.get("tool"),
+            provider=provider,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            cost=(prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6,
+            estimated=estimated,
+            prompt_hash=hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:16],
+            prompt_preview=prompt[:PROMPT_PREVIEW_CHARS],
+        )
+        with self._lock:
+            self._pending.append(usage)
+            self.recorded += 1
+            for key in (f"route:{usage.route}", f"tool:{usage.tool}", f"provider:{usage.provider}"):
+                self._totals[key]["calls"] += 1
+                self._totals[key]["tokens"] += usage.total_tokens
+            full = len(self._pending) >= self.flush_every
+        if full:
+            self.flush()
+        return usage
+
+    def flush(self) -> int:
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        with self._db_lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO llm_usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [tuple(usage) for usage in batch],
+            )
+        return len(batch)
+
+    def _query(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        self.flush()
+        with self._db_lock, self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def top_sessions(self, n: int = 10, since: float = 0.0) -> List[Dict[str, Any]]:
+        return self._query(
+            """SELECT session, COUNT(*) AS calls, SUM(prompt_tokens) AS prompt_tokens,
+                      SUM(completion_tokens) AS completion_tokens, SUM(total_tokens) AS total_tokens,
+                      SUM(cost) AS cost
+               FROM llm_usage WHERE ts >= ? GROUP BY session
+               ORDER BY total_tokens DESC LIMIT ?""",
+            (since, n),
+        )
+
+    def top_prompts(self, n: int = 10, since: float = 0.0) -> List[Dict[str, Any]]:
+        """Most expensive distinct prompts (by hash), with a preview of each."""
+        return self._query(
+            """SELECT prompt_hash, MAX(prompt_preview) AS prompt_preview, MAX(route) AS route,
+                      MAX(tool) AS tool, COUNT(*) AS calls, AVG(prompt_tokens) AS avg_prompt_tokens,
+                      SUM(total_tokens) AS total_tokens, SUM(cost) AS cost
+               FROM llm_usage WHERE ts >= ? GROUP BY prompt_hash
+               ORDER BY total_tokens DESC LIMIT ?""",
+            (since, n),
+        )
+
+    def breakdown(self, column: str, since: float = 0.0) -> List[Dict[str, Any]]:
+        """Usage grouped by `route`, `tool`, `provider` or `model`."""
+        if column not in ("route", "tool", "provider", "model"):
+            raise ValueError(f"Cannot group usage by {column!r}")
+        return self._query(
+            f"""SELECT {column}, COUNT(*) AS calls, SUM(prompt_tokens) AS prompt_tokens,
+                       SUM(completion_tokens) AS completion_tokens, SUM(cost) AS cost
+                FROM llm_usage WHERE ts >= ? GROUP BY {column}
+                ORDER BY SUM(total_tokens) DESC""",
+            (since,),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "db_path": self.db_path,
+                "recorded": self.recorded,
+                "pending": len(self._pending),
+                "totals": {key: dict(value) for key, value in self._totals.items()},
+            }
+
+
+_ACCOUNTANT: Optional[UsageAccountant] = None
+_ACCOUNTANT_LOCK = threading.Lock()
+
+
+def get_accountant() -> UsageAccountant:
+    """Process-wide accountant writing to USAGE_DB (default llm_usage.db)."""
+    global _ACCOUNTANT
+    with _ACCOUNTANT_LOCK:
+        if _ACCOUNTANT is None:
+            _ACCOUNTANT = UsageAccountant(
+                os.getenv("USAGE_DB", "llm_usage.db"),
+                flush_interval=float(os.getenv("USAGE_FLUSH_INTERVAL", "30")),
+            )
+        return _ACCOUNTANT
+
+
+def flush_usage() -> int:
+    """Flush the process-wide accountant, if one was created.
+
+    Its atexit hook does not run in multiprocessing children (e.g. uvicorn
+    workers), so servers call this on shutdown.
+    """
+    with _ACCOUNTANT_LOCK:
+        accountant = _ACCOUNTANT
+    return accountant.flush() if accountant is not None else 0
+
+
+def usage_report(n: int = 10) -> Dict[str, Any]:
+    accountant = get_accountant()
+    return {
+        "top_sessions": accountant.top_sessions(n),
+        "top_prompts": accountant.top_prompts(n),
+        "by_route": accountant.breakdown("route"),
+        "by_tool": accountant.breakdown("tool"),
+        "by_model": accountant.breakdown("model"),
+    }
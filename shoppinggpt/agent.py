@@ -1,39 +1,138 @@
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain.memory import ConversationBufferMemory
-from shoppinggpt.tool.product_search import product_search_tool
-from shoppinggpt.tool.policy_search import policy_search_tool
-from langchain.prompts import ChatPromptTemplate
+import asyncio
+import os
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional, Sequence
+
+from shoppinggpt.background_loop import run_sync
+from shoppinggpt.tracing import span, traced
+
+if TYPE_CHECKING:
+    from langchain.memory import ConversationBufferMemory
+
+# Tool calls of one model step run concurrently, at most this many at once.
+TOOL_CONCURRENCY = int(os.getenv("AGENT_TOOL_CONCURRENCY", "4"))
+TOOL_TIMEOUT = float(os.getenv("AGENT_TOOL_TIMEOUT", "20"))
+
+
+def parse_tool_timeouts(spec: Optional[str]) -> Dict[str, float]:
+    """'policy_search_tool=5,product_search_tool=15' -> seconds per tool name."""
+    timeouts = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        seconds = float(value)
+        if seconds <= 0:
+            raise ValueError(f"Tool timeout for {name.strip()!r} must be positive")
+        timeouts[name.strip()] = seconds
+    return timeouts
+
+
+TOOL_TIMEOUTS = parse_tool_timeouts(os.getenv("AGENT_TOOL_TIMEOUTS"))
+
+
+async def run_tool(name: str, call: Callable[[], Awaitable[Any]], timeout: float,
+                   semaphore: asyncio.Semaphore) -> Any:
+    """Await one tool call under the shared bound, giving up after `timeout` seconds.
+
+    A timeout becomes the tool's observation instead of failing the turn,
+    so the model can still answer from the tools that did return. A tool
+    running in a worker thread cannot be interrupted; its thread finishes
+    in the background and the result is dropped.
+    """
+    async with semaphore:
+        with span("agent.tool", tool=name, timeout=timeout) as tool_span:
+            try:
+                return await asyncio.wait_for(call(), timeout)
+            except asyncio.TimeoutError:
+                tool_span.set_attribute("error", "timeout")
+                return f"{name} did not respond within {timeout:g}s."
+
+
+def bounded_tools(tools: Sequence[Any], timeouts: Dict[str, float], concurrency: int) -> list:
+    """Copies of `tools` that run through `run_tool` with one semaphore shared between them."""
+    from langchain_core.tools import StructuredTool
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def bound(tool):
+        timeout = timeouts.get(tool.name, TOOL_TIMEOUT)
+
+        async def call(**kwargs):
+            return await run_tool(tool.name, lambda: tool.ainvoke(kwargs), timeout, semaphore)
+
+        return StructuredTool(name=tool.name, description=tool.description,
+                              args_schema=tool.args_schema, coroutine=call)
+
+    return [bound(tool) for tool in tools]
 
 
 class ShoppingAgent:
-    def __init__(self, llm, shared_memory: ConversationBufferMemory):
+    def __init__(self, llm, shared_memory: "ConversationBufferMemory", context: Optional[str] = None,
+                 tool_timeouts: Optional[Dict[str, float]] = None, tool_concurrency: int = TOOL_CONCURRENCY):
+        # LangChain prompts and the tools (FAISS, Gemini) are imported here
+        # rather than at module level so importing the package stays cheap.
+        from langchain.prompts import ChatPromptTemplate
+        from shoppinggpt.tool.product_search import get_product_search_tool
+        from shoppinggpt.tool.policy_search import get_policy_search_tool
+
         self.llm = llm
         self.verbose = False
         self.memory = shared_memory
-        self.tools = [product_search_tool, policy_search_tool]
-        self.prompt = ChatPromptTemplate.from_messages([
+        self.tools = [get_product_search_tool(), get_policy_search_tool()]
+        self.tool_timeouts = TOOL_TIMEOUTS if tool_timeouts is None else tool_timeouts
+        self.tool_concurrency = tool_concurrency
+        messages = [
             ("system", """You are an intelligent and helpful AI assistant for an online fashion store.
             Your task is to answer customer questions about products and store policies.
             Use the available tools to search for accurate information and provide appropriate answers.
                       
             Always use Vietnamese to communicate with customers."""),
+        ]
+        if context:
+            # Retrieved ahead of time (see ShoppingAssistant.ahandle_query);
+            # braces are escaped so the text is not read as template variables.
+            escaped = context.replace("{", "{{").replace("}", "}}")
+            messages.append(("system", "Context already retrieved for this question. If it answers "
+                                       "the question, answer from it without calling a tool:\n" + escaped))
+        messages += [
             ("human", "{input}"),
             ("ai", "{agent_scratchpad}")
-        ])
+        ]
+        self.prompt = ChatPromptTemplate.from_messages(messages)
 
-    def invoke(self, query: str) -> str:
-        inputs = {
-            "input": query,
-        }
-        agent = create_tool_calling_agent(self.llm, self.tools, self.prompt)
+    def _executor(self, tools: Optional[Sequence[Any]] = None):
+        from langchain.agents import AgentExecutor, create_tool_calling_agent
 
-        agent_executor = AgentExecutor(
+        tools = list(tools or self.tools)
+        agent = create_tool_calling_agent(self.llm, tools, self.prompt)
+        return AgentExecutor(
             agent=agent,
-            tools=self.tools,
+            tools=tools,
             verbose=self.verbose,
             handle_parsing_errors=True,
             memory=self.memory
         )
-        ai_message = agent_executor.invoke(inputs)
-        agent_output = ai_message['output']
-        return agent_output
+
+    async def _arun(self, query: str) -> str:
+        # AgentExecutor's async path gathers the tool calls of one model
+        # step, so a step asking for products and policies takes as long as
+        # the slower of the two.
+        tools = bounded_tools(self.tools, self.tool_timeouts, self.tool_concurrency)
+        ai_message = await self._executor(tools).ainvoke({"input": query})
+        return ai_message['output']
+
+    @traced("agent.invoke")
+    def invoke(self, query: str) -> str:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Not on an event loop (Flask, CLI): run the turn on the shared
+            # background loop so its tool calls still overlap, and the
+            # cached LLM and embedding clients always see the same loop.
+            return run_sync(self._arun(query))
+        ai_message = self._executor().invoke({"input": query})
+        return ai_message['output']
+
+    @traced("agent.invoke")
+    async def ainvoke(self, query: str) -> str:
+        return await self._arun(query)
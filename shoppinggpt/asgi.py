@@ -0,0 +1,132 @@
+"""ASGI server for the fashion assistant (the chat UI and `/get` route of app.py).
+
+    python -m shoppinggpt.asgi --workers 4 --threads 32
+    uvicorn shoppinggpt.asgi:app --workers 4
+
+Each worker process warms up the LLM, router, agent and policy index before
+it reports ready on /healthz. `/get` awaits the LLM instead of holding a
+thread per request; blocking work (routing, tools, SQLite) runs on the
+loop's default executor, sized by ASGI_THREADS. On SIGTERM uvicorn stops
+accepting connections, waits up to --graceful-timeout for in-flight
+requests, and the lifespan then flushes token accounting before exit.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Query
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from fastapi.staticfiles import StaticFiles
+
+from shoppinggpt.accounting import flush_usage
+from shoppinggpt.service import DEFAULT_SESSION, ShoppingAssistant
+from shoppinggpt.tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES_DIR = os.path.join(REPO_ROOT, "templates")
+STATIC_DIR = os.path.join(REPO_ROOT, "static")
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+THREADS = int(os.getenv("ASGI_THREADS", "32"))
+WARMUP = os.getenv("ASGI_WARMUP", "true").lower() != "false"
+
+assistant = ShoppingAssistant(LLM_PROVIDER)
+
+
+def render_index() -> str:
+    """templates/index.html with Flask's `url_for('static', filename=...)` available."""
+    from jinja2 import Environment, FileSystemLoader
+
+    def url_for(endpoint: str, filename: str = "") -> str:
+        return f"/{endpoint}/{filename}" if endpoint == "static" else "/"
+
+    env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=True)
+    return env.get_template("index.html").render(url_for=url_for)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix="assistant")
+    loop.set_default_executor(executor)
+    if WARMUP:
+        timings = await loop.run_in_executor(None, assistant.warmup)
+        logger.info("Worker %d warmed up: %s", os.getpid(),
+                    ", ".join(f"{name}={seconds:.2f}s" for name, seconds in timings.items()))
+    app.state.index = render_index()
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        # uvicorn has already drained in-flight requests (or hit its timeout).
+        app.state.ready = False
+        executor.shutdown(wait=False, cancel_futures=True)
+        flush_usage()
+
+
+app = FastAPI(title="ShoppingGPT", lifespan=lifespan)
+app.state.ready = False
+app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+
+
+@app.get("/", response_class=HTMLResponse)
+async def home():
+    return app.state.index
+
+
+@app.get("/get")
+async def get_bot_response(msg: str, session_id: str = Query(DEFAULT_SESSION)):
+    return await assistant.ahandle_query(msg, session_id)
+
+
+@app.get("/healthz")
+async def healthz():
+    if not app.state.ready:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ok", "pid": os.getpid()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(TRACER.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the assistant over ASGI")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ASGI_WORKERS", "1")),
+                        help="worker processes, each with its own warmed-up assistant")
+    parser.add_argument("--threads", type=int, default=THREADS,
+                        help="executor threads per worker for routing and blocking tools")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="seconds to wait for in-flight requests on shutdown")
+    parser.add_argument("--no-warmup", action="store_true")
+    args = parser.parse_args()
+
+    # Workers are separate processes that re-import this module and read these.
+    os.environ["ASGI_THREADS"] = str(args.threads)
+    if args.no_warmup:
+        os.environ["ASGI_WARMUP"] = "false"
+    logging.basicConfig(level=logging.INFO)
+    uvicorn.run(
+        "shoppinggpt.asgi:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    main()
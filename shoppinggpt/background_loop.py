@@ -0,0 +1,56 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+from typing import Any, Awaitable, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """The process-wide event loop for synchronous callers, started on first use.
+
+    Async clients cached for the whole process (the chat models from
+    create_llm, the embeddings behind the policy index) bind to the loop
+    they are first used on. Running every sync call on this one long-lived
+    loop, instead of a fresh `asyncio.run` loop per call, keeps them valid.
+    """
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="shoppinggpt-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def _settle(task: asyncio.Task, result: concurrent.futures.Future) -> None:
+    if task.cancelled():
+        result.cancel()
+    elif task.exception() is not None:
+        result.set_exception(task.exception())
+    else:
+        result.set_result(task.result())
+
+
+def run_sync(coro: Awaitable[Any]) -> Any:
+    """Run `coro` on the background loop and block until it finishes.
+
+    The coroutine runs in a copy of the caller's context, so tracing spans
+    and accounting attributes keep their parent.
+    """
+    loop = background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("run_sync would block the background loop it waits on; await the coroutine instead")
+    result: concurrent.futures.Future = concurrent.futures.Future()
+
+    def start() -> None:
+        loop.create_task(coro).add_done_callback(lambda task: _settle(task, result))
+
+    loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+    return result.result()
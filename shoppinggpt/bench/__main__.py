@@ -0,0 +1,65 @@
+"""Run the offline benchmarks and compare them with a stored baseline.
+
+    python -m shoppinggpt.bench                       # all scenarios
+    python -m shoppinggpt.bench routing.local api.chat --iterations 500
+    python -m shoppinggpt.bench --save-baseline       # record a new baseline
+"""
+import argparse
+import json
+import sys
+
+from shoppinggpt.bench.harness import (
+    DEFAULT_TOLERANCE,
+    compare,
+    format_results,
+    load_baseline,
+    run_all,
+    save_baseline,
+)
+from shoppinggpt.bench.scenarios import SCENARIOS, BenchConfig, build
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline ShoppingGPT benchmarks")
+    parser.add_argument("scenarios", nargs="*", help=f"subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--iterations", type=int, help="override every scenario's iteration count")
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="median fake LLM latency")
+    parser.add_argument("--llm-sigma", type=float, default=0.5)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50, help="median fake embedding latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default="bench_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+    args = parser.parse_args(argv)
+
+    config = BenchConfig(
+        llm_median=args.llm_latency_ms / 1000,
+        llm_sigma=args.llm_sigma,
+        embedding_median=args.embedding_latency_ms / 1000,
+        seed=args.seed,
+    )
+    results = run_all(build(args.scenarios or None, config), args.iterations)
+    print(json.dumps(results, indent=2) if args.json else format_results(results))
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"\nSaved baseline to {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    rows = compare(results, baseline, args.tolerance)
+    regressions = [row for row in rows if row["regression"]]
+    print(f"\nCompared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"  {row['scenario']:<20}{row['metric']:<18}{row['baseline']:>10} -> {row['current']:<10}"
+              f"{row['change']:+.1%} {flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
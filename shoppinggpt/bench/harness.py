@@ -0,0 +1,174 @@
+import asyncio
+import gc
+import json
+import math
+import os
+import platform
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+# Results whose latency percentile grows (or throughput drops) by more than
+# this fraction against the baseline count as regressions.
+DEFAULT_TOLERANCE = 0.2
+
+LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+Operation = Callable[[int], Union[Any, Awaitable[Any]]]
+
+
+class ScenarioSkipped(Exception):
+    """Raised by a scenario's setup when its dependencies are not available."""
+
+
+class Scenario:
+    """A named benchmark.
+
+    `setup()` builds the fixtures and returns the operation to time, a
+    function of the iteration number; async operations are driven with
+    `concurrency` requests in flight.
+    """
+
+    def __init__(self, name: str, setup: Callable[[], Operation], iterations: int = 200,
+                 warmup: int = 10, concurrency: int = 1):
+        self.name = name
+        self.setup = setup
+        self.iterations = iterations
+        self.warmup = warmup
+        self.concurrency = concurrency
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _time_sync(op: Operation, start: int, count: int) -> List[float]:
+    latencies = []
+    for i in range(start, start + count):
+        began = time.perf_counter()
+        op(i)
+        latencies.append(time.perf_counter() - began)
+    return latencies
+
+
+async def _time_async(op: Operation, start: int, count: int, concurrency: int) -> List[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            began = time.perf_counter()
+            await op(i)
+            latencies.append(time.perf_counter() - began)
+
+    await asyncio.gather(*(one(i) for i in range(start, start + count)))
+    return latencies
+
+
+def _drive(op: Operation, start: int, count: int, concurrency: int) -> List[float]:
+    if asyncio.iscoroutinefunction(op):
+        return asyncio.run(_time_async(op, start, count, concurrency))
+    return _time_sync(op, start, count)
+
+
+def _allocations(op: Operation, start: int, count: int, concurrency: int) -> Dict[str, float]:
+    """Peak traced memory and bytes still held after `count` operations."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        _drive(op, start, count, concurrency)
+        gc.collect()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_kib": round((peak - before) / 1024, 1),
+        "retained_bytes_per_op": round((after - before) / max(count, 1), 1),
+    }
+
+
+def run_scenario(scenario: Scenario, iterations: Optional[int] = None,
+                 allocation_samples: int = 50) -> Dict[str, Any]:
+    iterations = iterations or scenario.iterations
+    try:
+        op = scenario.setup()
+    except (ImportError, ScenarioSkipped) as e:
+        return {"scenario": scenario.name, "skipped": str(e)}
+
+    _drive(op, 0, scenario.warmup, scenario.concurrency)
+    began = time.perf_counter()
+    latencies = sorted(_drive(op, scenario.warmup, iterations, scenario.concurrency))
+    wall = time.perf_counter() - began
+    result = {
+        "scenario": scenario.name,
+        "iterations": iterations,
+        "concurrency": scenario.concurrency,
+        "throughput_per_s": round(iterations / wall, 2) if wall else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+    if allocation_samples:
+        result.update(_allocations(op, scenario.warmup + iterations,
+                                   min(allocation_samples, iterations), scenario.concurrency))
+    return result
+
+
+def run_all(scenarios: List[Scenario], iterations: Optional[int] = None, **kwargs) -> Dict[str, Dict[str, Any]]:
+    return {scenario.name: run_scenario(scenario, iterations, **kwargs) for scenario in scenarios}
+
+
+def environment() -> Dict[str, str]:
+    return {"python": platform.python_version(), "machine": platform.machine(), "node": platform.node()}
+
+
+def save_baseline(results: Dict[str, Dict[str, Any]], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[Dict[str, Any]]:
+    """One row per metric that moved; `regression` is set past `tolerance`."""
+    rows = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or "skipped" in result or "skipped" in base:
+            continue
+        for metric in LATENCY_METRICS + ("throughput_per_s",):
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = new / old - 1
+            worse = change > tolerance if metric in LATENCY_METRICS else change < -tolerance
+            rows.append({"scenario": name, "metric": metric, "baseline": old, "current": new,
+                         "change": round(change, 3), "regression": worse})
+    return rows
+
+
+def format_results(results: Dict[str, Dict[str, Any]]) -> str:
+    header = f"{'scenario':<22}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak KiB':>10}"
+    lines = [header, "-" * len(header)]
+    for name, result in results.items():
+        if "skipped" in result:
+            lines.append(f"{name:<22}skipped: {result['skipped']}")
+            continue
+        lines.append(
+            f"{name:<22}{result['throughput_per_s']:>10}{result['p50_ms']:>10}"
+            f"{result['p95_ms']:>10}{result['p99_ms']:>10}{result.get('peak_kib', '-'):>10}"
+        )
+    return "\n".join(lines)
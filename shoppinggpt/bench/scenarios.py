@@ -0,0 +1,197 @@
+"""Benchmark scenarios over the repository's own data, with fake LLMs.
+
+Every scenario is deterministic for a given seed: chat models and
+embeddings are the local fakes from shoppinggpt.llm.fake, with latencies
+drawn from seeded log-normal distributions.
+"""
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import zlib
+from typing import List, Optional
+
+from shoppinggpt.bench.harness import Scenario, ScenarioSkipped
+from shoppinggpt.llm.fake import FakeChatModel, FakeEmbeddings, lognormal_latency
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = os.path.join(REPO_ROOT, "data")
+BACKEND_DIR = os.path.join(REPO_ROOT, "backend")
+PRODUCTS_DB = os.path.join(DATA_DIR, "products.db")
+POLICY_TEXT = os.path.join(DATA_DIR, "policy.txt")
+
+POLICY_QUERIES = [
+    "Làm thế nào để tôi thay đổi địa chỉ giao hàng?",
+    "chính sách đổi trả trong bao nhiêu ngày",
+    "tôi có thể xuất hóa đơn công ty không",
+    "phí vận chuyển là bao nhiêu",
+    "how do I return an item",
+]
+
+# What the SQL-generating model would answer for typical product questions.
+PRODUCT_SQL = [
+    "SELECT * FROM products WHERE LOWER(product_name) LIKE '%áo%'",
+    "SELECT * FROM products WHERE price < 400000 ORDER BY price",
+    "SELECT product_name, color, size FROM products WHERE LOWER(color) LIKE '%đen%'",
+    "SELECT * FROM products WHERE gender = 'Nam' AND stock_quantity > 0",
+    "SELECT brand, COUNT(*) AS n, AVG(price) AS avg_price FROM products GROUP BY brand",
+]
+
+CHAT_MESSAGES = [
+    "I need a phone with a great camera under 1000 euros",
+    "Which plan has the most data?",
+    "Cheapest Samsung phone and a prepaid plan please",
+    "I travel a lot in the EU, what do you recommend?",
+]
+
+
+class BenchConfig:
+    """Latency model for the fakes; medians are in seconds."""
+
+    def __init__(self, llm_median: float = 0.8, llm_sigma: float = 0.5,
+                 embedding_median: float = 0.05, embedding_sigma: float = 0.3, seed: int = 0):
+        self.llm_median = llm_median
+        self.llm_sigma = llm_sigma
+        self.embedding_median = embedding_median
+        self.embedding_sigma = embedding_sigma
+        self.seed = seed
+
+    def chat_model(self, respond, name: str = "fake-llm") -> FakeChatModel:
+        return FakeChatModel(name, latency=lognormal_latency(self.llm_median, self.llm_sigma, self.seed),
+                             respond=respond, seed=self.seed)
+
+    def embeddings(self) -> FakeEmbeddings:
+        return FakeEmbeddings(latency=lognormal_latency(self.embedding_median, self.embedding_sigma, self.seed))
+
+
+def routing_queries() -> List[str]:
+    from shoppinggpt.router.lib_semantic_router import CHITCHAT_SAMPLE, PRODUCT_SAMPLE
+    return [query for pair in zip(PRODUCT_SAMPLE, CHITCHAT_SAMPLE) for query in pair]
+
+
+def local_routing(config: BenchConfig) -> Scenario:
+    def setup():
+        from shoppinggpt.router.hashed_ngram_router import DEFAULT_MODEL_PATH, SemanticRouter
+        if not os.path.exists(DEFAULT_MODEL_PATH):
+            raise ScenarioSkipped("no router model; run python -m shoppinggpt.router.train")
+        router, queries = SemanticRouter(), routing_queries()
+        return lambda i: router.guide(queries[i % len(queries)])
+    return Scenario("routing.local", setup, iterations=2000, warmup=50)
+
+
+def cosine_routing(config: BenchConfig) -> Scenario:
+    def setup():
+        from shoppinggpt.router.consine_algo_semantic import SemanticRouter
+        router, queries = SemanticRouter(config.embeddings()), routing_queries()
+        return lambda i: router.guide(queries[i % len(queries)])
+    return Scenario("routing.cosine", setup, iterations=100)
+
+
+def product_search(config: BenchConfig) -> Scenario:
+    def setup():
+        from shoppinggpt.tool.product_search import _product_search
+
+        def respond(prompt) -> str:
+            return PRODUCT_SQL[zlib.crc32(str(prompt).encode("utf-8")) % len(PRODUCT_SQL)]
+
+        llm = config.chat_model(respond)
+        queries = routing_queries()[::2]
+        return lambda i: _product_search(queries[i % len(queries)], llm=llm, db_path=PRODUCTS_DB)
+    return Scenario("product_search", setup, iterations=50, warmup=2)
+
+
+def policy_search(config: BenchConfig) -> Scenario:
+    def setup():
+        from shoppinggpt.tool.policy_search import VectorStoreManager
+
+        store = tempfile.mkdtemp(prefix="bench-faiss-")
+        try:
+            manager = VectorStoreManager.create(POLICY_TEXT, store, config.embeddings())
+        finally:
+            shutil.rmtree(store, ignore_errors=True)
+        vectorstore = manager.vectorstore
+        return lambda i: vectorstore.similarity_search(POLICY_QUERIES[i % len(POLICY_QUERIES)], k=5)
+    return Scenario("policy_search", setup, iterations=100)
+
+
+_BACKEND = None
+
+
+def load_backend():
+    """Import backend/main.py (it reads data/*.csv relative to backend/)."""
+    global _BACKEND
+    if _BACKEND is None:
+        cwd = os.getcwd()
+        os.chdir(BACKEND_DIR)
+        try:
+            spec = importlib.util.spec_from_file_location("shoppinggpt_backend", os.path.join(BACKEND_DIR, "main.py"))
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[spec.name] = module
+            spec.loader.exec_module(module)
+        finally:
+            os.chdir(cwd)
+        _BACKEND = module
+    return _BACKEND
+
+
+def _recommendation(devices, plans) -> str:
+    return json.dumps({
+        "devices": [{"id": str(devices[0]["id"]), "name": devices[0]["name"], "reasoning": "fits"}],
+        "plans": [{"id": str(plans[0]["id"]), "name": plans[0]["name"], "reasoning": "fits"}],
+        "response": "Here is what I would pick.",
+        "needs_clarification": False,
+    })
+
+
+def _backend_client(config: BenchConfig):
+    import httpx
+
+    backend = load_backend()
+    reply = _recommendation(backend.catalog.table("devices").records(), backend.catalog.table("plans").records())
+    backend.chat_model = config.chat_model(lambda messages: reply)
+    backend.azure_openai_available = True
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=backend.app), base_url="http://bench")
+
+
+def api_chat(config: BenchConfig, concurrency: int = 8) -> Scenario:
+    def setup():
+        client = _backend_client(config)
+
+        async def op(i: int) -> None:
+            response = await client.post("/api/chat", json={
+                "message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)],
+                "session_id": f"bench-{i % 16}",
+            })
+            response.raise_for_status()
+        return op
+    return Scenario("api.chat", setup, iterations=100, warmup=4, concurrency=concurrency)
+
+
+def api_bundles(config: BenchConfig, concurrency: int = 8) -> Scenario:
+    def setup():
+        client = _backend_client(config)
+
+        async def op(i: int) -> None:
+            (await client.get("/api/bundles")).raise_for_status()
+        return op
+    return Scenario("api.bundles", setup, iterations=200, concurrency=concurrency)
+
+
+SCENARIOS = {
+    "routing.local": local_routing,
+    "routing.cosine": cosine_routing,
+    "product_search": product_search,
+    "policy_search": policy_search,
+    "api.chat": api_chat,
+    "api.bundles": api_bundles,
+}
+
+
+def build(names: Optional[List[str]] = None, config: Optional[BenchConfig] = None) -> List[Scenario]:
+    config = config or BenchConfig()
+    unknown = set(names or ()) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return [SCENARIOS[name](config) for name in (names or SCENARIOS)]
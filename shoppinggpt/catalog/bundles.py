@@ -0,0 +1,197 @@
+import math
+import os
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from shoppinggpt.catalog.index import CatalogIndex, Constraints
+
+# Months of plan payments counted in a bundle's total cost.
+CONTRACT_MONTHS = int(os.getenv("BUNDLE_CONTRACT_MONTHS", "24"))
+
+FACTORS = ("budget", "features", "data", "value")
+
+
+class BundleWeights(NamedTuple):
+    budget: float = 0.35
+    features: float = 0.30
+    data: float = 0.15
+    value: float = 0.20
+
+    @classmethod
+    def parse(cls, spec: Optional[str], default: Optional["BundleWeights"] = None) -> "BundleWeights":
+        """'budget=0.5,value=0.3' overrides the named weights of `default`."""
+        weights = (default or cls())._asdict()
+        for part in (spec or "").split(","):
+            if not part.strip():
+                continue
+            name, _, value = part.partition("=")
+            name = name.strip()
+            if name not in weights:
+                raise ValueError(f"Unknown bundle weight {name!r}; expected one of {', '.join(FACTORS)}")
+            weights[name] = float(value)
+        if sum(weights.values()) <= 0:
+            raise ValueError("Bundle weights must not all be zero")
+        return cls(**weights)
+
+
+DEFAULT_WEIGHTS = BundleWeights.parse(os.getenv("BUNDLE_WEIGHTS"))
+
+
+def _budget_fit(prices, max_price: float):
+    """1 within budget, falling linearly to 0 at twice the budget."""
+    import numpy as np
+
+    return np.clip(1.0 - (prices - max_price) / max_price, 0.0, 1.0)
+
+
+def _hard(constraints: Constraints) -> Constraints:
+    return Constraints(min_price=constraints.min_price, brands=constraints.brands, types=constraints.types,
+                       min_storage_gb=constraints.min_storage_gb)
+
+
+class BundleEngine:
+    """Scores every device x plan pair for a request and returns the best few.
+
+    Per catalog version the engine precomputes the D x P cost grid, the
+    relative value of each pair and the plans' data scores; a request then
+    adds its budget, feature and data terms as broadcast (D, 1) and (1, P)
+    arrays, combines them with the weights and picks the top k with
+    `argpartition`, so only k pairs are ever sorted.
+    """
+
+    def __init__(self, index: CatalogIndex, contract_months: int = CONTRACT_MONTHS):
+        import numpy as np
+
+        self.index = index
+        self.version = index.version
+        self.contract_months = contract_months
+        devices, plans = index.devices, index.plans
+        self.cost = devices.price[:, None] + plans.price[None, :] * contract_months
+        finite = self.cost[np.isfinite(self.cost)]
+        cheapest = finite.min() if finite.size else 1.0
+        self.value = np.where(np.isfinite(self.cost), cheapest / self.cost, 0.0)
+
+        data = plans.data_gb
+        known = data[np.isfinite(data)]
+        largest = known.max() if known.size else 1.0
+        # Unlimited scores 1, unknown ("Shared") 0, the rest on a log scale.
+        self.data_allowance = np.where(
+            np.isinf(data), 1.0, np.nan_to_num(np.log1p(data) / np.log1p(largest), nan=0.0))
+
+    def _feature_hits(self, feature_index, groups):
+        """(rows, len(groups)) bool: which requested feature groups each row has."""
+        import numpy as np
+
+        hits = np.zeros((len(feature_index), len(groups)), dtype=bool)
+        for column, group in enumerate(groups):
+            mask = feature_index.mask(group)
+            if mask is not None:
+                hits[:, column] = (feature_index.bits & mask).any(axis=1)
+        return hits
+
+    def _data_fit(self, need: Optional[float]):
+        """(P,) score of each plan's data allowance against the requested minimum."""
+        import numpy as np
+
+        data = self.index.plans.data_gb
+        if not need:
+            return self.data_allowance
+        if math.isinf(need):
+            return np.where(np.isinf(data), 1.0, 0.0)
+        return np.nan_to_num(np.minimum(data / need, 1.0), nan=0.0, posinf=1.0)
+
+    def scores(self, constraints: Dict[str, Constraints],
+               weights: BundleWeights = DEFAULT_WEIGHTS) -> Dict[str, Any]:
+        """Per-factor (D, P) score grids and their weighted total."""
+        import numpy as np
+
+        devices, plans = self.index.devices, self.index.plans
+        shape = self.cost.shape
+        wanted_devices, wanted_plans = constraints["devices"], constraints["plans"]
+
+        fits = []
+        if wanted_devices.max_price and wanted_devices.max_price > 0:
+            fits.append(_budget_fit(devices.price, wanted_devices.max_price)[:, None])
+        if wanted_plans.max_price and wanted_plans.max_price > 0:
+            fits.append(_budget_fit(plans.price, wanted_plans.max_price)[None, :])
+        budget = np.broadcast_to(sum(fits) / len(fits), shape) if fits else np.ones(shape)
+
+        # A requested feature counts once, whether the device or the plan has it.
+        groups = list(dict.fromkeys(wanted_devices.features + wanted_plans.features))
+        if groups:
+            hits = (self._feature_hits(devices, groups)[:, None, :]
+                    | self._feature_hits(plans, groups)[None, :, :])
+            features = hits.mean(axis=2)
+        else:
+            features = np.ones(shape)
+
+        data = np.broadcast_to(self._data_fit(wanted_plans.min_data_gb)[None, :], shape)
+        grids = {"budget": budget, "features": features, "data": data, "value": self.value}
+        total = sum(getattr(weights, name) * grids[name] for name in FACTORS) / sum(weights)
+
+        # Brand, plan type, storage and minimum prices are hard filters;
+        # budgets, features and data only lower the score.
+        allowed = (devices.match(_hard(wanted_devices))[:, None] & plans.match(_hard(wanted_plans))[None, :])
+        total = np.where(allowed & np.isfinite(total), total, -np.inf)
+        return {"grids": grids, "total": total, "groups": groups}
+
+    def rank(self, constraints: Dict[str, Constraints], top: int = 5,
+             weights: BundleWeights = DEFAULT_WEIGHTS) -> List[Dict[str, Any]]:
+        """The `top` bundles, best first, each with its score breakdown and reasons."""
+        import numpy as np
+
+        if not self.cost.size or top <= 0:
+            return []
+        scored = self.scores(constraints, weights)
+        total = scored["total"].ravel()
+        k = min(top, int(np.isfinite(total).sum()))
+        if k == 0:
+            return []
+        best = np.argpartition(-total, k - 1)[:k]
+        # Ties go to the cheaper bundle.
+        best = best[np.lexsort((self.cost.ravel()[best], -total[best]))]
+
+        devices = self.index.devices.table.records()
+        plans = self.index.plans.table.records()
+        bundles = []
+        for flat in best:
+            d, p = divmod(int(flat), self.cost.shape[1])
+            device, plan = devices[d], plans[p]
+            scores = {name: round(float(scored["grids"][name][d, p]), 4) for name in FACTORS}
+            owned = set(device.get("features") or ()) | set(plan.get("features") or ())
+            matched = [next(f for f in group if f in owned) for group in scored["groups"] if owned.intersection(group)]
+            bundles.append({
+                "device": device["name"],
+                "plan": plan["name"],
+                "device_id": device["id"],
+                "plan_id": plan["id"],
+                "price": float(device["price"]) + float(plan["price"]),
+                "device_image": device.get("image"),
+                "total_cost": round(float(self.cost[d, p]), 2),
+                "score": round(float(total[flat]), 4),
+                "scores": scores,
+                "matched_features": matched,
+                "reasons": self._reasons(scores, constraints, matched, plan),
+            })
+        return bundles
+
+    def _reasons(self, scores: Dict[str, float], constraints: Dict[str, Constraints],
+                 matched: List[str], plan: Dict[str, Any]) -> List[str]:
+        reasons = []
+        if constraints["devices"].max_price or constraints["plans"].max_price:
+            reasons.append("fits your budget" if scores["budget"] >= 1.0 else "slightly over your budget")
+        if matched:
+            reasons.append("has " + ", ".join(matched))
+        if plan.get("data"):
+            reasons.append(f"includes {plan['data']} data")
+        if scores["value"] >= 0.8:
+            reasons.append(f"among the lowest {self.contract_months}-month totals")
+        return reasons
+
+
+def explain(bundle: Dict[str, Any]) -> str:
+    """One sentence for a ranked bundle, e.g. for the assistant's reply."""
+    reasons = bundle["reasons"]
+    if not reasons:
+        return f"{bundle['device']} with {bundle['plan']}."
+    text = ", ".join(reasons[:-1]) + (" and " if len(reasons) > 1 else "") + reasons[-1]
+    return f"{bundle['device']} with {bundle['plan']}: {text}."
@@ -0,0 +1,225 @@
+import math
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from shoppinggpt.catalog.snapshot import CatalogSnapshot, Table
+
+# Words customers use for features the catalog names differently. A group
+# matches a row that has any of its features; names missing from a table
+# are ignored for that table.
+FEATURE_ALIASES = {
+    "netflix": ("StreamOn Music & Video", "StreamOn All"),
+    "youtube": ("StreamOn Music & Video", "StreamOn All"),
+    "video streaming": ("StreamOn Music & Video", "StreamOn All"),
+    "ott": ("StreamOn Music & Video", "StreamOn All"),
+    "spotify": ("StreamOn Music", "StreamOn Music & Video", "StreamOn All"),
+    "music streaming": ("StreamOn Music", "StreamOn Music & Video", "StreamOn All"),
+    "roaming": ("EU Roaming",),
+    "no contract": ("No contract",),
+    "waterproof": ("Water Resistant",),
+    "fast charging": ("Fast Charging", "100W Fast Charging"),
+    "amoled": ("AMOLED", "Super AMOLED", "Dynamic AMOLED"),
+    "headphone jack": ("3.5mm Headphone Jack",),
+}
+
+# Never a prefix of a longer number, or "50GB" would backtrack to a price of 5.
+_NUMBER = r"(\d+(?:[.,]\d+)?)(?!\d|[.,]\d)"
+_NOT_A_SIZE = r"(?!\s*(?:gb|tb|mp|w\b|%|-?month|-?year))"
+_MAX_PRICE = re.compile(
+    r"(?:under|below|less than|cheaper than|at most|max(?:imum)?|up to|within|budget(?: of)?|<=?)\s*"
+    rf"(?:€|eur\s*)?{_NUMBER}{_NOT_A_SIZE}", re.I)
+_MIN_PRICE = re.compile(rf"(?:over|above|more than|at least|>=?)\s*(?:€|eur\s*)?{_NUMBER}{_NOT_A_SIZE}", re.I)
+_SIZE = re.compile(r"(\d+)\s*(gb|tb)\b(?:\s+(?:of\s+)?(data|storage))?", re.I)
+_PLAN_WORDS = re.compile(r"\b(?:plans?|tariffs?|sim|contract|subscription)\b", re.I)
+_DEVICE_WORDS = re.compile(r"\b(?:phones?|devices?|smartphones?|handsets?)\b", re.I)
+_MONTHLY = re.compile(r"^\s*(?:€|eur(?:os?)?)?\s*(?:/\s*mo|per month|a month|monthly)", re.I)
+
+
+@lru_cache(maxsize=4096)
+def _words(phrase: str) -> "re.Pattern":
+    return re.compile(rf"(?<!\w){re.escape(phrase)}(?!\w)", re.I)
+
+
+def parse_gb(value: Optional[str]) -> float:
+    """'128GB' -> 128, '1TB' -> 1024, 'Unlimited' -> inf, anything else -> nan."""
+    text = str(value or "").strip().lower()
+    if text == "unlimited":
+        return math.inf
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*(gb|tb)", text)
+    if not match:
+        return math.nan
+    return float(match.group(1)) * (1024 if match.group(2) == "tb" else 1)
+
+
+class Constraints(NamedTuple):
+    """Filters for one catalog table; None/empty means unconstrained."""
+
+    max_price: Optional[float] = None
+    min_price: Optional[float] = None
+    features: Tuple[Tuple[str, ...], ...] = ()  # every group must match
+    brands: Tuple[str, ...] = ()
+    types: Tuple[str, ...] = ()
+    min_storage_gb: Optional[float] = None
+    min_data_gb: Optional[float] = None
+
+    def __bool__(self) -> bool:
+        return any(value not in (None, ()) for value in self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-safe form; an unlimited minimum is reported as "unlimited"."""
+        return {key: "unlimited" if value == math.inf else value for key, value in self._asdict().items()}
+
+
+class FeatureIndex:
+    """One catalog table as NumPy columns plus its feature bitset.
+
+    Feature names are interned to bit positions when the snapshot is
+    compiled; each row is `words` uint64s, so a required feature group is
+    one AND and one `any` over the whole table.
+    """
+
+    def __init__(self, table: Table):
+        import numpy as np
+
+        self.table = table
+        self.vocabulary = table.vocabulary() if "features" in table.columns else []
+        self._bits = {feature.lower(): i for i, feature in enumerate(self.vocabulary)}
+        words = 1
+        if self.vocabulary:
+            bits, words = table.bitset()
+            self.bits = np.frombuffer(bits, dtype=np.uint64).reshape(len(table), words)
+        else:
+            self.bits = np.zeros((len(table), 1), dtype=np.uint64)
+        self.words = words
+        self.price = self._floats("price", lambda value: math.nan if value is None else float(value))
+        self.storage_gb = self._floats("storage", parse_gb)
+        self.data_gb = self._floats("data", parse_gb)
+        self.brand = self._labels("brand")
+        self.type = self._labels("type")
+
+    def _floats(self, name: str, convert):
+        import numpy as np
+
+        if name not in self.table.columns:
+            return np.full(len(self.table), np.nan)
+        return np.array([convert(value) for value in self.table.column(name)], dtype=np.float64)
+
+    def _labels(self, name: str):
+        import numpy as np
+
+        values = self.table.column(name) if name in self.table.columns else [None] * len(self.table)
+        return np.array([(value or "").lower() for value in values], dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def mask(self, features: Sequence[str]):
+        """Bitmask (one uint64 per word) of the known `features`, or None if none are known."""
+        import numpy as np
+
+        positions = [self._bits[f.lower()] for f in features if f.lower() in self._bits]
+        if not positions:
+            return None
+        mask = np.zeros(self.words, dtype=np.uint64)
+        for position in positions:
+            mask[position // 64] |= np.uint64(1 << (position % 64))
+        return mask
+
+    def match(self, constraints: Constraints):
+        """Boolean array of the rows that satisfy `constraints`."""
+        import numpy as np
+
+        keep = np.ones(len(self), dtype=bool)
+        if constraints.max_price is not None:
+            keep &= self.price <= constraints.max_price
+        if constraints.min_price is not None:
+            keep &= self.price >= constraints.min_price
+        if constraints.min_storage_gb is not None:
+            keep &= self.storage_gb >= constraints.min_storage_gb
+        if constraints.min_data_gb is not None:
+            keep &= self.data_gb >= constraints.min_data_gb
+        if constraints.brands:
+            keep &= np.isin(self.brand, [brand.lower() for brand in constraints.brands])
+        if constraints.types:
+            keep &= np.isin(self.type, [kind.lower() for kind in constraints.types])
+        for group in constraints.features:
+            mask = self.mask(group)
+            if mask is not None:
+                keep &= (self.bits & mask).any(axis=1)
+        return keep
+
+    def search(self, constraints: Constraints, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Matching records, cheapest first."""
+        import numpy as np
+
+        rows = np.flatnonzero(self.match(constraints))
+        rows = rows[np.argsort(self.price[rows], kind="stable")][:limit]
+        records = self.table.records()
+        return [records[row] for row in rows]
+
+    def known_features(self, text: str) -> List[Tuple[str, ...]]:
+        groups = [(feature,) for feature in self.vocabulary if _words(feature).search(text)]
+        for alias, features in FEATURE_ALIASES.items():
+            if _words(alias).search(text) and any(f.lower() in self._bits for f in features):
+                groups.append(features)
+        return groups
+
+    def known_labels(self, labels, text: str) -> Tuple[str, ...]:
+        return tuple(sorted(label for label in set(labels) if label and _words(label).search(text)))
+
+
+class CatalogIndex:
+    """Feature indexes over the devices and plans of one catalog snapshot."""
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.version = snapshot.version
+        self.devices = FeatureIndex(snapshot.table("devices"))
+        self.plans = FeatureIndex(snapshot.table("plans"))
+
+    def parse(self, text: str) -> Dict[str, Constraints]:
+        """Constraints per table from a free-text request like "5G phone under 600 with Netflix"."""
+        prices = {"devices": {}, "plans": {}}
+        for pattern, key in ((_MAX_PRICE, "max_price"), (_MIN_PRICE, "min_price")):
+            for match in pattern.finditer(text):
+                before = text[:match.start()]
+                plan_word = max((m.end() for m in _PLAN_WORDS.finditer(before)), default=-1)
+                device_word = max((m.end() for m in _DEVICE_WORDS.finditer(before)), default=-1)
+                monthly = _MONTHLY.match(text[match.end():])
+                table = "plans" if monthly or plan_word > device_word else "devices"
+                prices[table][key] = float(match.group(1).replace(",", "."))
+
+        storage, data = None, None
+        for match in _SIZE.finditer(text):
+            size = float(match.group(1)) * (1024 if match.group(2).lower() == "tb" else 1)
+            kind = (match.group(3) or "").lower()
+            if kind == "data" or (not kind and size < 32):
+                data = size
+            else:
+                storage = size
+        if _words("unlimited").search(text):
+            data = math.inf
+
+        return {
+            "devices": Constraints(
+                features=tuple(self.devices.known_features(text)),
+                brands=self.devices.known_labels(self.devices.brand, text),
+                min_storage_gb=storage,
+                **prices["devices"],
+            ),
+            "plans": Constraints(
+                features=tuple(self.plans.known_features(text)),
+                types=self.plans.known_labels(self.plans.type, text),
+                min_data_gb=data,
+                **prices["plans"],
+            ),
+        }
+
+    def search(self, text: str = "", limit: Optional[int] = None,
+               constraints: Optional[Dict[str, Constraints]] = None) -> Dict[str, Any]:
+        constraints = constraints or self.parse(text)
+        return {
+            "constraints": {name: c.to_dict() for name, c in constraints.items()},
+            "devices": self.devices.search(constraints["devices"], limit),
+            "plans": self.plans.search(constraints["plans"], limit),
+        }
@@ -0,0 +1,115 @@
+import gzip
+import hashlib
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import orjson
+
+from shoppinggpt.catalog.snapshot import CatalogSnapshot, CatalogStore
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; clients then get gzip
+    brotli = None
+
+CACHE_CONTROL = "no-cache"  # always revalidate; unchanged catalogs cost a 304
+
+
+class PreparedResponse(NamedTuple):
+    """A JSON body serialized and compressed once, with one strong ETag per encoding."""
+
+    etag: str
+    bodies: Dict[str, bytes]  # content-encoding ("identity", "gzip", "br") -> body
+
+    def etag_for(self, encoding: str) -> str:
+        return self.etag if encoding == "identity" else f'{self.etag[:-1]}-{encoding}"'
+
+
+def prepare(payload: Any) -> PreparedResponse:
+    body = orjson.dumps(payload)
+    bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(body, quality=11)
+    return PreparedResponse(f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', bodies)
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> Dict[str, float]:
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def _choose_encoding(prepared: PreparedResponse, accept_encoding: Optional[str]) -> str:
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in ("br", "gzip"):
+        if encoding in prepared.bodies and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def _matches(prepared: PreparedResponse, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    if "*" in tags:
+        return True
+    # If-None-Match uses weak comparison; proxies may have weakened the tag.
+    tags = {tag[2:] if tag.startswith("W/") else tag for tag in tags}
+    return any(prepared.etag_for(encoding) in tags for encoding in prepared.bodies)
+
+
+def negotiate(prepared: PreparedResponse, if_none_match: Optional[str] = None,
+              accept_encoding: Optional[str] = None) -> Tuple[int, bytes, Dict[str, str]]:
+    """(status, body, headers) for a GET, honouring If-None-Match and Accept-Encoding."""
+    encoding = _choose_encoding(prepared, accept_encoding)
+    headers = {
+        "ETag": prepared.etag_for(encoding),
+        "Cache-Control": CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if _matches(prepared, if_none_match):
+        return 304, b"", headers
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return 200, prepared.bodies[encoding], headers
+
+
+class CatalogPayloads:
+    """Prebuilt JSON responses for the tables of a CatalogStore.
+
+    Rebuilt on the first request after the catalog version changes, so a
+    request normally costs a dict lookup.
+    """
+
+    def __init__(self, store: CatalogStore, names: Sequence[str]):
+        self.store = store
+        self.names = tuple(names)
+        self.builds = 0
+        self._build = store.cached(self._prepare)
+
+    def _prepare(self, snapshot: CatalogSnapshot) -> Dict[str, PreparedResponse]:
+        self.builds += 1
+        return {name: prepare(snapshot.table(name).records()) for name in self.names}
+
+    def get(self, name: str) -> PreparedResponse:
+        return self._build()[name]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.store.version,
+            "builds": self.builds,
+            "payloads": {
+                name: {"etag": prepared.etag, "bytes": {enc: len(body) for enc, body in prepared.bodies.items()}}
+                for name, prepared in self._build().items()
+            },
+        }
@@ -0,0 +1,390 @@
+import csv
+import functools
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Stored as ";"-joined text (to keep their order) plus a per-row feature bitset.
+LIST_COLUMNS = ("features",)
+
+_MAGIC = b"SGCT"
+_VERSION = 1
+_PREAMBLE = struct.Struct("<4sHxxI")  # magic, format version, header length
+_ALIGN = 8
+
+
+def _column_type(values: List[str]) -> Callable[[str], Any]:
+    """int if every non-empty value is an integer, else float if numeric, else str."""
+    present = [value for value in values if value != ""]
+    for kind in (int, float):
+        try:
+            for value in present:
+                kind(value)
+        except ValueError:
+            continue
+        return kind
+    return str
+
+
+def read_catalog_csv(path: str) -> List[Dict[str, Any]]:
+    """CSV rows typed per column like pandas would, with list columns split on ';'."""
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        return []
+    types = {column: _column_type([row[column] or "" for row in rows]) for column in rows[0]}
+    records = []
+    for row in rows:
+        record = {}
+        for column, value in row.items():
+            value = value or ""
+            if column in LIST_COLUMNS:
+                record[column] = value.split(";") if value else []
+            else:
+                record[column] = types[column](value) if value != "" else None
+        records.append(record)
+    return records
+
+
+def _pad(out: bytearray) -> None:
+    out.extend(b"\0" * (-len(out) % _ALIGN))
+
+
+def _encode_table(records: List[Dict[str, Any]], data: bytearray) -> Dict[str, Any]:
+    """Append the columns of `records` to `data`; returns the table's header entry.
+
+    Block offsets are relative to the start of the data section.
+    """
+    columns = []
+
+    def block(payload: bytes) -> Dict[str, int]:
+        _pad(data)
+        offset = len(data)
+        data.extend(payload)
+        return {"offset": offset, "length": len(payload)}
+
+    def strings(values: Sequence[Optional[str]]) -> Dict[str, Any]:
+        encoded = [(value or "").encode("utf-8") for value in values]
+        offsets = array("I", [0])
+        for value in encoded:
+            offsets.append(offsets[-1] + len(value))
+        return {"offsets": block(offsets.tobytes()), "data": block(b"".join(encoded))}
+
+    names = list(records[0]) if records else []
+    for name in names:
+        values = [record[name] for record in records]
+        present = [value for value in values if value is not None]
+        if name in LIST_COLUMNS:
+            vocabulary: Dict[str, int] = {}
+            masks = []
+            for items in values:
+                mask = 0
+                for item in items:
+                    mask |= 1 << vocabulary.setdefault(item, len(vocabulary))
+                masks.append(mask)
+            words = max(1, -(-len(vocabulary) // 64))
+            bits = array("Q", (mask >> (64 * w) & 0xFFFFFFFFFFFFFFFF for mask in masks for w in range(words)))
+            column = {"kind": "list", "vocabulary": list(vocabulary), "words": words,
+                      "bits": block(bits.tobytes()), **strings([";".join(items) for items in values])}
+        elif present and all(isinstance(value, int) for value in present) and len(present) == len(values):
+            column = {"kind": "int", "values": block(array("q", values).tobytes())}
+        elif present and all(isinstance(value, (int, float)) for value in present):
+            floats = array("d", (float("nan") if value is None else value for value in values))
+            column = {"kind": "float", "values": block(floats.tobytes())}
+        else:
+            column = {"kind": "str", **strings(values)}
+        columns.append({"name": name, **column})
+    return {"rows": len(records), "columns": columns}
+
+
+def source_version(paths: Dict[str, str]) -> str:
+    """Content hash of the source CSVs; the catalog version."""
+    digest = hashlib.blake2b(f"v{_VERSION}".encode(), digest_size=8)
+    for name in sorted(paths):
+        digest.update(name.encode("utf-8") + b"\0")
+        try:
+            with open(paths[name], "rb") as f:
+                digest.update(f.read())
+        except FileNotFoundError:
+            digest.update(b"\xff missing")
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def compile_catalog(paths: Dict[str, str], output: str, version: Optional[str] = None) -> str:
+    """Compile the CSVs in `paths` (table name -> file) into a snapshot at `output`.
+
+    The file is written next to `output` and renamed over it, so readers
+    see either the old snapshot or the new one. Missing CSVs become empty
+    tables. Returns the catalog version.
+    """
+    version = version or source_version(paths)
+    tables = {}
+    for name, path in paths.items():
+        try:
+            tables[name] = read_catalog_csv(path)
+        except FileNotFoundError:
+            logger.warning("Catalog source %s not found; serving an empty %s table", path, name)
+            tables[name] = []
+
+    data = bytearray()
+    header = {"version": version, "tables": {name: _encode_table(records, data) for name, records in tables.items()}}
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    preamble = _PREAMBLE.pack(_MAGIC, _VERSION, len(header_bytes))
+    gap = -(len(preamble) + len(header_bytes)) % _ALIGN
+
+    directory = os.path.dirname(os.path.abspath(output))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".catalog-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(preamble + header_bytes + b"\0" * gap)
+            f.write(data)
+        os.replace(tmp, output)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return version
+
+
+class Table:
+    """Read-only columns of one catalog table, backed by the snapshot's mmap."""
+
+    def __init__(self, name: str, meta: Dict[str, Any], data: memoryview):
+        self.name = name
+        self.rows = meta["rows"]
+        self._meta = {column["name"]: column for column in meta["columns"]}
+        self._data = data
+        self._columns: Dict[str, List[Any]] = {}
+        self._records: Optional[List[Dict[str, Any]]] = None
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._meta)
+
+    def _block(self, ref: Dict[str, int]) -> memoryview:
+        return self._data[ref["offset"]:ref["offset"] + ref["length"]]
+
+    def _strings(self, meta: Dict[str, Any]) -> List[str]:
+        offsets = self._block(meta["offsets"]).cast("I")
+        data = bytes(self._block(meta["data"]))
+        return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(self.rows)]
+
+    def column(self, name: str) -> List[Any]:
+        """Decoded values (cached); missing cells are None."""
+        if name not in self._columns:
+            self._columns[name] = self._decode(self._meta[name])
+        return self._columns[name]
+
+    def _decode(self, meta: Dict[str, Any]) -> List[Any]:
+        kind = meta["kind"]
+        if kind in ("int", "float"):
+            values = self._block(meta["values"]).cast("q" if kind == "int" else "d").tolist()
+            return [None if value != value else value for value in values]
+        strings = self._strings(meta)
+        if kind == "list":
+            return [value.split(";") if value else [] for value in strings]
+        return [value or None for value in strings]
+
+    def values(self, name: str) -> memoryview:
+        """Zero-copy view of a numeric column ('q' or 'd' items)."""
+        meta = self._meta[name]
+        if meta["kind"] not in ("int", "float"):
+            raise TypeError(f"{self.name}.{name} is not numeric")
+        return self._block(meta["values"]).cast("q" if meta["kind"] == "int" else "d")
+
+    def numpy(self, name: str):
+        """A numeric column as a read-only NumPy array over the mmap."""
+        import numpy as np
+
+        view = self.values(name)
+        return np.frombuffer(view, dtype=np.int64 if view.format == "q" else np.float64)
+
+    def vocabulary(self, name: str = "features") -> List[str]:
+        return list(self._meta[name]["vocabulary"])
+
+    def bitset(self, name: str = "features") -> Tuple[memoryview, int]:
+        """(uint64 words, words per row) of a list column's feature bitset."""
+        meta = self._meta[name]
+        return self._block(meta["bits"]).cast("Q"), meta["words"]
+
+    def mask(self, row: int, name: str = "features") -> int:
+        bits, words = self.bitset(name)
+        mask = 0
+        for w in range(words):
+            mask |= bits[row * words + w] << (64 * w)
+        return mask
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Rows as dicts, decoded once per snapshot; treat them as read-only."""
+        if self._records is None:
+            columns = {name: self.column(name) for name in self._meta}
+            self._records = [{name: values[i] for name, values in columns.items()} for i in range(self.rows)]
+        return self._records
+
+
+class CatalogSnapshot:
+    """A compiled catalog opened with mmap, so worker processes share its pages."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = _PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a version {_VERSION} catalog snapshot")
+        if sys.byteorder != "little":
+            raise ValueError("Catalog snapshots are little-endian")
+        start = _PREAMBLE.size + header_length
+        header = json.loads(self._mmap[_PREAMBLE.size:start].decode("utf-8"))
+        self.version: str = header["version"]
+        data = memoryview(self._mmap)[start + (-start % _ALIGN):]
+        self.tables = {name: Table(name, meta, data) for name, meta in header["tables"].items()}
+
+    def table(self, name: str) -> Table:
+        return self.tables[name]
+
+    @staticmethod
+    def read_version(path: str) -> Optional[str]:
+        """Version of the snapshot at `path`, or None if there is no valid one."""
+        try:
+            with open(path, "rb") as f:
+                magic, version, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+                if magic != _MAGIC or version != _VERSION:
+                    return None
+                return json.loads(f.read(header_length).decode("utf-8"))["version"]
+        except (OSError, ValueError, struct.error, KeyError):
+            return None
+
+
+class CatalogStore:
+    """The current catalog snapshot, swapped in atomically when the CSVs change.
+
+    Every worker compiles the CSVs into the same snapshot file only when no
+    up-to-date snapshot exists, then memory-maps it; the OS shares the
+    pages between processes. `refresh` (or the watcher thread from
+    `start`) swaps in a new snapshot when a source file changes and calls
+    the subscribers with the new version. Readers keep whatever snapshot
+    they already hold, and caches built with `cached` are rebuilt on the
+    next call after the version changes.
+    """
+
+    def __init__(self, sources: Dict[str, str], snapshot_path: str, poll_interval: float = 1.0):
+        self.sources = dict(sources)
+        self.snapshot_path = snapshot_path
+        self.poll_interval = poll_interval
+        self.swaps = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._signature: Optional[Tuple] = None
+        self._listeners: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _source_signature(self) -> Tuple:
+        signature = []
+        for name in sorted(self.sources):
+            try:
+                stat = os.stat(self.sources[name])
+                signature.append((name, stat.st_mtime_ns, stat.st_size, stat.st_ino))
+            except FileNotFoundError:
+                signature.append((name, None))
+        return tuple(signature)
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        if self._snapshot is None:
+            self.refresh()
+        return self._snapshot
+
+    @property
+    def version(self) -> str:
+        return self.snapshot.version
+
+    def table(self, name: str) -> Table:
+        return self.snapshot.table(name)
+
+    def subscribe(self, callback: Callable[[str], None]) -> None:
+        self._listeners.append(callback)
+
+    def refresh(self) -> bool:
+        """Swap in a new snapshot if the sources changed; True if one was."""
+        with self._lock:
+            signature = self._source_signature()
+            if self._snapshot is not None and signature == self._signature:
+                return False
+            version = source_version(self.sources)
+            if self._snapshot is not None and version == self._snapshot.version:
+                self._signature = signature  # touched but unchanged
+                return False
+            if CatalogSnapshot.read_version(self.snapshot_path) != version:
+                compile_catalog(self.sources, self.snapshot_path, version)
+            self._snapshot = CatalogSnapshot(self.snapshot_path)
+            self._signature = signature
+            self.swaps += 1
+        logger.info("Catalog snapshot %s loaded from %s", version, self.snapshot_path)
+        for callback in list(self._listeners):
+            try:
+                callback(version)
+            except Exception:
+                logger.exception("Catalog subscriber failed")
+        return True
+
+    def cached(self, fn: Callable[[CatalogSnapshot], Any]) -> Callable[[], Any]:
+        """`fn(snapshot)` computed once per catalog version."""
+        entry: List[Any] = [None, None]
+
+        @functools.wraps(fn)
+        def wrapper():
+            snapshot = self.snapshot
+            if entry[0] is not snapshot:
+                entry[1] = fn(snapshot)
+                entry[0] = snapshot
+            return entry[1]
+        return wrapper
+
+    def start(self) -> "CatalogStore":
+        """Poll the sources every `poll_interval` seconds on a daemon thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception:
+                # e.g. a CSV caught half-written; keep serving the last snapshot.
+                logger.exception("Catalog refresh failed")
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "snapshot_path": self.snapshot_path,
+            "swaps": self.swaps,
+            "watching": self._thread is not None,
+            "tables": {name: len(table) for name, table in snapshot.tables.items()} if snapshot else {},
+        }
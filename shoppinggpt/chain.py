@@ -1,8 +1,15 @@
-from langchain.prompts import PromptTemplate
-from langchain.memory import ConversationBufferMemory
-from langchain_core.runnables import RunnablePassthrough
+from typing import TYPE_CHECKING
+
+from shoppinggpt.llm.prompt_budget import budget_for, count_tokens, fit_history, model_of
+
+if TYPE_CHECKING:
+    from langchain.memory import ConversationBufferMemory
+
+
+def create_chitchat_chain(llm, shared_memory: "ConversationBufferMemory"):
+    from langchain.prompts import PromptTemplate
+    from langchain_core.runnables import RunnablePassthrough
 
-def create_chitchat_chain(llm, shared_memory: ConversationBufferMemory):
     prompt_template = (
         "You are a friendly and helpful AI assistant for an online fashion store.\n"
         "Your task is to chat with customers in a casual and engaging manner, while subtly steering "
@@ -30,10 +37,15 @@ def create_chitchat_chain(llm, shared_memory: ConversationBufferMemory):
         template=prompt_template
     )
 
+    budget = budget_for(model_of(llm))
+
+    def history(inputs):
+        # Oldest turns go first when the conversation outgrows the budget.
+        room = budget - count_tokens(prompt_template) - count_tokens(inputs["input"])
+        return fit_history(shared_memory.load_memory_variables({})["history"], room, "chitchat")
+
     chain = (
-        RunnablePassthrough.assign(
-            history=lambda _: shared_memory.load_memory_variables({})["history"]
-        )
+        RunnablePassthrough.assign(history=history)
         | prompt
         | llm
     )
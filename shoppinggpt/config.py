@@ -1,7 +1,7 @@
 # config.py
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
 # Load environment variables
 load_dotenv(r"E:\chatbot\ShoppingGPT\.env")
@@ -14,7 +14,19 @@ DATA_PRODUCT_PATH = r"E:\chatbot\ShoppingGPT\data\products.db"
 DATA_TEXT_PATH = r"E:\chatbot\ShoppingGPT\data\policy.txt"
 STORE_DIRECTORY = r"E:\chatbot\ShoppingGPT\data\datastore"
 
+
 # Embeddings
-load_dotenv(r"E:\chatbot\ShoppingGPT\.env")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-EMBEDDINGS = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_embeddings():
+    """Build the embeddings client on first use."""
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    from shoppinggpt.llm.wrappers import CoalescingEmbeddings
+    return CoalescingEmbeddings(GoogleGenerativeAIEmbeddings(model="models/embedding-001"))
+
+
+def __getattr__(name):
+    # `EMBEDDINGS` used to be created at import time; keep the name working
+    # but only pay for langchain_google_genai when it is actually read.
+    if name == "EMBEDDINGS":
+        return get_embeddings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
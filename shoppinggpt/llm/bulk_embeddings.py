@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from shoppinggpt.background_loop import run_sync
+from shoppinggpt.llm.rate_limit import estimate_tokens, is_rate_limit_error
+from shoppinggpt.synthetic.writer import iter_jsonl
+from shoppinggpt.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Gemini's batchEmbedContents takes at most 100 texts per request.
+BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "20000"))
+CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+
+Progress = Callable[[int, int], None]
+
+
+def log_progress(done: int, total: int) -> None:
+    logger.info("Embedded %d/%d texts", done, total)
+
+
+def batches(texts: Sequence[str], batch_size: int = BATCH_SIZE, batch_tokens: int = BATCH_TOKENS) -> List[List[int]]:
+    """Indices of `texts` grouped into requests of at most `batch_size` texts and ~`batch_tokens` tokens."""
+    groups: List[List[int]] = []
+    current: List[int] = []
+    tokens = 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if current and (len(current) >= batch_size or tokens + cost > batch_tokens):
+            groups.append(current)
+            current, tokens = [], 0
+        current.append(i)
+        tokens += cost
+    if current:
+        groups.append(current)
+    return groups
+
+
+class EmbeddingCheckpoint:
+    """Vectors already embedded, appended to a JSONL file as each batch lands.
+
+    Keys hash the model, the mode (documents or query) and the text, so a
+    rerun after a crash, or after editing part of the corpus, only embeds
+    what it has not seen. Torn trailing lines are skipped on load.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.vectors: Dict[str, List[float]] = {}
+        if os.path.exists(path):
+            for record in iter_jsonl(path):
+                self.vectors[record["key"]] = record["vector"]
+        self._file = None
+
+    def append(self, items: Dict[str, List[float]]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        for key, vector in items.items():
+            self._file.write(json.dumps({"key": key, "vector": vector}) + "\n")
+        self._file.flush()
+        self.vectors.update(items)
+
+    def compact(self, keys: Sequence[str]) -> None:
+        """Rewrite the file with only `keys`, dropping vectors of texts no longer in the corpus."""
+        self.close()
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for key in dict.fromkeys(keys):
+                f.write(json.dumps({"key": key, "vector": self.vectors[key]}) + "\n")
+        os.replace(tmp, self.path)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BulkEmbedder:
+    """Embed a whole corpus: batched, `concurrency` requests in flight, retried with backoff.
+
+    Duplicate texts are embedded once. With a `checkpoint` path, finished
+    batches survive a crash and are not paid for again. `query=True` embeds
+    with `aembed_query` for callers that compare against query embeddings,
+    such as the semantic router; each text is then its own request, so
+    `concurrency` bounds the calls in flight and a retry resends one text.
+    """
+
+    def __init__(self, embeddings, batch_size: int = BATCH_SIZE, batch_tokens: int = BATCH_TOKENS,
+                 concurrency: int = CONCURRENCY, max_retries: int = MAX_RETRIES,
+                 checkpoint: Optional[str] = None, progress: Optional[Progress] = log_progress,
+                 query: bool = False, backoff: float = 1.0, max_backoff: float = 60.0):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.checkpoint_path = checkpoint
+        self.progress = progress
+        self.query = query
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.model_id = f"{type(embeddings).__name__}:{getattr(embeddings, 'model', None)}"
+        self.requests = 0
+        self.retries = 0
+
+    def key(self, text: str) -> str:
+        mode = "query" if self.query else "documents"
+        return hashlib.blake2b(f"{self.model_id}\0{mode}\0{text}".encode("utf-8"), digest_size=16).hexdigest()
+
+    async def _request(self, texts: List[str]) -> List[List[float]]:
+        if self.query:
+            return [await self.embeddings.aembed_query(text) for text in texts]
+        return await self.embeddings.aembed_documents(texts)
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            self.requests += 1
+            try:
+                with span("embed.batch", size=len(texts), attempt=attempt):
+                    vectors = await self._request(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(f"Got {len(vectors)} embeddings for {len(texts)} texts")
+                return vectors
+            except Exception as error:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                retry_after = getattr(error, "retry_after", None) if is_rate_limit_error(error) else None
+                delay = retry_after or min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning("Embedding batch of %d failed (%s); retrying in %.1fs", len(texts), error, delay)
+                await asyncio.sleep(delay)
+
+    async def aembed(self, texts: Sequence[str]) -> List[List[float]]:
+        keys = [self.key(text) for text in texts]
+        checkpoint = EmbeddingCheckpoint(self.checkpoint_path) if self.checkpoint_path else None
+        vectors: Dict[str, List[float]] = dict(checkpoint.vectors) if checkpoint else {}
+        unique = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        pending_keys = list(unique)
+        pending_texts = list(unique.values())
+        total = len(set(keys))
+        done = total - len(pending_keys)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+
+        async def run(group: List[int]) -> None:
+            nonlocal done
+            async with semaphore:
+                embedded = await self._embed_batch([pending_texts[i] for i in group])
+            items = {pending_keys[i]: list(vector) for i, vector in zip(group, embedded)}
+            vectors.update(items)
+            if checkpoint is not None:
+                checkpoint.append(items)
+            done += len(group)
+            if self.progress is not None:
+                self.progress(done, total)
+
+        try:
+            with span("embed.bulk", texts=len(texts), pending=len(pending_keys)) as bulk:
+                # aembed_query takes one text, so query mode batches by one.
+                batch_size = 1 if self.query else self.batch_size
+                tasks = [asyncio.ensure_future(run(group))
+                         for group in batches(pending_texts, batch_size, self.batch_tokens)]
+                try:
+                    await asyncio.gather(*tasks)
+                except BaseException:
+                    for task in tasks:
+                        task.cancel()
+                    raise
+                bulk.set_attribute("requests", self.requests)
+                bulk.set_attribute("retries", self.retries)
+            if checkpoint is not None:
+                checkpoint.compact(keys)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+        if pending_keys:
+            logger.info("Embedded %d texts in %.1fs", len(pending_keys), time.perf_counter() - start)
+        return [vectors[key] for key in keys]
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """`aembed` for synchronous callers, run on the shared background loop.
+
+        The embeddings client is cached process-wide, so it always runs on
+        that one loop rather than on a throwaway loop per call.
+        """
+        return run_sync(self.aembed(texts))
@@ -0,0 +1,100 @@
+import os
+from functools import lru_cache
+
+# Default model per provider; override with e.g. GROQ_MODEL=llama3-8b-8192.
+DEFAULT_MODELS = {
+    "azure": None,
+    "gemini": "gemini-1.5-flash",
+    "groq": "gemma-7b-it",
+    "fake": "fake",
+}
+
+# Where each provider's client reads its API key.
+API_KEY_ENV = {
+    "azure": "AZURE_OPENAI_API_KEY",
+    "gemini": "GOOGLE_API_KEY",
+    "groq": "GROQ_API_KEY",
+}
+
+
+def _usage_callbacks(provider: str, model: str):
+    """Token accounting callbacks (see shoppinggpt.accounting); USAGE_ACCOUNTING=false disables them."""
+    if os.getenv("USAGE_ACCOUNTING", "true").lower() != "true":
+        return None
+    from shoppinggpt.llm.usage import UsageCallbackHandler
+    return [UsageCallbackHandler(provider, model)]
+
+
+def create_chat_model(provider: str, temperature: float = 0):
+    """Build the LangChain chat model for one provider name."""
+    model = os.getenv(f"{provider.upper()}_MODEL", DEFAULT_MODELS.get(provider))
+    if provider == "fake":
+        # Offline stand-in for load tests: FAKE_LLM_LATENCY_MS is the median
+        # of a log-normal latency with spread FAKE_LLM_SIGMA.
+        from shoppinggpt.llm.fake import FakeChatModel, lognormal_latency
+        latency = lognormal_latency(float(os.getenv("FAKE_LLM_LATENCY_MS", "800")) / 1000,
+                                    float(os.getenv("FAKE_LLM_SIGMA", "0.5")))
+        return FakeChatModel(model, latency=latency)
+    callbacks = _usage_callbacks(provider, model or os.getenv("AZURE_OPENAI_DEPLOYMENT"))
+    if provider == "azure":
+        from langchain_community.chat_models import AzureChatOpenAI
+        return AzureChatOpenAI(
+            azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_key=os.getenv(API_KEY_ENV["azure"]),
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2023-05-15"),
+            temperature=temperature,
+            callbacks=callbacks,
+        )
+    if provider == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(temperature=temperature, model=model, callbacks=callbacks)
+    if provider == "groq":
+        from langchain_groq import ChatGroq
+        return ChatGroq(temperature=temperature, model=model, callbacks=callbacks)
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+def create_limited_chat_model(provider: str, temperature: float = 0):
+    """Traced `create_chat_model` behind the provider's shared RPM/TPM limiter."""
+    from shoppinggpt.llm.rate_limit import get_limiter
+    from shoppinggpt.llm.wrappers import RateLimitedChatModel, TracedChatModel
+
+    model = TracedChatModel(create_chat_model(provider, temperature), provider)
+    limiter = get_limiter(
+        provider,
+        os.getenv(f"{provider.upper()}_MODEL", DEFAULT_MODELS.get(provider)),
+        os.getenv(API_KEY_ENV.get(provider, ""), None),
+    )
+    return RateLimitedChatModel(model, limiter) if limiter is not None else model
+
+
+@lru_cache(maxsize=None)
+def create_llm(default_providers: str, temperature: float = 0):
+    """Chat model for the serving paths.
+
+    LLM_PROVIDERS (comma separated, e.g. "azure,gemini") overrides
+    `default_providers`. More than one provider builds a latency-aware
+    ProviderPool; LLM_HEDGE=true also hedges slow requests. Each provider
+    is rate limited to its RPM/TPM quota and identical concurrent prompts
+    are coalesced.
+    """
+    from shoppinggpt.llm.provider_pool import Provider, ProviderPool
+    from shoppinggpt.llm.wrappers import CoalescingChatModel, PooledChatModel
+
+    names = [
+        name.strip().lower()
+        for name in os.getenv("LLM_PROVIDERS", default_providers).split(",")
+        if name.strip()
+    ]
+    if len(names) == 1:
+        return CoalescingChatModel(create_limited_chat_model(names[0], temperature))
+
+    # A provider whose local quota is exhausted sheds the request, and the
+    # pool fails over to the next one.
+    pool = ProviderPool(
+        [Provider(name, create_limited_chat_model(name, temperature)) for name in names],
+        hedge=os.getenv("LLM_HEDGE", "false").lower() == "true",
+        hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+    )
+    return CoalescingChatModel(PooledChatModel(pool))
@@ -0,0 +1,151 @@
+import asyncio
+import math
+import random
+import time
+import zlib
+from functools import lru_cache
+from typing import AsyncIterator, Callable, List, Optional, Union
+
+
+def lognormal_latency(median: float, sigma: float = 0.5, seed: Optional[int] = None) -> Callable[[], float]:
+    """Seeded latency sampler with the long right tail typical of LLM APIs."""
+    rng = random.Random(seed)
+    mu = math.log(median) if median > 0 else 0.0
+    return lambda: rng.lognormvariate(mu, sigma) if median > 0 else 0.0
+
+
+class FakeMessage:
+    type = "ai"
+
+    def __init__(self, content: str):
+        self.content = content
+        self.tool_calls = []
+
+    def __repr__(self):
+        return f"FakeMessage(content={self.content!r})"
+
+    def __add__(self, other: "FakeMessage") -> "FakeMessage":
+        return FakeMessage(self.content + other.content)
+
+
+@lru_cache(maxsize=None)
+def _message_types():
+    """(message, chunk) classes: LangChain's when installed, so its parsers accept them.
+
+    Resolved once; FakeChatModel does it on construction so the import
+    never lands inside a timed call.
+    """
+    try:
+        from langchain_core.messages import AIMessage, AIMessageChunk
+    except ImportError:
+        return FakeMessage, FakeMessage
+    return AIMessage, AIMessageChunk
+
+
+def _ai_message(content: str, chunk: bool = False):
+    message, message_chunk = _message_types()
+    return (message_chunk if chunk else message)(content=content)
+
+
+class FakeProviderError(RuntimeError):
+    pass
+
+
+class FakeChatModel:
+    """Local stand-in for a chat provider, for tests and offline runs.
+
+    `latency` is seconds per call or a callable returning it; `fail_rate`
+    is the probability of raising FakeProviderError. `respond` maps the
+    input to the reply text and defaults to echoing the model name.
+    """
+
+    def __init__(
+        self,
+        name: str = "fake",
+        latency: Union[float, Callable[[], float]] = 0.0,
+        fail_rate: float = 0.0,
+        respond: Optional[Callable] = None,
+        seed: Optional[int] = None,
+    ):
+        self.model_name = name
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.respond = respond or (lambda input: f"reply from {name}")
+        self.calls = 0
+        self._random = random.Random(seed)
+        _message_types()
+
+    def _delay(self) -> float:
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _reply(self, input) -> FakeMessage:
+        self.calls += 1
+        if self.fail_rate and self._random.random() < self.fail_rate:
+            raise FakeProviderError(f"{self.model_name} failed")
+        return _ai_message(self.respond(input))
+
+    def invoke(self, input, config=None, **kwargs) -> FakeMessage:
+        time.sleep(self._delay())
+        return self._reply(input)
+
+    async def ainvoke(self, input, config=None, **kwargs) -> FakeMessage:
+        await asyncio.sleep(self._delay())
+        return self._reply(input)
+
+    async def astream(self, input, config=None, chunk_size: int = 16, **kwargs) -> AsyncIterator[FakeMessage]:
+        """The reply in `chunk_size`-character chunks, after the call's latency."""
+        await asyncio.sleep(self._delay())
+        content = self._reply(input).content
+        for start in range(0, len(content), chunk_size):
+            yield _ai_message(content[start:start + chunk_size], chunk=True)
+            await asyncio.sleep(0)
+
+    def bind_tools(self, tools, **kwargs) -> "FakeChatModel":
+        return self
+
+    def with_structured_output(self, schema, **kwargs):
+        raise NotImplementedError("FakeChatModel has no structured output mode")
+
+
+class FakeEmbeddings:
+    """Deterministic local embeddings: hashed character trigrams, L2-normalised.
+
+    Texts that share wording get similar vectors, so routers and vector
+    stores behave plausibly; `latency` is applied once per call.
+    """
+
+    def __init__(self, size: int = 256, latency: Union[float, Callable[[], float]] = 0.0):
+        self.size = size
+        self.latency = latency
+        self.model = f"fake-embeddings-{size}"
+        self.calls = 0
+
+    def _delay(self) -> float:
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        text = f" {text.lower()} "
+        for i in range(len(text) - 2):
+            vector[zlib.crc32(text[i:i + 3].encode("utf-8")) % self.size] += 1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self._delay())
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def __call__(self, text: str) -> List[float]:
+        return self.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self._delay())
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
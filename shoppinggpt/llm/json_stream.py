@@ -0,0 +1,329 @@
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# JSON schema of the recommendation object the /api/chat prompt asks for.
+# Also handed to `with_structured_output` when the provider supports it.
+RECOMMENDATION_SCHEMA = {
+    "title": "Recommendation",
+    "description": "Device and plan recommendation for the customer.",
+    "type": "object",
+    "properties": {
+        "devices": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string"},
+                    "name": {"type": "string"},
+                    "reasoning": {"type": "string"},
+                },
+                "required": ["id", "name", "reasoning"],
+            },
+        },
+        "plans": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string"},
+                    "name": {"type": "string"},
+                    "reasoning": {"type": "string"},
+                },
+                "required": ["id", "name", "reasoning"],
+            },
+        },
+        "response": {"type": "string"},
+        "needs_clarification": {"type": "boolean"},
+    },
+    "required": ["devices", "plans", "response", "needs_clarification"],
+}
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class RecommendationSchemaError(ValueError):
+    pass
+
+
+class StreamingJSONParser:
+    """Incremental scanner that pulls JSON objects out of LLM text.
+
+    Text is fed in chunks and every character is looked at once, so long
+    responses cost linear time no matter how many braces they contain.
+    Markdown fences and surrounding prose are skipped because only
+    balanced `{...}` spans outside of strings are considered; a span whose
+    brackets do not match is dropped.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        # Last position inside the current object where cutting the text
+        # and closing the open brackets yields valid JSON.
+        self._checkpoint: Optional[Tuple[int, str]] = None
+        self.objects: List[Any] = []
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume `chunk` and return the objects it completed."""
+        completed = []
+        for char in chunk:
+            if not self._stack:
+                if char == "{":
+                    self._buffer = [char]
+                    self._stack.append(char)
+                    self._checkpoint = (1, "}")
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                self._stack.append(char)
+                self._checkpoint = (len(self._buffer), self._closing())
+            elif char in "}]":
+                if _CLOSERS[self._stack.pop()] != char:
+                    self._reset()
+                    continue
+                if not self._stack:
+                    value = _loads("".join(self._buffer))
+                    if value is not None:
+                        completed.append(value)
+                    self._buffer = []
+                    self._checkpoint = None
+            elif char == ",":
+                self._checkpoint = (len(self._buffer) - 1, self._closing())
+        self.objects.extend(completed)
+        return completed
+
+    def _reset(self) -> None:
+        self._buffer = []
+        self._stack = []
+        self._checkpoint = None
+
+    def partial(self) -> Optional[Any]:
+        """Best-effort value of the object still being streamed."""
+        if not self._stack:
+            return None
+        text = "".join(self._buffer)
+        if self._in_string:
+            text = text[:-1] if self._escape else text
+            value = _loads(text + '"' + self._closing())
+            if value is not None:
+                return value
+        else:
+            value = _loads(text + self._closing())
+            if value is not None:
+                return value
+        if self._checkpoint is not None:
+            position, closing = self._checkpoint
+            return _loads(text[:position] + closing)
+        return None
+
+    def _closing(self) -> str:
+        return "".join(_CLOSERS[opener] for opener in reversed(self._stack))
+
+
+def _loads(text: str) -> Optional[Any]:
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return json.loads(strip_trailing_commas(text))
+    except ValueError:
+        return None
+
+
+def strip_trailing_commas(text: str) -> str:
+    """Drop `,` directly before `}` or `]`, a common LLM JSON mistake."""
+    out = []
+    in_string = escape = False
+    pending_comma = None
+    for char in text:
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if pending_comma is not None:
+            if char.isspace():
+                pending_comma.append(char)
+                continue
+            if char not in "}]":
+                out.append(",")
+            out.extend(pending_comma[1:])
+            pending_comma = None
+        if char == ",":
+            pending_comma = [","]
+            continue
+        if char == '"':
+            in_string = True
+        out.append(char)
+    if pending_comma is not None:
+        out.extend(pending_comma)
+    return "".join(out)
+
+
+def validate_recommendation(value: Any) -> Dict[str, Any]:
+    """Check `value` against RECOMMENDATION_SCHEMA and normalise it.
+
+    Ids are coerced to strings and malformed device/plan entries are
+    dropped; a value that is not an object or carries none of the expected
+    keys raises RecommendationSchemaError.
+    """
+    if not isinstance(value, dict):
+        raise RecommendationSchemaError(f"expected an object, got {type(value).__name__}")
+    known = set(RECOMMENDATION_SCHEMA["properties"])
+    if not known.intersection(value):
+        raise RecommendationSchemaError("object has none of the recommendation keys")
+
+    result = dict(value)
+    for key in ("devices", "plans"):
+        items = value.get(key) or []
+        if not isinstance(items, list):
+            items = [items]
+        result[key] = [
+            {
+                "id": str(item["id"]),
+                "name": str(item.get("name", "")),
+                "reasoning": str(item.get("reasoning", "")),
+            }
+            for item in items
+            if isinstance(item, dict) and item.get("id") is not None
+        ]
+    response = value.get("response")
+    result["response"] = response if isinstance(response, str) else ""
+    clarification = value.get("needs_clarification")
+    if isinstance(clarification, str):
+        clarification = clarification.strip().lower() == "true"
+    elif not isinstance(clarification, bool):
+        clarification = not (result["devices"] or result["plans"])
+    result["needs_clarification"] = clarification
+    return result
+
+
+def extract_recommendation(text: str) -> Optional[Dict[str, Any]]:
+    """Return the first valid recommendation object in `text`, if any.
+
+    A truncated trailing object (e.g. the model ran out of tokens) is
+    repaired and used when no complete object validates.
+    """
+    parser = StreamingJSONParser()
+    parser.feed(text)
+    candidates = list(parser.objects)
+    partial = parser.partial()
+    if partial is not None:
+        candidates.append(partial)
+    for candidate in candidates:
+        try:
+            return validate_recommendation(candidate)
+        except RecommendationSchemaError:
+            continue
+    return None
+
+
+class _PartialRecommendations:
+    """Feeds streamed text to a parser and reports each new valid recommendation."""
+
+    def __init__(self):
+        self.parser = StreamingJSONParser()
+        self.last = None
+
+    def feed(self, chunk: str) -> Optional[Dict[str, Any]]:
+        completed = self.parser.feed(chunk)
+        value = completed[-1] if completed else self.parser.partial()
+        if value is None or value == self.last:
+            return None
+        self.last = value
+        try:
+            return validate_recommendation(value)
+        except RecommendationSchemaError:
+            return None
+
+
+def iter_partial_recommendations(chunks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Yield the recommendation parsed so far after each streamed chunk."""
+    partials = _PartialRecommendations()
+    for chunk in chunks:
+        recommendation = partials.feed(chunk)
+        if recommendation is not None:
+            yield recommendation
+
+
+async def astream_recommendation(chat_model, messages, config=None) -> AsyncIterator[Tuple[str, Any]]:
+    """Stream `chat_model`'s reply as `("partial", recommendation)` events.
+
+    The last event is `("final", (raw_text, recommendation))`, the same pair
+    `ainvoke_recommendation` returns. Structured output is not used here:
+    its providers return the object whole, so there is nothing to stream.
+    """
+    partials = _PartialRecommendations()
+    text: List[str] = []
+    async for chunk in chat_model.astream(messages, config):
+        content = chunk.content if hasattr(chunk, "content") else str(chunk)
+        if not isinstance(content, str) or not content:
+            continue
+        text.append(content)
+        recommendation = partials.feed(content)
+        if recommendation is not None:
+            yield "partial", recommendation
+    raw = "".join(text)
+    yield "final", (raw, extract_recommendation(raw))
+
+
+def _structured_runnable(chat_model, structured_output: bool):
+    if not structured_output:
+        return None
+    try:
+        return chat_model.with_structured_output(RECOMMENDATION_SCHEMA)
+    except (AttributeError, NotImplementedError):
+        return None
+
+
+def _from_structured(value: Any) -> Tuple[str, Optional[Dict[str, Any]]]:
+    try:
+        result = validate_recommendation(value)
+    except RecommendationSchemaError:
+        return json.dumps(value, ensure_ascii=False, default=str), None
+    return json.dumps(result, ensure_ascii=False), result
+
+
+def _from_message(response) -> Tuple[str, Optional[Dict[str, Any]]]:
+    content = response.content if hasattr(response, "content") else str(response)
+    return content, extract_recommendation(content)
+
+
+def invoke_recommendation(chat_model, messages, structured_output: bool = True, config=None) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Call `chat_model` and return `(raw_text, recommendation)`.
+
+    Providers that implement structured output are asked for
+    RECOMMENDATION_SCHEMA directly; others fall back to a plain call whose
+    text is run through `extract_recommendation`.
+    """
+    structured = _structured_runnable(chat_model, structured_output)
+    if structured is not None:
+        return _from_structured(structured.invoke(messages, config))
+    return _from_message(chat_model.invoke(messages, config))
+
+
+async def ainvoke_recommendation(chat_model, messages, structured_output: bool = True, config=None) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Async counterpart of `invoke_recommendation`."""
+    structured = _structured_runnable(chat_model, structured_output)
+    if structured is not None:
+        return _from_structured(await structured.ainvoke(messages, config))
+    return _from_message(await chat_model.ainvoke(messages, config))
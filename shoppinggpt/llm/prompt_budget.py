@@ -0,0 +1,247 @@
+import logging
+import os
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from shoppinggpt.llm.rate_limit import DEFAULT_COMPLETION_TOKENS, estimate_tokens
+from shoppinggpt.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Prompt tokens allowed per call, capped by the model's context window less
+# the completion reserve. Big prompts are slow long before they overflow.
+PROMPT_BUDGET = int(os.getenv("PROMPT_BUDGET_TOKENS", "8000"))
+# Tool results (e.g. SQL rows) handed back to the agent per call.
+TOOL_OUTPUT_BUDGET = int(os.getenv("PROMPT_TOOL_OUTPUT_TOKENS", "1500"))
+TOKENIZER = os.getenv("PROMPT_TOKENIZER", "cl100k_base")
+
+CONTEXT_WINDOWS = {
+    "gemini-1.5-flash": 1048576,
+    "gemini-1.5-pro": 2097152,
+    "gemma-7b-it": 8192,
+    "llama3-8b-8192": 8192,
+    "gpt-35-turbo": 16385,
+    "gpt-4o": 128000,
+    "fake": 8192,
+}
+
+
+@lru_cache(maxsize=None)
+def _encoding(name: str):
+    """The tiktoken encoding, loaded once; None (character estimate) if it is unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as e:  # not installed, or the BPE file cannot be fetched
+        logger.warning("Tokenizer %s unavailable (%s); estimating ~4 characters per token", name, e)
+        return None
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """Prompt tokens in `text`. Cached: catalog sections and instructions repeat on every call."""
+    if not text:
+        return 0
+    encoding = _encoding(TOKENIZER)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _cut(text: str, max_tokens: int, keep: str) -> str:
+    encoding = _encoding(TOKENIZER)
+    if encoding is None:
+        chars = max_tokens * 4 - 1  # estimate_tokens counts len // 4 + 1
+        return text[:chars] if keep == "head" else text[-chars:]
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[:max_tokens] if keep == "head" else tokens[-max_tokens:])
+
+
+def trim_text(text: str, max_tokens: int, keep: str = "head") -> str:
+    """`text` cut to `max_tokens` at line boundaries, keeping its "head" or its "tail"."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = text.splitlines(keepends=True)
+    kept: List[str] = []
+    used = 0
+    for line in (lines if keep == "head" else reversed(lines)):
+        cost = count_tokens(line)
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    if not kept:
+        return _cut(lines[0] if keep == "head" else lines[-1], max_tokens, keep)
+    return "".join(kept if keep == "head" else reversed(kept))
+
+
+def message_tokens(message: Any) -> int:
+    content = getattr(message, "content", message)
+    return count_tokens(content if isinstance(content, str) else str(content)) + 4  # role and separators
+
+
+def trim_messages(messages: Sequence[Any], max_tokens: int) -> List[Any]:
+    """The newest `messages` that fit in `max_tokens`; older ones are dropped whole."""
+    kept: List[Any] = []
+    used = 0
+    for message in reversed(messages):
+        used += message_tokens(message)
+        if used > max_tokens:
+            break
+        kept.append(message)
+    return kept[::-1]
+
+
+def trim_history(history: Any, max_tokens: int) -> Any:
+    """Conversation memory (a string or a message list) cut to its most recent `max_tokens`."""
+    if isinstance(history, str):
+        return trim_text(history, max_tokens, keep="tail")
+    return trim_messages(history, max_tokens)
+
+
+def history_tokens(history: Any) -> int:
+    if isinstance(history, str):
+        return count_tokens(history)
+    return sum(message_tokens(message) for message in history)
+
+
+def model_of(llm: Any) -> Optional[str]:
+    """Best-effort model name of a chat model, looking through the ChatModelWrapper chain."""
+    for _ in range(8):
+        if llm is None:
+            return None
+        # AzureChatOpenAI keeps model_name at its "gpt-3.5-turbo" default
+        # whatever the deployment serves, so the deployment comes first.
+        for attribute in ("deployment_name", "model_name"):
+            value = getattr(llm, attribute, None)
+            if isinstance(value, str):
+                return value
+        inner = getattr(llm, "model", None)
+        if isinstance(inner, str):
+            return inner
+        llm = inner
+    return None
+
+
+def budget_for(model: Optional[str], budget: int = PROMPT_BUDGET) -> int:
+    context = CONTEXT_WINDOWS.get(model or "")
+    return min(budget, context - DEFAULT_COMPLETION_TOKENS) if context else budget
+
+
+class Part(NamedTuple):
+    """One component of a prompt. `priority` None is never trimmed; lower priorities are trimmed first."""
+
+    name: str
+    text: str
+    priority: Optional[int] = None
+    keep: str = "head"  # which end survives trimming
+    min_tokens: int = 0
+
+
+# Trimmed first to last: old conversation, then catalog listings, then tool output.
+HISTORY, CATALOG, TOOL_OUTPUT = 0, 1, 2
+
+
+class FittedPrompt(NamedTuple):
+    texts: Dict[str, str]
+    tokens: int
+    budget: int
+    trimmed: Dict[str, int]  # part name -> tokens removed
+
+
+class BudgetStats:
+    """Per call site: prompts fitted, how many needed trimming and the tokens removed per part."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sites: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, site: str, before: int, after: int, trimmed: Dict[str, int]) -> None:
+        with self._lock:
+            stats = self._sites.setdefault(site, {
+                "prompts": 0, "trimmed_prompts": 0, "tokens_before": 0, "tokens_after": 0,
+                "trimmed_tokens": defaultdict(int),
+            })
+            stats["prompts"] += 1
+            stats["tokens_before"] += before
+            stats["tokens_after"] += after
+            if trimmed:
+                stats["trimmed_prompts"] += 1
+            for name, tokens in trimmed.items():
+                stats["trimmed_tokens"][name] += tokens
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {site: {**stats, "trimmed_tokens": dict(stats["trimmed_tokens"])}
+                    for site, stats in self._sites.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._sites.clear()
+
+
+BUDGET_STATS = BudgetStats()
+
+
+def budget_stats() -> Dict[str, Dict[str, Any]]:
+    return BUDGET_STATS.stats()
+
+
+def fit_prompt(parts: Sequence[Part], budget: int, site: str) -> FittedPrompt:
+    """Trim the lowest-priority parts until the prompt fits `budget` tokens.
+
+    Each part gives up only what is still over budget, down to its
+    `min_tokens`; required parts (priority None) are kept whole even if
+    the prompt then stays over budget.
+    """
+    with span("prompt.budget", site=site, budget=budget) as budget_span:
+        counts = {part.name: count_tokens(part.text) for part in parts}
+        before = sum(counts.values())
+        texts = {part.name: part.text for part in parts}
+        trimmed: Dict[str, int] = {}
+        over = before - budget
+        for part in sorted((p for p in parts if p.priority is not None), key=lambda p: p.priority):
+            if over <= 0:
+                break
+            target = max(part.min_tokens, counts[part.name] - over)
+            if target >= counts[part.name]:
+                continue
+            texts[part.name] = trim_text(part.text, target, part.keep)
+            removed = counts[part.name] - count_tokens(texts[part.name])
+            trimmed[part.name] = removed
+            over -= removed
+        after = before - sum(trimmed.values())
+        budget_span.set_attribute("tokens", after)
+        budget_span.set_attribute("trimmed", ",".join(sorted(trimmed)))
+    BUDGET_STATS.record(site, before, after, trimmed)
+    return FittedPrompt(texts, after, budget, trimmed)
+
+
+def fit_history(history: Any, max_tokens: int, site: str) -> Any:
+    """`trim_history`, recorded in the budget stats of `site`."""
+    trimmed = trim_history(history, max_tokens)
+    before, after = history_tokens(history), history_tokens(trimmed)
+    BUDGET_STATS.record(site, before, after, {"history": before - after} if after < before else {})
+    return trimmed
+
+
+def fit_rows(rows: List[Dict[str, Any]], max_tokens: int = TOOL_OUTPUT_BUDGET, site: str = "tool") -> List[Any]:
+    """Leading tool result rows that fit `max_tokens`, plus a note of how many were left out."""
+    kept: List[Any] = []
+    used = 0
+    for row in rows:
+        cost = count_tokens(str(row))
+        if used + cost > max_tokens:
+            break
+        kept.append(row)
+        used += cost
+    omitted = len(rows) - len(kept)
+    removed = sum(count_tokens(str(row)) for row in rows[len(kept):])
+    BUDGET_STATS.record(site, used + removed, used, {"rows": removed} if omitted else {})
+    if omitted:
+        kept.append(f"... {omitted} more rows omitted; ask a narrower question to see them.")
+    return kept
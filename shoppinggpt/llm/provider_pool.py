@@ -0,0 +1,350 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from shoppinggpt.llm.rate_limit import GRANTED_AT, RateLimitExceeded
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderPoolError(RuntimeError):
+    pass
+
+
+def _latency(start: float) -> float:
+    """Seconds since `start`, or since a rate limiter granted the call if that was later."""
+    granted = GRANTED_AT.get()
+    return time.perf_counter() - (granted if granted is not None and granted > start else start)
+
+
+class CircuitBreaker:
+    """Stop sending traffic to a provider after repeated failures.
+
+    After `failure_threshold` consecutive failures the breaker opens for
+    `reset_timeout` seconds, then lets a single probe request through; the
+    probe's outcome closes or re-opens it. Transitions are locked, since
+    hedge threads and event-loop callers share one breaker.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                return self.clock() - self.opened_at >= self.reset_timeout
+            return not self._probing
+
+    def acquire(self) -> bool:
+        """Like `available`, but claims the half-open probe slot."""
+        with self._lock:
+            if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+                return True
+            return self.state == CLOSED
+
+    def release(self) -> None:
+        """Give back a probe slot whose request was abandoned."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = self.clock()
+            self._probing = False
+
+
+class ProviderHealth:
+    """EWMA latency/error rate, a latency window and a breaker for one provider."""
+
+    def __init__(self, alpha: float = 0.2, window: int = 200, breaker: Optional[CircuitBreaker] = None):
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.latencies = deque(maxlen=window)
+        self.breaker = breaker or CircuitBreaker()
+        self.requests = 0
+        self.failures = 0
+        self.hedges_won = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            if ok:
+                self.latencies.append(latency)
+                self.latency = latency if self.latency is None else (
+                    self.alpha * latency + (1 - self.alpha) * self.latency
+                )
+                self.breaker.record_success()
+            else:
+                self.failures += 1
+                self.breaker.record_failure()
+            self.error_rate = self.alpha * (0.0 if ok else 1.0) + (1 - self.alpha) * self.error_rate
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self.latencies:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    def score(self, error_penalty: float) -> float:
+        # Providers without samples score 0 so they get tried (and measured).
+        latency = self.latency or 0.0
+        return latency * (1 + error_penalty * self.error_rate) + error_penalty * self.error_rate
+
+
+class Provider:
+    def __init__(self, name: str, model, health: Optional[ProviderHealth] = None):
+        self.name = name
+        self.model = model
+        self.health = health or ProviderHealth()
+
+    def with_model(self, model) -> "Provider":
+        """Same provider (and shared health) around a transformed model."""
+        return Provider(self.name, model, self.health)
+
+
+class ProviderPool:
+    """Send each request to the fastest healthy provider, failing over in order.
+
+    With `hedge=True` a request that has not finished after the primary's
+    `hedge_percentile` latency (or `hedge_delay` until enough samples exist)
+    is duplicated to the next provider and the first success wins.
+    """
+
+    def __init__(
+        self,
+        providers: List[Provider],
+        hedge: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_delay: float = 2.0,
+        min_samples: int = 20,
+        error_penalty: float = 10.0,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ):
+        if not providers:
+            raise ValueError("ProviderPool needs at least one provider")
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.min_samples = min_samples
+        self.error_penalty = error_penalty
+        self._executor = executor
+        self.model_name = "pool(" + ",".join(p.name for p in providers) + ")"
+
+    def bind(self, fn: Callable) -> "ProviderPool":
+        """New pool whose models are `fn(model)`, sharing health with this one."""
+        return ProviderPool(
+            [provider.with_model(fn(provider.model)) for provider in self.providers],
+            hedge=self.hedge,
+            hedge_percentile=self.hedge_percentile,
+            hedge_delay=self.hedge_delay,
+            min_samples=self.min_samples,
+            error_penalty=self.error_penalty,
+            executor=self._executor,
+        )
+
+    def bind_tools(self, tools, **kwargs) -> "ProviderPool":
+        return self.bind(lambda model: model.bind_tools(tools, **kwargs))
+
+    def with_structured_output(self, schema, **kwargs) -> "ProviderPool":
+        return self.bind(lambda model: model.with_structured_output(schema, **kwargs))
+
+    def ranked(self) -> List[Provider]:
+        healthy = [p for p in self.providers if p.health.breaker.available()]
+        return sorted(healthy, key=lambda p: p.health.score(self.error_penalty))
+
+    def hedge_after(self, provider: Provider) -> float:
+        if len(provider.health.latencies) < self.min_samples:
+            return self.hedge_delay
+        return provider.health.percentile(self.hedge_percentile)
+
+    def _call(self, provider: Provider, input, config, kwargs) -> Any:
+        start = time.perf_counter()
+        try:
+            result = provider.model.invoke(input, config, **kwargs)
+        except RateLimitExceeded:
+            # Shed by our own limiter before the provider saw the request.
+            provider.health.breaker.release()
+            raise
+        except Exception:
+            provider.health.record(_latency(start), ok=False)
+            raise
+        provider.health.record(_latency(start), ok=True)
+        return result
+
+    async def _acall(self, provider: Provider, input, config, kwargs) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await provider.model.ainvoke(input, config, **kwargs)
+        except (asyncio.CancelledError, RateLimitExceeded):
+            # Neither a hedge loser nor a local shed says anything about
+            # the provider's health.
+            provider.health.breaker.release()
+            raise
+        except Exception:
+            provider.health.record(_latency(start), ok=False)
+            raise
+        provider.health.record(_latency(start), ok=True)
+        return result
+
+    def _attempts(self):
+        for provider in self.ranked():
+            if provider.health.breaker.acquire():
+                yield provider
+
+    def invoke(self, input, config=None, **kwargs) -> Any:
+        errors = []
+        attempts = self._attempts()
+        for provider in attempts:
+            try:
+                if not self.hedge:
+                    return self._call(provider, input, config, kwargs)
+                return self._hedged(provider, attempts, input, config, kwargs)
+            except Exception as e:
+                errors.append(f"{provider.name}: {e}")
+        raise ProviderPoolError("All providers failed: " + "; ".join(errors) if errors else "No healthy provider")
+
+    def _hedged(self, primary: Provider, attempts, input, config, kwargs) -> Any:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+        futures = {self._submit(primary, input, config, kwargs): primary}
+        done, _ = wait(futures, timeout=self.hedge_after(primary))
+        if not done or next(iter(done)).exception() is not None:
+            # The backup is only claimed (and its probe slot taken) once the
+            # hedge actually fires.
+            backup = next(attempts, None)
+            if backup is not None:
+                futures[self._submit(backup, input, config, kwargs)] = backup
+        return self._first_success(futures, lambda fs: wait(fs, return_when=FIRST_COMPLETED)[0])
+
+    def _submit(self, provider: Provider, input, config, kwargs):
+        # Run in the caller's context so tracing spans keep their parent.
+        return self._executor.submit(contextvars.copy_context().run, self._call, provider, input, config, kwargs)
+
+    @staticmethod
+    def _first_success(futures: Dict, wait_any: Callable) -> Any:
+        pending = set(futures)
+        error = None
+        while pending:
+            for future in wait_any(pending):
+                pending.discard(future)
+                if future.exception() is None:
+                    if len(futures) > 1:
+                        futures[future].health.hedges_won += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def ainvoke(self, input, config=None, **kwargs) -> Any:
+        errors = []
+        attempts = self._attempts()
+        for provider in attempts:
+            try:
+                if not self.hedge:
+                    return await self._acall(provider, input, config, kwargs)
+                return await self._ahedged(provider, attempts, input, config, kwargs)
+            except Exception as e:
+                errors.append(f"{provider.name}: {e}")
+        raise ProviderPoolError("All providers failed: " + "; ".join(errors) if errors else "No healthy provider")
+
+    async def _ahedged(self, primary: Provider, attempts, input, config, kwargs) -> Any:
+        tasks = {asyncio.ensure_future(self._acall(primary, input, config, kwargs)): primary}
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_after(primary))
+        if not done or next(iter(done)).exception() is not None:
+            backup = next(attempts, None)
+            if backup is not None:
+                tasks[asyncio.ensure_future(self._acall(backup, input, config, kwargs))] = backup
+        try:
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1:
+                            tasks[task].health.hedges_won += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def astream(self, input, config=None, **kwargs) -> AsyncIterator[Any]:
+        """Stream from the best provider, failing over only until the first chunk.
+
+        Streams are not hedged; once text has reached the caller a later
+        provider could only repeat it.
+        """
+        errors = []
+        for provider in self._attempts():
+            start = time.perf_counter()
+            started = False
+            try:
+                async for chunk in provider.model.astream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                # The caller stopped reading; that says nothing about the provider.
+                provider.health.breaker.release()
+                raise
+            except RateLimitExceeded as e:
+                provider.health.breaker.release()
+                errors.append(f"{provider.name}: {e}")
+                continue
+            except Exception as e:
+                provider.health.record(_latency(start), ok=False)
+                if started:
+                    raise
+                errors.append(f"{provider.name}: {e}")
+                continue
+            provider.health.record(_latency(start), ok=True)
+            return
+        raise ProviderPoolError("All providers failed: " + "; ".join(errors) if errors else "No healthy provider")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            provider.name: {
+                "ewma_latency": provider.health.latency,
+                "error_rate": provider.health.error_rate,
+                "p95_latency": provider.health.percentile(0.95),
+                "requests": provider.health.requests,
+                "failures": provider.health.failures,
+                "hedges_won": provider.health.hedges_won,
+                "circuit": provider.health.breaker.state,
+            }
+            for provider in self.providers
+        }
@@ -0,0 +1,325 @@
+import asyncio
+import contextvars
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional
+
+# Client-side limits are opt-in: set <PROVIDER>_RPM and/or <PROVIDER>_TPM
+# (e.g. GEMINI_RPM=15 for a free-tier key) to the key's quota. Buckets live
+# in each process, so with N workers divide the quota by N.
+
+# Tokens reserved for the completion until the real usage is known.
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+class RateLimitExceeded(RuntimeError):
+    pass
+
+
+def estimate_tokens(payload: Any) -> int:
+    """Cheap token estimate (~4 characters per token) for prompts and messages."""
+    if payload is None:
+        return 0
+    if isinstance(payload, str):
+        return len(payload) // 4 + 1
+    if hasattr(payload, "to_messages"):
+        return estimate_tokens(payload.to_messages())
+    if hasattr(payload, "content"):
+        return estimate_tokens(payload.content) + 4
+    if isinstance(payload, dict):
+        return sum(estimate_tokens(value) for value in payload.values())
+    if isinstance(payload, (list, tuple)):
+        return sum(estimate_tokens(item) for item in payload)
+    return estimate_tokens(str(payload))
+
+
+# Exception types providers raise for HTTP 429 (openai/groq/anthropic,
+# google.api_core).
+RATE_LIMIT_ERRORS = ("RateLimitError", "ResourceExhausted", "TooManyRequests")
+_RATE_LIMIT_MESSAGE = re.compile(r"\b429 |too many requests|rate limit", re.IGNORECASE)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is None and isinstance(getattr(error, "code", None), int):
+        status = error.code
+    if status is not None:
+        return status == 429
+    if any(cls.__name__ in RATE_LIMIT_ERRORS for cls in type(error).__mro__):
+        return True
+    return bool(_RATE_LIMIT_MESSAGE.search(str(error)))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds a 429 asks the caller to wait, from `retry_after` or the Retry-After header."""
+    seconds = getattr(error, "retry_after", None)
+    if seconds is not None:
+        return float(seconds)
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass  # an HTTP date; fall back to the default pause
+    return None
+
+
+# time.perf_counter() when this context's last quota reservation was
+# granted, so a caller can time the request without its queueing.
+GRANTED_AT: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("rate_limit_granted_at", default=None)
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, per_second: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.per_second = per_second
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_second)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.per_second)
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float) -> None:
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _Waiter:
+    __slots__ = ("tokens", "session", "granted", "event", "future", "loop")
+
+    def __init__(self, tokens: int, session: str):
+        self.tokens = tokens
+        self.session = session
+        self.granted = False
+        self.event = None
+        self.future = None
+        self.loop = None
+
+    def wake(self) -> None:
+        self.granted = True
+        if self.event is not None:
+            self.event.set()
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter for one model/key.
+
+    Callers reserve one request plus an estimated token count. When the
+    buckets are empty they queue per session and are served round-robin
+    across sessions, so one chatty session cannot starve the others.
+    Callers that would have to wait longer than `max_wait`, or wait when
+    `max_queue` are already waiting, are shed with RateLimitExceeded.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_queue: int = 100,
+        max_wait: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.clock = clock
+        self.requests = TokenBucket(rpm, rpm / 60.0, clock) if rpm else None
+        self.tokens = TokenBucket(tpm, tpm / 60.0, clock) if tpm else None
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self.waiting = 0
+        self.granted = 0
+        self.shed = 0
+        self.throttled = 0
+
+    def _wait_time(self, tokens: int) -> float:
+        wait = max(0.0, self.paused_until - self.clock())
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(tokens))
+        return wait
+
+    def _dispatch(self) -> float:
+        """Grant queued waiters round-robin; return seconds until the next try."""
+        while self._queues:
+            session, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            wait = self._wait_time(waiter.tokens)
+            if wait > 0:
+                return wait
+            queue.popleft()
+            self._queues.pop(session)
+            if queue:
+                # Back of the rotation for this session's next request.
+                self._queues[session] = queue
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(waiter.tokens)
+            self.waiting -= 1
+            self.granted += 1
+            waiter.wake()
+        return 0.0
+
+    def _enqueue(self, waiter: _Waiter) -> float:
+        # Queue first so a newcomer cannot overtake earlier waiters; one
+        # that is granted straight away never counts against max_queue.
+        self._queues.setdefault(waiter.session, deque()).append(waiter)
+        self.waiting += 1
+        delay = self._dispatch()
+        if not waiter.granted:
+            if self.waiting > self.max_queue:
+                self._abandon(waiter)
+                raise RateLimitExceeded(f"{self.name}: {self.waiting} requests already queued")
+            if delay > self.max_wait:
+                self._abandon(waiter)
+                raise RateLimitExceeded(f"{self.name}: quota frees up in {delay:.1f}s")
+            self.throttled += 1
+        return delay
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.session)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self.waiting -= 1
+            if not queue:
+                self._queues.pop(waiter.session)
+        self.shed += 1
+
+    def acquire(self, tokens: int = 0, session: str = "default") -> None:
+        waiter = _Waiter(tokens, session)
+        waiter.event = threading.Event()
+        deadline = self.clock() + self.max_wait
+        with self._lock:
+            delay = self._enqueue(waiter)
+        while not waiter.granted:
+            if self.clock() >= deadline:
+                with self._lock:
+                    if not waiter.granted:
+                        self._abandon(waiter)
+                        raise RateLimitExceeded(f"{self.name}: waited {self.max_wait}s for quota")
+                break
+            waiter.event.wait(min(delay, max(0.0, deadline - self.clock())) or 0.001)
+            with self._lock:
+                delay = self._dispatch()
+
+    async def aacquire(self, tokens: int = 0, session: str = "default") -> None:
+        waiter = _Waiter(tokens, session)
+        waiter.loop = asyncio.get_running_loop()
+        waiter.future = waiter.loop.create_future()
+        deadline = self.clock() + self.max_wait
+        with self._lock:
+            delay = self._enqueue(waiter)
+        while not waiter.granted:
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                with self._lock:
+                    if not waiter.granted:
+                        self._abandon(waiter)
+                        raise RateLimitExceeded(f"{self.name}: waited {self.max_wait}s for quota")
+                break
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), min(delay, remaining) or 0.001)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                with self._lock:
+                    if not waiter.granted:
+                        self._abandon(waiter)
+                raise
+            with self._lock:
+                delay = self._dispatch()
+
+    def settle(self, reserved: int, actual: int) -> None:
+        """Correct the token bucket once the real usage of a call is known."""
+        if self.tokens is None or actual == reserved:
+            return
+        with self._lock:
+            if actual < reserved:
+                self.tokens.give(reserved - actual)
+            else:
+                self.tokens.take(actual - reserved)
+
+    def penalize(self, retry_after: Optional[float] = None) -> None:
+        """Back off after the provider answered 429 despite the local budget."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, self.clock() + (retry_after or 1.0))
+            if self.requests is not None:
+                self.requests.tokens = min(self.requests.tokens, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "rpm_available": self.requests.tokens if self.requests else None,
+                "tpm_available": self.tokens.tokens if self.tokens else None,
+                "waiting": self.waiting,
+                "sessions_waiting": len(self._queues),
+                "granted": self.granted,
+                "throttled": self.throttled,
+                "shed": self.shed,
+                "paused_for": max(0.0, self.paused_until - self.clock()),
+            }
+
+
+_LIMITERS: Dict[str, RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(provider: str, model: Optional[str] = None, api_key: Optional[str] = None) -> Optional[RateLimiter]:
+    """Shared limiter for a provider/model/key, or None unless <PROVIDER>_RPM/_TPM is set.
+
+    Each API key has its own quota, so keys get separate limiters; the key
+    is identified by a short hash in the limiter name.
+    """
+    rpm = os.getenv(f"{provider.upper()}_RPM")
+    tpm = os.getenv(f"{provider.upper()}_TPM")
+    if not rpm and not tpm:
+        return None
+    key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8] if api_key else ""
+    name = f"{provider}:{model}:{key_id}"
+    with _LIMITERS_LOCK:
+        if name not in _LIMITERS:
+            _LIMITERS[name] = RateLimiter(
+                name,
+                rpm=float(rpm) if rpm else None,
+                tpm=float(tpm) if tpm else None,
+                max_queue=int(os.getenv("LLM_MAX_QUEUE", "100")),
+                max_wait=float(os.getenv("LLM_MAX_WAIT", "30")),
+            )
+        return _LIMITERS[name]
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    with _LIMITERS_LOCK:
+        limiters = list(_LIMITERS.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Merge identical in-flight calls so only one reaches the provider.
+
+    The first caller for a key runs the function; callers arriving while it
+    is still running wait for and share its result (or its exception).
+    Sync callers are merged with sync callers and coroutine callers with
+    coroutine callers on the same event loop.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._tasks: Dict[tuple, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def do(self, key: str, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    async def ado(self, key: str, fn: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        with self._lock:
+            self.calls += 1
+            task = self._tasks.get(task_key)
+            if task is None:
+                # Run as its own task so a cancelled caller does not cancel
+                # the work the other waiters are sharing.
+                task = loop.create_task(fn(*args, **kwargs))
+                self._tasks[task_key] = task
+                task.add_done_callback(lambda t: self._finish(task_key, t))
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, task_key: tuple, task: asyncio.Task) -> None:
+        with self._lock:
+            self._tasks.pop(task_key, None)
+            if task.cancelled() or task.exception() is not None:
+                self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "in_flight": len(self._calls) + len(self._tasks),
+            }
+
+
+def _jsonable(value: Any) -> Any:
+    # LangChain messages and prompt values are reduced to type + content;
+    # anything else falls back to its repr.
+    if hasattr(value, "to_messages"):
+        return [_jsonable(message) for message in value.to_messages()]
+    if hasattr(value, "content") and hasattr(value, "type"):
+        return {
+            "type": value.type,
+            "content": value.content,
+            "tool_calls": getattr(value, "tool_calls", None) or None,
+            "tool_call_id": getattr(value, "tool_call_id", None),
+        }
+    return repr(value)
+
+
+def request_key(model_id: str, payload: Any) -> str:
+    """Key for a request: model identity plus a hash of the prompt payload."""
+    encoded = json.dumps(payload, sort_keys=True, default=_jsonable, ensure_ascii=False)
+    digest = hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+    return f"{model_id}:{digest}"
+
+
+CHAT_SINGLE_FLIGHT = SingleFlight("chat")
+EMBEDDING_SINGLE_FLIGHT = SingleFlight("embeddings")
+
+
+def coalescing_stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        flight.name: flight.stats()
+        for flight in (CHAT_SINGLE_FLIGHT, EMBEDDING_SINGLE_FLIGHT)
+    }
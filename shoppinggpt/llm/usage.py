@@ -0,0 +1,65 @@
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from shoppinggpt.accounting import UsageAccountant, current_attribution, get_accountant
+from shoppinggpt.llm.rate_limit import estimate_tokens
+
+
+def _prompt_text(messages) -> str:
+    return "\n".join(f"{message.type}: {message.content}" for message in messages)
+
+
+def _token_usage(response) -> Optional[Tuple[int, int]]:
+    """(prompt, completion) tokens reported by the provider, if any."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    return None
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Records the tokens of every chat model call in the UsageAccountant.
+
+    The session/route/tool labels are captured when the call starts, from
+    `shoppinggpt.accounting.attribute`. Providers that do not report usage
+    are estimated from the prompt and completion text.
+    """
+
+    def __init__(self, provider: str, model: Optional[str] = None, accountant: Optional[UsageAccountant] = None):
+        self.provider = provider
+        self.model = model
+        self._accountant = accountant
+        self._runs: Dict[UUID, Tuple[str, Dict[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def accountant(self) -> UsageAccountant:
+        return self._accountant or get_accountant()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any) -> None:
+        prompt = _prompt_text(messages[0]) if messages else ""
+        with self._lock:
+            self._runs[run_id] = (prompt, current_attribution())
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            prompt, labels = self._runs.pop(run_id, ("", current_attribution()))
+        usage = _token_usage(response)
+        estimated = usage is None
+        if estimated:
+            completion = [generation.text for generations in response.generations for generation in generations]
+            usage = (estimate_tokens(prompt), estimate_tokens(completion))
+        model = (response.llm_output or {}).get("model_name") or self.model
+        self.accountant.record(self.provider, model, prompt, usage[0], usage[1], estimated=estimated, labels=labels)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._runs.pop(run_id, None)
@@ -0,0 +1,298 @@
+import json
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from shoppinggpt.llm.rate_limit import (
+    DEFAULT_COMPLETION_TOKENS,
+    GRANTED_AT,
+    RateLimiter,
+    estimate_tokens,
+    is_rate_limit_error,
+    retry_after,
+)
+from shoppinggpt.llm.singleflight import (
+    CHAT_SINGLE_FLIGHT,
+    EMBEDDING_SINGLE_FLIGHT,
+    SingleFlight,
+    request_key,
+)
+from shoppinggpt.tracing import span
+
+
+def _schema(value: Any) -> Any:
+    """JSON stand-in for a bound value: pydantic classes by their schema, anything else by repr."""
+    for method in ("model_json_schema", "schema"):
+        if isinstance(value, type) and hasattr(value, method):
+            return getattr(value, method)()
+    return repr(value)
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, default=_schema)
+
+
+def _step_identity(step) -> Optional[str]:
+    """Output parsers and other plain steps, described by their fields."""
+    for method in ("model_dump", "dict"):
+        if hasattr(step, method):
+            try:
+                return f"{type(step).__name__}{_encode(getattr(step, method)())}"
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def model_identity(model) -> Optional[str]:
+    """Stable description of a chat model and whatever is bound to it.
+
+    Bound kwargs (tools, structured output schemas) and every step of a
+    sequence such as `with_structured_output`'s model | parser are part of
+    it. None means the runnable cannot be told apart from others like it,
+    so its requests must not be coalesced.
+    """
+    if isinstance(model, ChatModelWrapper):
+        return model_identity(model.model)
+    steps = getattr(model, "steps", None)
+    if isinstance(steps, list):
+        parts = [model_identity(step) for step in steps]
+        return None if None in parts else " | ".join(parts)
+    providers = getattr(model, "providers", None)
+    if isinstance(providers, list):
+        parts = [model_identity(provider.model) for provider in providers]
+        return None if None in parts else f"pool({', '.join(parts)})"
+    kwargs = getattr(model, "kwargs", None)
+    bound = getattr(model, "bound", None)
+    if bound is not None and isinstance(kwargs, dict):
+        inner = model_identity(bound)
+        return None if inner is None else f"{inner}|{_encode(kwargs)}"
+    # Azure deployments all report the default model_name; see model_of.
+    name = (
+        getattr(model, "deployment_name", None)
+        or getattr(model, "model_name", None)
+        or getattr(model, "model", None)
+    )
+    if name is None:
+        return _step_identity(model)
+    return f"{type(model).__name__}:{name}:{getattr(model, 'temperature', None)}"
+
+
+class ChatModelWrapper(Runnable):
+    """Delegating base for runnables that sit in front of a chat model.
+
+    Tool binding and structured output are forwarded to the wrapped model
+    and the result is wrapped again, so agents built on top still go
+    through the wrapper.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def _rewrap(self, model) -> "ChatModelWrapper":
+        return type(self)(model)
+
+    @property
+    def InputType(self):
+        return self.model.InputType
+
+    @property
+    def OutputType(self):
+        return self.model.OutputType
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        return self.model.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        return await self.model.ainvoke(input, config, **kwargs)
+
+    async def astream(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> AsyncIterator[Any]:
+        async for chunk in self.model.astream(input, config, **kwargs):
+            yield chunk
+
+    def bind_tools(self, tools, **kwargs) -> "ChatModelWrapper":
+        return self._rewrap(self.model.bind_tools(tools, **kwargs))
+
+    def with_structured_output(self, schema, **kwargs) -> "ChatModelWrapper":
+        return self._rewrap(self.model.with_structured_output(schema, **kwargs))
+
+    def __getattr__(self, name):
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+
+class CoalescingChatModel(ChatModelWrapper):
+    """Chat model whose identical concurrent requests share one call.
+
+    Streams are passed through uncoalesced: each caller reads its own.
+    """
+
+    def __init__(self, model, flight: SingleFlight = CHAT_SINGLE_FLIGHT):
+        super().__init__(model)
+        self.flight = flight
+        self.model_id = model_identity(model)
+
+    def _rewrap(self, model) -> "CoalescingChatModel":
+        return CoalescingChatModel(model, self.flight)
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        if self.model_id is None:
+            return self.model.invoke(input, config, **kwargs)
+        key = request_key(self.model_id, [input, kwargs])
+        return self.flight.do(key, self.model.invoke, input, config, **kwargs)
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        if self.model_id is None:
+            return await self.model.ainvoke(input, config, **kwargs)
+        key = request_key(self.model_id, [input, kwargs])
+        return await self.flight.ado(key, self.model.ainvoke, input, config, **kwargs)
+
+
+class CoalescingEmbeddings(Embeddings):
+    """Embeddings client whose identical concurrent requests share one call."""
+
+    def __init__(self, embeddings: Embeddings, flight: SingleFlight = EMBEDDING_SINGLE_FLIGHT):
+        self.embeddings = embeddings
+        self.flight = flight
+        self.model_id = f"{type(embeddings).__name__}:{getattr(embeddings, 'model', None)}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        key = request_key(self.model_id, ["documents", texts])
+        return self.flight.do(key, self.embeddings.embed_documents, texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = request_key(self.model_id, ["query", text])
+        return self.flight.do(key, self.embeddings.embed_query, text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        key = request_key(self.model_id, ["documents", texts])
+        return await self.flight.ado(key, self.embeddings.aembed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = request_key(self.model_id, ["query", text])
+        return await self.flight.ado(key, self.embeddings.aembed_query, text)
+
+
+class PooledChatModel(ChatModelWrapper):
+    """Chat model backed by a ProviderPool of interchangeable providers."""
+
+    @property
+    def InputType(self):
+        return self.model.providers[0].model.InputType
+
+    @property
+    def OutputType(self):
+        return self.model.providers[0].model.OutputType
+
+
+def _session_id(config: Optional[RunnableConfig]) -> str:
+    metadata = (config or {}).get("metadata") or {}
+    return str(metadata.get("session_id", "default"))
+
+
+def _usage_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return usage.get("total_tokens")
+    return None
+
+
+class RateLimitedChatModel(ChatModelWrapper):
+    """Chat model that reserves RPM/TPM quota before each call.
+
+    The session used for fair queueing is read from
+    `config["metadata"]["session_id"]`.
+    """
+
+    def __init__(self, model, limiter: RateLimiter, completion_tokens: int = DEFAULT_COMPLETION_TOKENS):
+        super().__init__(model)
+        self.limiter = limiter
+        self.completion_tokens = completion_tokens
+
+    def _rewrap(self, model) -> "RateLimitedChatModel":
+        return RateLimitedChatModel(model, self.limiter, self.completion_tokens)
+
+    def _settle(self, reserved: int, input, response) -> None:
+        actual = _usage_tokens(response)
+        if actual is None:
+            actual = estimate_tokens(input) + estimate_tokens(response)
+        self.limiter.settle(reserved, actual)
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        reserved = estimate_tokens(input) + self.completion_tokens
+        with span("llm.rate_limit_wait", limiter=self.limiter.name):
+            self.limiter.acquire(reserved, _session_id(config))
+        GRANTED_AT.set(time.perf_counter())
+        try:
+            response = self.model.invoke(input, config, **kwargs)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self.limiter.penalize(retry_after(e))
+            raise
+        self._settle(reserved, input, response)
+        return response
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        reserved = estimate_tokens(input) + self.completion_tokens
+        with span("llm.rate_limit_wait", limiter=self.limiter.name):
+            await self.limiter.aacquire(reserved, _session_id(config))
+        GRANTED_AT.set(time.perf_counter())
+        try:
+            response = await self.model.ainvoke(input, config, **kwargs)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self.limiter.penalize(retry_after(e))
+            raise
+        self._settle(reserved, input, response)
+        return response
+
+    async def astream(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> AsyncIterator[Any]:
+        reserved = estimate_tokens(input) + self.completion_tokens
+        with span("llm.rate_limit_wait", limiter=self.limiter.name):
+            await self.limiter.aacquire(reserved, _session_id(config))
+        GRANTED_AT.set(time.perf_counter())
+        response = None
+        try:
+            async for chunk in self.model.astream(input, config, **kwargs):
+                response = chunk if response is None else response + chunk
+                yield chunk
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self.limiter.penalize(retry_after(e))
+            raise
+        finally:
+            self._settle(reserved, input, response)
+
+
+class TracedChatModel(ChatModelWrapper):
+    """Chat model whose calls are recorded as `llm.invoke` spans."""
+
+    def __init__(self, model, provider: str):
+        super().__init__(model)
+        self.provider = provider
+        self.model_id = model_identity(model) or type(model).__name__
+
+    def _rewrap(self, model) -> "TracedChatModel":
+        return TracedChatModel(model, self.provider)
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        with span("llm.invoke", provider=self.provider, model=self.model_id) as call:
+            response = self.model.invoke(input, config, **kwargs)
+            call.set_attribute("total_tokens", _usage_tokens(response) or 0)
+            return response
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        with span("llm.invoke", provider=self.provider, model=self.model_id) as call:
+            response = await self.model.ainvoke(input, config, **kwargs)
+            call.set_attribute("total_tokens", _usage_tokens(response) or 0)
+            return response
+
+    async def astream(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> AsyncIterator[Any]:
+        with span("llm.stream", provider=self.provider, model=self.model_id) as call:
+            chunks = 0
+            async for chunk in self.model.astream(input, config, **kwargs):
+                chunks += 1
+                yield chunk
+            call.set_attribute("chunks", chunks)
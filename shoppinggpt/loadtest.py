@@ -0,0 +1,304 @@
+"""Replay conversations against the FastAPI backend or the Flask app at a target RPS.
+
+Run the server with the fake LLM so only the serving stack is measured:
+
+    cd backend && LLM_PROVIDERS=fake FAKE_LLM_LATENCY_MS=800 uvicorn main:app
+    python -m shoppinggpt.loadtest --target backend --rps 20 --duration 60
+
+    LLM_PROVIDERS=fake ROUTER_BACKEND=local python app.py
+    python -m shoppinggpt.loadtest --target flask --rps 5 --conversations synthetic_conversations.jsonl
+
+Requests are sent open-loop (arrivals do not wait for earlier responses),
+and latency is measured from each request's scheduled send time, so a
+stalled server shows up as latency rather than as a slower generator.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from shoppinggpt.bench.harness import percentile
+from shoppinggpt.loop_lag import LoopLagMonitor
+
+# Keep each worker's event loop at most this busy with blocking work.
+TARGET_BLOCKED_FRACTION = 0.5
+# Headroom over Little's law when sizing thread pools.
+THREAD_HEADROOM = 1.25
+
+Send = Callable[[str, str], Awaitable[int]]
+
+
+class Target:
+    def __init__(self, name: str, method: str, path: str, default_url: str,
+                 build: Callable[[str, str], Dict[str, Any]], lag_path: Optional[str] = None, is_async: bool = True):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.default_url = default_url
+        self.build = build
+        self.lag_path = lag_path
+        self.is_async = is_async
+
+
+TARGETS = {
+    "backend": Target(
+        "backend", "POST", "/api/chat", "http://localhost:8000",
+        lambda session, text: {"json": {"message": text, "session_id": session}},
+        lag_path="/api/metrics/loop-lag",
+    ),
+    "flask": Target(
+        "flask", "GET", "/get", "http://localhost:5000",
+        lambda session, text: {"params": {"msg": text}},
+        is_async=False,
+    ),
+}
+
+
+def load_conversations(path: str) -> List[List[str]]:
+    """Human turns of each recorded/synthetic conversation."""
+    from shoppinggpt.router.train import human_turns, load_conversations as load_records
+
+    conversations = [human_turns(record.get("conversation", "")) for record in load_records(path)]
+    return [turns for turns in conversations if turns]
+
+
+def synthetic_conversations(target: str, count: int = 50, turns: int = 3, seed: int = 0) -> List[List[str]]:
+    if target == "backend":
+        from shoppinggpt.bench.scenarios import CHAT_MESSAGES as pool
+    else:
+        from shoppinggpt.router.lib_semantic_router import CHITCHAT_SAMPLE, PRODUCT_SAMPLE
+        pool = PRODUCT_SAMPLE + CHITCHAT_SAMPLE
+    rng = random.Random(seed)
+    return [[rng.choice(pool) for _ in range(turns)] for _ in range(count)]
+
+
+def replay(conversations: List[List[str]]) -> Iterator[Tuple[str, str]]:
+    """(session, text) pairs, interleaving sessions turn by turn and cycling forever.
+
+    Each cycle uses fresh session ids so server-side history does not grow
+    without bound.
+    """
+    for cycle in itertools.count():
+        longest = max(len(turns) for turns in conversations)
+        for turn in range(longest):
+            for index, turns in enumerate(conversations):
+                if turn < len(turns):
+                    yield f"load-{cycle}-{index}", turns[turn]
+
+
+class LoadResult:
+    def __init__(self, target_rps: float, duration: float):
+        self.target_rps = target_rps
+        self.duration = duration
+        self.sent = 0
+        self.dropped = 0
+        self.latencies: List[float] = []
+        self.service_times: List[float] = []
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.wall = 0.0
+        self.client_lag: Dict[str, Any] = {}
+        self.server_lag: Optional[Dict[str, Any]] = None
+
+    @property
+    def completed(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def error_count(self) -> int:
+        return sum(self.errors.values())
+
+    def summary(self) -> Dict[str, Any]:
+        latencies, service = sorted(self.latencies), sorted(self.service_times)
+        ok = self.completed - self.error_count
+        return {
+            "target_rps": self.target_rps,
+            "achieved_rps": round(self.sent / self.duration, 2) if self.duration else 0.0,
+            "goodput_rps": round(ok / self.wall, 2) if self.wall else 0.0,
+            "sent": self.sent,
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "errors": dict(self.errors),
+            "error_rate": round(self.error_count / self.completed, 4) if self.completed else 0.0,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "latency_ms": {f"p{int(q * 100)}": round(percentile(latencies, q) * 1000, 1) for q in (0.5, 0.95, 0.99)},
+            "latency_max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+            "latency_mean_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+            "service_p50_ms": round(percentile(service, 0.5) * 1000, 1),
+            "client_loop_lag": self.client_lag,
+            "server_loop_lag": self.server_lag,
+        }
+
+
+async def run_load(send: Send, requests: Iterator[Tuple[str, str]], rps: float, duration: float,
+                   arrival: str = "poisson", max_in_flight: int = 1000, seed: int = 0) -> LoadResult:
+    """Issue requests open-loop at `rps` for `duration` seconds, then wait for stragglers."""
+    result = LoadResult(rps, duration)
+    rng = random.Random(seed)
+    gap = (lambda: rng.expovariate(rps)) if arrival == "poisson" else (lambda: 1.0 / rps)
+    monitor = LoopLagMonitor().start()
+    in_flight = set()
+
+    async def one(session: str, text: str, scheduled: float) -> None:
+        began = time.perf_counter()
+        try:
+            status = await send(session, text)
+            result.statuses[status] += 1
+            if status >= 400:
+                result.errors[f"http_{status}"] += 1
+        except asyncio.TimeoutError:
+            result.errors["timeout"] += 1
+        except Exception as e:
+            kind = "timeout" if "Timeout" in type(e).__name__ else type(e).__name__
+            result.errors[kind] += 1
+        finished = time.perf_counter()
+        result.latencies.append(finished - scheduled)
+        result.service_times.append(finished - began)
+
+    start = next_at = time.perf_counter()
+    try:
+        while True:
+            next_at += gap()
+            if next_at - start >= duration:
+                break
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= max_in_flight:
+                result.dropped += 1
+                continue
+            session, text = next(requests)
+            result.sent += 1
+            task = asyncio.ensure_future(one(session, text, next_at))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    finally:
+        result.wall = time.perf_counter() - start
+        result.client_lag = monitor.stats()
+        monitor.stop()
+    return result
+
+
+def recommend(summary: Dict[str, Any], target: Target, cpu_count: Optional[int] = None) -> Dict[str, Any]:
+    """Worker/thread counts for the observed load, with the reasoning behind them."""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    rps = summary["target_rps"]
+    mean_s = summary["latency_mean_ms"] / 1000
+    p95_s = summary["latency_ms"]["p95"] / 1000
+    in_flight = rps * mean_s
+    notes = [f"Little's law: ~{in_flight:.1f} requests in flight on average at {rps} rps."]
+    advice: Dict[str, Any] = {}
+
+    if target.is_async:
+        lag = summary.get("server_loop_lag")
+        if lag:
+            blocked = lag["blocked_fraction"]
+            # A saturated loop cannot report more than 100% blocked; scale by
+            # how far goodput fell short of the target as well.
+            shortfall = max(1.0, rps / summary["goodput_rps"]) if summary["goodput_rps"] else 1.0
+            workers = min(cpu_count, max(1, math.ceil(blocked / TARGET_BLOCKED_FRACTION * shortfall)))
+            notes.append(f"Server event loop blocked ~{blocked:.0%} of the time (p99 lag {lag['p99_ms']} ms).")
+            if lag["p99_ms"] >= 100:
+                notes.append("Handlers block the event loop; move blocking work (pandas, sync LLM calls) "
+                             "off the loop or add workers.")
+        else:
+            workers = 1
+            notes.append("No server loop-lag data; sized for one worker.")
+        advice["workers"] = workers
+        notes.append(f"Run uvicorn with --workers {workers} and without --reload.")
+    else:
+        threads = max(1, math.ceil(rps * p95_s * THREAD_HEADROOM))
+        workers = min(cpu_count, max(1, math.ceil(threads / 32)))
+        advice.update(workers=workers, threads=math.ceil(threads / workers))
+        notes.append(f"Serve app.py from a threaded WSGI server, e.g. gunicorn --workers {workers} "
+                     f"--threads {advice['threads']} (covers p95 latency at the target rate).")
+
+    if summary["achieved_rps"] < 0.95 * rps:
+        notes.append("The generator fell behind the target rate; results are a lower bound.")
+    if summary["client_loop_lag"].get("p99_ms", 0) >= 50:
+        notes.append("The load generator's own event loop lagged; lower --rps or split the load.")
+    if summary["dropped"]:
+        notes.append(f"{summary['dropped']} requests were not sent because --max-in-flight was reached.")
+    if summary["error_rate"] > 0.01:
+        notes.append(f"Error rate {summary['error_rate']:.1%}: {summary['errors']}.")
+    advice["notes"] = notes
+    return advice
+
+
+def http_sender(client, target: Target) -> Send:
+    async def send(session: str, text: str) -> int:
+        response = await client.request(target.method, target.path, **target.build(session, text))
+        return response.status_code
+    return send
+
+
+async def _server_lag(client, target: Target, reset: bool = False) -> Optional[Dict[str, Any]]:
+    if not target.lag_path:
+        return None
+    try:
+        response = await client.get(target.lag_path, params={"reset": "true"} if reset else None)
+        return response.json() if response.status_code == 200 else None
+    except Exception:
+        return None
+
+
+async def main_async(args) -> Dict[str, Any]:
+    import httpx
+
+    target = TARGETS[args.target]
+    conversations = (
+        load_conversations(args.conversations) if args.conversations
+        else synthetic_conversations(args.target, seed=args.seed)
+    )
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=args.url or target.default_url, timeout=args.timeout, limits=limits) as client:
+        await _server_lag(client, target, reset=True)
+        result = await run_load(http_sender(client, target), replay(conversations), args.rps, args.duration,
+                                args.arrival, args.max_in_flight, args.seed)
+        result.server_lag = await _server_lag(client, target)
+    summary = result.summary()
+    summary["recommendation"] = recommend(summary, target)
+    return summary
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    latency = summary["latency_ms"]
+    lines = [
+        f"Sent {summary['sent']} requests ({summary['achieved_rps']} rps of {summary['target_rps']} target), "
+        f"{summary['completed']} completed, goodput {summary['goodput_rps']} rps",
+        f"Latency ms: p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {summary['latency_max_ms']}",
+        f"Errors: {summary['errors'] or 'none'}   statuses: {summary['statuses']}",
+        f"Client loop lag ms: p99 {summary['client_loop_lag'].get('p99_ms')}  max {summary['client_loop_lag'].get('max_ms')}",
+    ]
+    if summary["server_loop_lag"]:
+        lag = summary["server_loop_lag"]
+        lines.append(f"Server loop lag ms: p50 {lag['p50_ms']}  p99 {lag['p99_ms']}  max {lag['max_ms']}  "
+                     f"blocked {lag['blocked_fraction']:.1%}")
+    lines.append("Recommendation:")
+    lines += [f"  - {note}" for note in summary["recommendation"]["notes"]]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the ShoppingGPT servers")
+    parser.add_argument("--target", choices=sorted(TARGETS), default="backend")
+    parser.add_argument("--url", help="server base URL (default depends on --target)")
+    parser.add_argument("--rps", type=float, default=10.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--conversations", help="synthetic_conversations .jsonl/.json to replay")
+    parser.add_argument("--arrival", choices=["poisson", "constant"], default="poisson")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    summary = asyncio.run(main_async(args))
+    print(json.dumps(summary, indent=2) if args.json else format_summary(summary))
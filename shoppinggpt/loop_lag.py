@@ -0,0 +1,60 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional
+
+from shoppinggpt.tracing import Histogram
+
+LAG_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class LoopLagMonitor:
+    """Measures how late an asyncio event loop wakes up from a short sleep.
+
+    Lag is time the loop spent running something else (usually blocking
+    code in a handler) when it should have been serving timers and
+    sockets. `blocked_fraction` sums the lag over the elapsed time; it
+    underestimates short stalls but tracks long ones well.
+    """
+
+    def __init__(self, interval: float = 0.05, clock: Callable[[], float] = time.perf_counter):
+        self.interval = interval
+        self.clock = clock
+        self.histogram = Histogram(LAG_BUCKETS)
+        self.max_lag = 0.0
+        self.started: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "LoopLagMonitor":
+        self.started = self.clock()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def _run(self) -> None:
+        while True:
+            before = self.clock()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, self.clock() - before - self.interval)
+            self.histogram.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def reset(self) -> None:
+        self.histogram = Histogram(LAG_BUCKETS)
+        self.max_lag = 0.0
+        self.started = self.clock()
+
+    def stats(self) -> Dict[str, Any]:
+        h = self.histogram
+        elapsed = self.clock() - self.started if self.started is not None else 0.0
+        return {
+            "samples": h.count,
+            "mean_ms": round(h.sum / h.count * 1000, 3) if h.count else 0.0,
+            "p50_ms": h.quantile(0.5) * 1000,
+            "p99_ms": h.quantile(0.99) * 1000,
+            "max_ms": round(self.max_lag * 1000, 3),
+            "blocked_fraction": round(min(1.0, h.sum / elapsed), 4) if elapsed else 0.0,
+        }
@@ -1,6 +1,7 @@
 from typing import List
-import numpy as np
-from shoppinggpt.config import EMBEDDINGS
+from shoppinggpt.config import get_embeddings
+from shoppinggpt.llm.bulk_embeddings import BulkEmbedder
+from shoppinggpt.tracing import traced
 
 PRODUCT_SAMPLE = [
     "how much does this dress cost", "what colors are available for this shirt",
@@ -56,21 +57,23 @@ CHITCHAT_ROUTE_NAME = 'chitchat'
 
 
 def cosine_similarity(a, b):
+    import numpy as np
+
     return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
 
 class SemanticRouter:
-    def __init__(self):
+    def __init__(self, embeddings=None):
         self.product_prompts = PRODUCT_SAMPLE
         self.chitchat_prompts = CHITCHAT_SAMPLE
-        self.embedding = EMBEDDINGS
-        self.product_embeddings = [
-            self.embedding.embed_query(prompt) for prompt in self.product_prompts
-        ]
-        self.chitchat_embeddings = [
-            self.embedding.embed_query(prompt) for prompt in self.chitchat_prompts
-        ]
+        self.embedding = embeddings or get_embeddings()
+        # Both sample sets in one pass, EMBED_CONCURRENCY requests at a time.
+        embedded = BulkEmbedder(self.embedding, query=True, progress=None).embed(
+            self.product_prompts + self.chitchat_prompts)
+        self.product_embeddings = embedded[:len(self.product_prompts)]
+        self.chitchat_embeddings = embedded[len(self.product_prompts):]
 
+    @traced("router.guide")
     def guide(self, query: str) -> str:
         query_embedding = self.embedding.embed_query(query)
 
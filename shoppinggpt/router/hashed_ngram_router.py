@@ -0,0 +1,147 @@
+import math
+import os
+import random
+import re
+import struct
+import zlib
+from array import array
+from typing import Dict, Sequence
+
+from shoppinggpt.tracing import traced
+
+# Constants
+PRODUCT_ROUTE_NAME = 'products'
+CHITCHAT_ROUTE_NAME = 'chitchat'
+
+DEFAULT_MODEL_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "data",
+    "router_model.bin",
+)
+
+_MAGIC = b"SGRM"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBBBBfI")
+_SPACES = re.compile(r"\s+")
+
+
+class HashedNgramClassifier:
+    """Binary logistic regression over hashed character n-grams.
+
+    Text is lower-cased and split into character n-grams (word boundaries
+    included); each n-gram is hashed with CRC32 into `2**bits` buckets and
+    the feature vector is L2-normalised. Only non-zero weights are stored,
+    so a model trained on a few thousand utterances is a few hundred KB and
+    scores a query with a few hundred dictionary lookups.
+    """
+
+    def __init__(self, labels: Sequence[str] = (CHITCHAT_ROUTE_NAME, PRODUCT_ROUTE_NAME), bits: int = 18,
+                 min_n: int = 2, max_n: int = 4):
+        self.labels = tuple(labels)
+        self.bits = bits
+        self.min_n = min_n
+        self.max_n = max_n
+        self.mask = (1 << bits) - 1
+        self.bias = 0.0
+        self.weights: Dict[int, float] = {}
+
+    def features(self, text: str) -> Dict[int, float]:
+        text = " " + _SPACES.sub(" ", text.lower()).strip() + " "
+        counts: Dict[int, float] = {}
+        mask = self.mask
+        for n in range(self.min_n, self.max_n + 1):
+            for i in range(len(text) - n + 1):
+                index = zlib.crc32(text[i:i + n].encode("utf-8")) & mask
+                counts[index] = counts.get(index, 0.0) + 1.0
+        norm = math.sqrt(sum(value * value for value in counts.values())) or 1.0
+        return {index: value / norm for index, value in counts.items()}
+
+    def decision(self, text: str) -> float:
+        weights = self.weights
+        return self.bias + sum(weights.get(index, 0.0) * value for index, value in self.features(text).items())
+
+    def predict_proba(self, text: str) -> float:
+        """Probability of `labels[1]`."""
+        score = self.decision(text)
+        if score >= 0:
+            return 1.0 / (1.0 + math.exp(-score))
+        exp = math.exp(score)
+        return exp / (1.0 + exp)
+
+    def predict(self, text: str) -> str:
+        return self.labels[1] if self.decision(text) > 0 else self.labels[0]
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str], epochs: int = 15,
+            learning_rate: float = 0.5, l2: float = 1e-5, seed: int = 0) -> "HashedNgramClassifier":
+        """Train with Adagrad on the logistic loss."""
+        examples = [
+            (self.features(text), 1.0 if label == self.labels[1] else 0.0)
+            for text, label in zip(texts, labels)
+        ]
+        squared: Dict[int, float] = {}
+        bias_squared = 0.0
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(examples)
+            for features, target in examples:
+                score = self.bias + sum(self.weights.get(i, 0.0) * v for i, v in features.items())
+                score = max(-35.0, min(35.0, score))
+                error = 1.0 / (1.0 + math.exp(-score)) - target
+                for index, value in features.items():
+                    weight = self.weights.get(index, 0.0)
+                    gradient = error * value + l2 * weight
+                    squared[index] = squared.get(index, 0.0) + gradient * gradient
+                    self.weights[index] = weight - learning_rate * gradient / math.sqrt(squared[index])
+                bias_squared += error * error
+                self.bias -= learning_rate * error / math.sqrt(bias_squared)
+        self.weights = {index: weight for index, weight in self.weights.items() if abs(weight) > 1e-6}
+        return self
+
+    def save(self, path: str) -> None:
+        """Write the model in a small binary format (header, labels, sparse weights)."""
+        indices = array("I", sorted(self.weights))
+        values = array("f", (self.weights[index] for index in indices))
+        labels = "\n".join(self.labels).encode("utf-8")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, self.bits, self.min_n, self.max_n, self.bias, len(indices)))
+            f.write(struct.pack("<H", len(labels)) + labels)
+            f.write(indices.tobytes())
+            f.write(values.tobytes())
+
+    @classmethod
+    def load(cls, path: str) -> "HashedNgramClassifier":
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, bits, min_n, max_n, bias, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a router model (version {_VERSION})")
+        offset = _HEADER.size
+        (labels_size,) = struct.unpack_from("<H", data, offset)
+        offset += 2
+        labels = data[offset:offset + labels_size].decode("utf-8").split("\n")
+        offset += labels_size
+        indices = array("I")
+        indices.frombytes(data[offset:offset + 4 * count])
+        values = array("f")
+        values.frombytes(data[offset + 4 * count:offset + 8 * count])
+        model = cls(labels, bits, min_n, max_n)
+        model.bias = bias
+        model.weights = dict(zip(indices, values))
+        return model
+
+
+class SemanticRouter:
+    """Routes queries with a local HashedNgramClassifier; no network needed.
+
+    Train the model with `python -m shoppinggpt.router.train`.
+    """
+
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH):
+        self.model = HashedNgramClassifier.load(model_path)
+
+    @traced("router.guide")
+    def guide(self, query: str) -> str:
+        return self.model.predict(query)
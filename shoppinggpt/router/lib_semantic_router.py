@@ -1,7 +1,5 @@
 from typing import List, Dict
-import numpy as np
-from semantic_router import Route, RouteLayer
-from semantic_router.encoders.tfidf import TfidfEncoder
+from shoppinggpt.tracing import traced
 
 PRODUCT_SAMPLE = [
     "how much does this dress cost", "what colors are available for this shirt",
@@ -58,6 +56,10 @@ CHITCHAT_ROUTE_NAME = 'chitchat'
 
 class SemanticRouter:
     def __init__(self):
+        # semantic_router pulls in NumPy and its encoders; import on first use.
+        from semantic_router import Route, RouteLayer
+        from semantic_router.encoders.tfidf import TfidfEncoder
+
         self.embedding = TfidfEncoder()
         
         # Initialize the routes first
@@ -76,13 +78,16 @@ class SemanticRouter:
 
         self.route_layer = RouteLayer(encoder=self.embedding, routes=self.routes)
 
-    def similarity(self, query: str, route: Route) -> float:
+    def similarity(self, query: str, route) -> float:
+        import numpy as np
+
         # Calculate similarity between query and route
         # Using the transform method instead of encode
         query_embedding = self.embedding.transform([query])[0]
         route_embedding = self.embedding.transform(route.utterances)
         return np.mean(np.dot(query_embedding, route_embedding.T))
 
+    @traced("router.guide")
     def guide(self, query: str) -> str:
         # Use the route_layer to determine the best route
         best_route = self.route_layer(query)
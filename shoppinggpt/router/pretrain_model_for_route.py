@@ -1,5 +1,6 @@
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
+from shoppinggpt.tracing import traced
 
 # Constants
 PRODUCT_ROUTE_NAME = 'products'
@@ -20,6 +21,7 @@ class SemanticRouter:
         product_prob = probs[0][1].item()
         return PRODUCT_ROUTE_NAME if product_prob > 0.5 else CHITCHAT_ROUTE_NAME, product_prob
 
+    @traced("router.guide")
     def guide(self, query: str) -> str:
         result, confidence = self.predict(query)
         return result
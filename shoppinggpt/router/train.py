@@ -0,0 +1,86 @@
+"""Train the local router model used by hashed_ngram_router.
+
+    python -m shoppinggpt.router.train --data synthetic_conversations.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import re
+from typing import List, Tuple
+
+from shoppinggpt.router.hashed_ngram_router import (
+    CHITCHAT_ROUTE_NAME,
+    DEFAULT_MODEL_PATH,
+    PRODUCT_ROUTE_NAME,
+    HashedNgramClassifier,
+)
+from shoppinggpt.router.lib_semantic_router import CHITCHAT_SAMPLE, PRODUCT_SAMPLE
+from shoppinggpt.synthetic.writer import iter_jsonl
+
+# Categories written by generate_synthesic_data.py -> route names.
+CATEGORY_ROUTES = {"product": PRODUCT_ROUTE_NAME, "chitchat": CHITCHAT_ROUTE_NAME}
+
+_HUMAN_TURN = re.compile(r"^\s*human\s*:\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+
+def load_conversations(path: str) -> List[dict]:
+    if path.endswith(".jsonl"):
+        return list(iter_jsonl(path))
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def human_turns(conversation: str) -> List[str]:
+    return [turn.strip() for turn in _HUMAN_TURN.findall(conversation)]
+
+
+def build_dataset(paths: List[str]) -> List[Tuple[str, str]]:
+    """(text, route) pairs: the seed samples plus every Human turn of each conversation."""
+    examples = [(text, PRODUCT_ROUTE_NAME) for text in PRODUCT_SAMPLE]
+    examples += [(text, CHITCHAT_ROUTE_NAME) for text in CHITCHAT_SAMPLE]
+    for path in paths:
+        for record in load_conversations(path):
+            route = CATEGORY_ROUTES.get(record.get("category"))
+            if route is None:
+                continue
+            for turn in human_turns(record.get("conversation", "")):
+                examples.append((turn, route))
+    return examples
+
+
+def accuracy(model: HashedNgramClassifier, examples: List[Tuple[str, str]]) -> float:
+    if not examples:
+        return 0.0
+    return sum(model.predict(text) == route for text, route in examples) / len(examples)
+
+
+def train(paths: List[str], output: str = DEFAULT_MODEL_PATH, epochs: int = 15, bits: int = 18,
+          holdout: float = 0.1, seed: int = 0) -> HashedNgramClassifier:
+    examples = build_dataset([path for path in paths if os.path.exists(path)])
+    random.Random(seed).shuffle(examples)
+    split = int(len(examples) * holdout)
+    test, fit = examples[:split], examples[split:]
+
+    model = HashedNgramClassifier(bits=bits).fit(
+        [text for text, _ in fit], [route for _, route in fit], epochs=epochs, seed=seed
+    )
+    print(f"Trained on {len(fit)} examples, {len(model.weights)} non-zero weights")
+    print(f"Train accuracy: {accuracy(model, fit):.3f}")
+    if test:
+        print(f"Holdout accuracy ({len(test)} examples): {accuracy(model, test):.3f}")
+    model.save(output)
+    print(f"Saved {output} ({os.path.getsize(output)} bytes)")
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the local hashed n-gram router")
+    parser.add_argument("--data", nargs="*", default=["synthetic_conversations.jsonl"],
+                        help="synthetic_conversations .jsonl or .json files")
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=15)
+    parser.add_argument("--bits", type=int, default=18)
+    parser.add_argument("--holdout", type=float, default=0.1)
+    args = parser.parse_args()
+    train(args.data, args.output, epochs=args.epochs, bits=args.bits, holdout=args.holdout)
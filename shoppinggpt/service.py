@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import cached_property
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from shoppinggpt.accounting import attribute
+from shoppinggpt.agent import ShoppingAgent
+from shoppinggpt.chain import create_chitchat_chain
+from shoppinggpt.router.lib_semantic_router import CHITCHAT_ROUTE_NAME, PRODUCT_ROUTE_NAME
+from shoppinggpt.tracing import current_span, span, traced
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION = "default"
+UNKNOWN_ROUTE_RESPONSE = "Unknown query type"
+
+# Start retrievals the agent is likely to need while the query is routed.
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() != "false"
+PREFETCH_TIMEOUT = float(os.getenv("PREFETCH_TIMEOUT", "2.0"))
+
+Prefetcher = Callable[[str], Awaitable[Any]]
+
+
+def create_router():
+    # ROUTER_BACKEND=local uses the offline model from shoppinggpt.router.train.
+    if os.getenv("ROUTER_BACKEND") == "local":
+        from shoppinggpt.router.hashed_ngram_router import SemanticRouter
+        return SemanticRouter()
+    from shoppinggpt.router.lib_semantic_router import SemanticRouter
+    return SemanticRouter()
+
+
+def default_prefetchers() -> Dict[str, Prefetcher]:
+    from shoppinggpt.tool.policy_search import asearch_policies
+    from shoppinggpt.tool.product_lookup import product_fast_lookup
+
+    async def products(query: str):
+        return await asyncio.to_thread(product_fast_lookup, query)
+
+    return {"policies": asearch_policies, "products": products}
+
+
+def format_prefetched(results: Dict[str, Any]) -> str:
+    sections = []
+    if results.get("policies"):
+        sections.append("Store policy excerpts:\n" + "\n---\n".join(results["policies"]))
+    if results.get("products"):
+        sections.append("Possibly relevant products:\n" + "\n".join(
+            "- " + ", ".join(f"{key}: {value}" for key, value in product.items())
+            for product in results["products"]
+        ))
+    return "\n\n".join(sections)
+
+
+def _cancel(tasks: Dict[str, "asyncio.Task"]) -> None:
+    for task in tasks.values():
+        task.cancel()
+
+
+def response_content(response) -> str:
+    return (
+        response.content if hasattr(response, 'content')
+        else response['output'] if isinstance(response, dict) and 'output' in response
+        else str(response)
+    )
+
+
+class ShoppingAssistant:
+    """Routes each query to the chitchat chain or the shopping agent.
+
+    Shared by the Flask app, the CLI and the ASGI server. The LLM and the
+    router are built on first use (or by `warmup`); conversation memory is
+    kept per session in a bounded LRU, and the "default" session is the one
+    every caller shared before sessions existed.
+    """
+
+    def __init__(self, llm_provider: str = "gemini", max_sessions: int = 1000, memory_factory=None,
+                 speculative: bool = SPECULATIVE_RETRIEVAL, prefetch_timeout: float = PREFETCH_TIMEOUT,
+                 prefetchers: Optional[Dict[str, Prefetcher]] = None):
+        self.llm_provider = llm_provider
+        self.max_sessions = max_sessions
+        self.memory_factory = memory_factory
+        self.speculative = speculative
+        self.prefetch_timeout = prefetch_timeout
+        self._prefetchers = prefetchers
+        self._memories: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @cached_property
+    def llm(self):
+        from shoppinggpt.llm.factory import create_llm
+        return create_llm(self.llm_provider)
+
+    @cached_property
+    def router(self):
+        return create_router()
+
+    @property
+    def prefetchers(self) -> Dict[str, Prefetcher]:
+        if self._prefetchers is None:
+            self._prefetchers = default_prefetchers()
+        return self._prefetchers
+
+    def memory(self, session_id: str = DEFAULT_SESSION):
+        with self._lock:
+            memory = self._memories.get(session_id)
+            if memory is not None:
+                self._memories.move_to_end(session_id)
+                return memory
+        memory = self._new_memory()
+        with self._lock:
+            memory = self._memories.setdefault(session_id, memory)
+            self._memories.move_to_end(session_id)
+            while len(self._memories) > self.max_sessions:
+                self._memories.popitem(last=False)
+            return memory
+
+    def _new_memory(self):
+        if self.memory_factory is not None:
+            return self.memory_factory()
+        from langchain.memory import ConversationBufferMemory
+        return ConversationBufferMemory(return_messages=True)
+
+    def guide(self, query: str) -> str:
+        try:
+            return self.router.guide(query)
+        except RuntimeWarning:
+            # semantic_router warns on degenerate similarity scores.
+            return CHITCHAT_ROUTE_NAME
+
+    def _reply(self, query: str, route: str, content: str, memory) -> dict:
+        memory.chat_memory.add_user_message(query)
+        memory.chat_memory.add_ai_message(content)
+        return {
+            'response': content,
+            'type': route
+        }
+
+    @traced("handle_query")
+    def handle_query(self, query: str, session_id: str = DEFAULT_SESSION) -> dict:
+        """Handle user query and return response."""
+        memory = self.memory(session_id)
+        guided_route = self.guide(query)
+        current_span().set_attribute("route", guided_route)
+
+        with attribute(session=session_id, route=guided_route):
+            if guided_route == CHITCHAT_ROUTE_NAME:
+                with span("chain.chitchat"):
+                    response = create_chitchat_chain(self.llm, memory).invoke({"input": query})
+            elif guided_route == PRODUCT_ROUTE_NAME:
+                response = ShoppingAgent(self.llm, memory).invoke(query)
+            else:
+                response = UNKNOWN_ROUTE_RESPONSE
+        return self._reply(query, guided_route, response_content(response), memory)
+
+    def _speculate(self, query: str) -> Dict[str, "asyncio.Task"]:
+        async def prefetch(name: str, fetch: Prefetcher):
+            with span(f"prefetch.{name}"):
+                return await fetch(query)
+
+        tasks = {name: asyncio.ensure_future(prefetch(name, fetch)) for name, fetch in self.prefetchers.items()}
+        for task in tasks.values():
+            # Retrieve failures of prefetches nobody waits for, so they are not logged as unhandled.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return tasks
+
+    async def _collect(self, tasks: Dict[str, "asyncio.Task"]) -> Dict[str, Any]:
+        """Results of the prefetches that finish within `prefetch_timeout`; the rest are cancelled."""
+        if not tasks:
+            return {}
+        done, pending = await asyncio.wait(tasks.values(), timeout=self.prefetch_timeout)
+        for task in pending:
+            task.cancel()
+        results = {}
+        for name, task in tasks.items():
+            if task not in done or task.cancelled():
+                continue
+            if task.exception() is not None:
+                logger.warning("Prefetch %s failed: %s", name, task.exception())
+            else:
+                results[name] = task.result()
+        return results
+
+    @traced("handle_query")
+    async def ahandle_query(self, query: str, session_id: str = DEFAULT_SESSION) -> dict:
+        """`handle_query` for an event loop: LLM calls are awaited, routing runs in a thread.
+
+        With `speculative` on, the policy top-k search and the product fast
+        lookup start together with routing. Product turns hand their
+        results to the agent as context, which usually saves it a tool
+        round trip; other routes cancel them.
+        """
+        memory = self.memory(session_id)
+        speculation = self._speculate(query) if self.speculative else {}
+        try:
+            guided_route = await asyncio.to_thread(self.guide, query)
+        except BaseException:
+            _cancel(speculation)
+            raise
+        current_span().set_attribute("route", guided_route)
+
+        with attribute(session=session_id, route=guided_route):
+            if guided_route == PRODUCT_ROUTE_NAME:
+                prefetched = await self._collect(speculation)
+                current_span().set_attribute("prefetched", ",".join(sorted(prefetched)))
+                agent = ShoppingAgent(self.llm, memory, context=format_prefetched(prefetched))
+                response = await agent.ainvoke(query)
+            else:
+                _cancel(speculation)
+                if guided_route == CHITCHAT_ROUTE_NAME:
+                    with span("chain.chitchat"):
+                        response = await create_chitchat_chain(self.llm, memory).ainvoke({"input": query})
+                else:
+                    response = UNKNOWN_ROUTE_RESPONSE
+        return self._reply(query, guided_route, response_content(response), memory)
+
+    def warmup(self) -> Dict[str, float]:
+        """Build the LLM, router, agent and indexes now instead of on the first request.
+
+        Returns seconds spent per step; a failing step is logged and left to
+        be retried lazily by the first request that needs it.
+        """
+        def agent():
+            import sqlite3
+            from shoppinggpt.config import DATA_PRODUCT_PATH
+
+            ShoppingAgent(self.llm, self.memory())._executor()
+            with sqlite3.connect(DATA_PRODUCT_PATH) as conn:
+                conn.execute("SELECT 1 FROM products LIMIT 1").fetchall()
+
+        def policy_index():
+            from shoppinggpt.tool.policy_search import get_vector_store_manager
+            get_vector_store_manager()
+
+        def product_lookup():
+            from shoppinggpt.tool.product_lookup import product_fast_lookup
+            product_fast_lookup("warmup")
+
+        steps = (
+            ("llm", lambda: self.llm),
+            ("router", lambda: self.guide("xin chào")),
+            ("agent", agent),
+            ("policy_index", policy_index),
+            ("product_lookup", product_lookup),
+        )
+        timings: Dict[str, float] = {}
+        for name, step in steps:
+            start = time.perf_counter()
+            try:
+                with span(f"warmup.{name}"):
+                    step()
+            except Exception:
+                logger.exception("Warmup step %s failed", name)
+            timings[name] = time.perf_counter() - start
+        return timings
@@ -0,0 +1,119 @@
+import hashlib
+import random
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_SPEAKER = re.compile(r"\b(human|ai)\s*:", re.IGNORECASE)
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """Word `size`-grams of the conversation, ignoring case, punctuation and speaker tags."""
+    words = _NON_WORD.sub(" ", _SPEAKER.sub(" ", text.lower())).split()
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+class MinHash:
+    """MinHash signatures with a fixed seed, so they are stable across runs."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, items: set) -> Tuple[int, ...]:
+        hashes = [_hash(item) for item in items] or [0]
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self.params
+        )
+
+    @staticmethod
+    def similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity of the sets behind two signatures."""
+        return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+
+class NearDuplicateFilter:
+    """Incremental MinHash/LSH index that rejects near-duplicate conversations.
+
+    Signatures are split into `bands` buckets; only texts sharing a bucket
+    are compared, and a text is a duplicate when its estimated Jaccard
+    similarity to an accepted one reaches `threshold`. Accept/reject counts
+    are kept per category.
+    """
+
+    def __init__(self, threshold: float = 0.7, num_perm: int = 128, bands: int = 32, shingle_size: int = 3):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.minhash = MinHash(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._buckets: List[Dict[Tuple[int, ...], List[int]]] = [defaultdict(list) for _ in range(bands)]
+        self._signatures: List[Tuple[int, ...]] = []
+        self.accepted: Counter = Counter()
+        self.rejected: Counter = Counter()
+
+    def _bands(self, signature: Tuple[int, ...]):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def find_duplicate(self, signature: Tuple[int, ...]) -> Optional[Tuple[int, float]]:
+        seen = set()
+        for band, key in self._bands(signature):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                similarity = MinHash.similarity(signature, self._signatures[candidate])
+                if similarity >= self.threshold:
+                    return candidate, similarity
+        return None
+
+    def add(self, text: str) -> None:
+        """Index `text` unconditionally (e.g. records from a previous run)."""
+        self._insert(self.minhash.signature(shingles(text, self.shingle_size)))
+
+    def _insert(self, signature: Tuple[int, ...]) -> None:
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for band, key in self._bands(signature):
+            self._buckets[band][key].append(index)
+
+    def check(self, text: str, category: Optional[str] = None) -> bool:
+        """Return True and index `text` if it is new; False if it is a near-duplicate."""
+        signature = self.minhash.signature(shingles(text, self.shingle_size))
+        if self.find_duplicate(signature) is not None:
+            self.rejected[category] += 1
+            return False
+        self._insert(signature)
+        self.accepted[category] += 1
+        return True
+
+    def rates(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for category in set(self.accepted) | set(self.rejected):
+            total = self.accepted[category] + self.rejected[category]
+            result[category] = {
+                "accepted": self.accepted[category],
+                "rejected": self.rejected[category],
+                "reject_rate": self.rejected[category] / total if total else 0.0,
+            }
+        return result
+
+    def __len__(self) -> int:
+        return len(self._signatures)
@@ -0,0 +1,172 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from shoppinggpt.llm.rate_limit import TokenBucket, is_rate_limit_error
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class Slot:
+    """One (model, API key) pair with its rpm, tpm and daily token budgets."""
+
+    def __init__(
+        self,
+        model: str,
+        api_key: str,
+        rpm: float,
+        tpm: float,
+        daily_limit: float,
+        max_concurrency: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.model = model
+        self.api_key = api_key
+        self.clock = clock
+        self.requests = TokenBucket(rpm, rpm / 60.0, clock)
+        self.tokens = TokenBucket(tpm, tpm / 60.0, clock)
+        self.daily = TokenBucket(daily_limit, daily_limit / SECONDS_PER_DAY, clock)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.backoff_until = 0.0
+        self.failures = 0
+        self.completed = 0
+        self.client: Any = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.model}/{self.api_key[-4:]}"
+
+    def ready_in(self, tokens: int) -> float:
+        """Seconds until this slot can take a request of `tokens` tokens."""
+        if self.in_flight >= self.max_concurrency:
+            return float("inf")
+        return max(
+            self.backoff_until - self.clock(),
+            self.requests.wait_time(1),
+            self.tokens.wait_time(tokens),
+            self.daily.wait_time(tokens),
+            0.0,
+        )
+
+    def reserve(self, tokens: int) -> None:
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self.daily.take(tokens)
+        self.in_flight += 1
+
+    def settle(self, reserved: int, actual: Optional[int]) -> None:
+        self.in_flight -= 1
+        if actual is None or actual == reserved:
+            return
+        for bucket in (self.tokens, self.daily):
+            if actual < reserved:
+                bucket.give(reserved - actual)
+            else:
+                bucket.take(actual - reserved)
+
+    def back_off(self, base: float = 2.0, cap: float = 120.0, retry_after: Optional[float] = None) -> float:
+        self.failures += 1
+        delay = retry_after or min(cap, base * 2 ** (self.failures - 1)) * random.uniform(0.5, 1.0)
+        self.backoff_until = max(self.backoff_until, self.clock() + delay)
+        return delay
+
+
+class QuotaScheduler:
+    """Dispatch generation jobs to whichever (model, key) slot has quota first.
+
+    `generate(slot, category)` returns `(record, tokens_used)`;
+    `accept(record)` persists it and returns False to reject (e.g. a
+    duplicate), in which case the category stays open. A job is only
+    started while `remaining - in_flight > 0` for its category, so the run
+    stops at exactly the target.
+    """
+
+    def __init__(
+        self,
+        slots: List[Slot],
+        remaining: Dict[str, int],
+        generate: Callable[[Slot, str], Awaitable[Tuple[dict, Optional[int]]]],
+        accept: Callable[[dict], bool],
+        tokens_per_request: int = 2000,
+    ):
+        self.slots = slots
+        self.remaining = remaining
+        self.generate = generate
+        self.accept = accept
+        self.tokens_per_request = tokens_per_request
+        self.in_flight = {category: 0 for category in remaining}
+        self.rate_limited = 0
+        self.errors = 0
+
+    def _open_categories(self) -> List[str]:
+        return [
+            category for category, count in self.remaining.items()
+            if count - self.in_flight[category] > 0
+        ]
+
+    async def run(self) -> None:
+        pending: Dict[asyncio.Task, Tuple[Slot, str]] = {}
+        try:
+            while True:
+                wait = self._dispatch(pending)
+                if not pending and not self._open_categories():
+                    return
+                if not pending and wait == float("inf"):
+                    raise RuntimeError("No slot can ever serve a request; check the quotas")
+                done, _ = await asyncio.wait(
+                    pending, timeout=None if wait == float("inf") else wait,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    self._finish(task, *pending.pop(task))
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _dispatch(self, pending: Dict) -> float:
+        """Start as many jobs as quota allows; return seconds until the next one could start."""
+        while True:
+            categories = self._open_categories()
+            if not categories:
+                return float("inf")
+            waits = [(slot.ready_in(self.tokens_per_request), slot) for slot in self.slots]
+            wait, slot = min(waits, key=lambda pair: pair[0])
+            if wait > 0:
+                return wait
+            # Favour the category furthest from its target.
+            category = max(categories, key=lambda c: (self.remaining[c] - self.in_flight[c], random.random()))
+            slot.reserve(self.tokens_per_request)
+            self.in_flight[category] += 1
+            pending[asyncio.ensure_future(self.generate(slot, category))] = (slot, category)
+
+    def _finish(self, task: asyncio.Task, slot: Slot, category: str) -> None:
+        self.in_flight[category] -= 1
+        error = task.exception()
+        if error is not None:
+            slot.settle(self.tokens_per_request, None)
+            if is_rate_limit_error(error):
+                self.rate_limited += 1
+                delay = slot.back_off(retry_after=getattr(error, "retry_after", None))
+                print(f"429 from {slot.name}, backing off {delay:.1f}s")
+            else:
+                self.errors += 1
+                slot.back_off(base=1.0)
+                print(f"Error with {slot.name}: {error}")
+            return
+
+        record, tokens_used = task.result()
+        slot.settle(self.tokens_per_request, tokens_used)
+        slot.failures = 0
+        slot.completed += 1
+        if self.accept(record):
+            self.remaining[category] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "remaining": dict(self.remaining),
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "completed_per_slot": {slot.name: slot.completed for slot in self.slots},
+        }
@@ -0,0 +1,140 @@
+import json
+import os
+import time
+from collections import Counter
+from typing import Dict, Iterator, Optional, Sequence
+
+
+def _record(line, required: Sequence[str] = ()) -> Optional[dict]:
+    """The JSON object on `line`, or None if it is not one or lacks a `required` field."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict) or any(field not in record for field in required):
+        return None
+    return record
+
+
+def iter_jsonl(path: str, required: Sequence[str] = ()) -> Iterator[dict]:
+    """Yield records from a JSONL file, skipping blank, torn or incomplete lines."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = _record(line, required)
+            if record is not None:
+                yield record
+
+
+class JSONLWriter:
+    """Append-only JSONL sink that survives crashes mid-run.
+
+    Every record is written and flushed as soon as it arrives; the file is
+    fsynced every `fsync_every` records or `fsync_interval` seconds. On
+    open, a half-written trailing line from a previous crash is cut off and
+    the records already on disk are counted per category so generation can
+    resume where it stopped. Corrupt lines elsewhere in the file, and
+    records missing a `required` field, are left in place, skipped and
+    counted in `corrupt`; readers skip them too.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 20, fsync_interval: float = 5.0, key: str = "category",
+                 required: Sequence[str] = ()):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.key = key
+        self.required = tuple(required)
+        self.corrupt = 0
+        self.counts: Counter = self.recover()
+        self._file = open(path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def recover(self) -> Counter:
+        counts = Counter()
+        if not os.path.exists(self.path):
+            return counts
+        tail = b""
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Only the last line can lack its newline.
+                    tail = line
+                    break
+                if not line.strip():
+                    continue
+                record = _record(line, self.required)
+                if record is None:
+                    self.corrupt += 1
+                    continue
+                counts[record.get(self.key)] += 1
+        if tail:
+            record = _record(tail)
+            if record is not None:
+                # Complete object whose newline never made it to disk.
+                if any(field not in record for field in self.required):
+                    self.corrupt += 1
+                else:
+                    counts[record.get(self.key)] += 1
+                with open(self.path, "ab") as f:
+                    f.write(b"\n")
+            else:
+                # Torn by a crash mid-write: nothing after it to lose.
+                with open(self.path, "r+b") as f:
+                    f.truncate(os.path.getsize(self.path) - len(tail))
+        return counts
+
+    def write(self, record: dict) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.counts[record.get(self.key)] += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def remaining_per_category(counts: Counter, categories, total: int) -> Dict[str, int]:
+    """Split `total` evenly over `categories` and subtract what already exists."""
+    base, extra = divmod(total, len(categories))
+    return {
+        category: max(0, base + (1 if i < extra else 0) - counts.get(category, 0))
+        for i, category in enumerate(categories)
+    }
+
+
+def jsonl_to_json(src: str, dst: Optional[str] = None) -> str:
+    """Convert a JSONL file into the legacy indented JSON array, streaming."""
+    dst = dst or os.path.splitext(src)[0] + ".json"
+    with open(dst, "w", encoding="utf-8") as out:
+        out.write("[")
+        first = True
+        for record in iter_jsonl(src):
+            body = json.dumps(record, ensure_ascii=False, indent=4).replace("\n", "\n    ")
+            out.write(("\n    " if first else ",\n    ") + body)
+            first = False
+        out.write("]" if first else "\n]")
+    return dst
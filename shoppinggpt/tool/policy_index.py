@@ -0,0 +1,312 @@
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A policy store directory holds:
+#   index.faiss    the FAISS index, opened with IO_FLAG_MMAP so the worker
+#                  processes of a host share one copy in the page cache
+#   docstore.bin   chunk text and metadata by FAISS row id; see BlobDocstore
+#   manifest.json  dimension, row count and the FAISS factory string
+# A store written by LangChain's FAISS.save_local has index.pkl instead of
+# docstore.bin; `--convert-pickle` rewrites it once, and it is never loaded.
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.bin"
+MANIFEST_FILE = "manifest.json"
+PICKLE_FILE = "index.pkl"
+
+# Vectors of the chunks embedded so far; a crashed or repeated build only
+# embeds what is missing (see shoppinggpt.llm.bulk_embeddings).
+EMBEDDINGS_FILE = "embeddings.jsonl"
+
+_BLOB_MAGIC = b"SGDS"
+_BLOB_VERSION = 1
+_BLOB_PREAMBLE = struct.Struct("<4sHxxQ")  # magic, format version, document count
+_OFFSET = struct.Struct("<Q")
+_LENGTH = struct.Struct("<I")
+
+# "flat" keeps exact search; "ivf" and "ivfpq" trade a little recall for
+# less memory and faster search on large corpora. Any other value is passed
+# to faiss.index_factory as is, e.g. "IVF1024,PQ48".
+QUANTIZATION = os.getenv("POLICY_INDEX_QUANTIZATION", "flat")
+NPROBE = int(os.getenv("POLICY_INDEX_NPROBE", "8"))
+
+# FAISS wants ~39 training points per IVF centroid.
+_POINTS_PER_CENTROID = 39
+# ...and PQ as many per code of each 8-bit sub-quantizer.
+_PQ_TRAINING_POINTS = 256 * _POINTS_PER_CENTROID
+
+
+def factory_string(quantization: str, count: int, dimension: int) -> str:
+    """The faiss.index_factory description for `quantization` at this corpus size.
+
+    IVF and PQ need enough vectors to train; smaller corpora fall back to
+    IVF without PQ, then to an exact flat index.
+    """
+    kind = (quantization or "flat").strip().lower()
+    if kind == "flat":
+        return "Flat"
+    if kind not in ("ivf", "ivfpq"):
+        return quantization.strip()
+    nlist = min(int(4 * math.sqrt(count)), count // _POINTS_PER_CENTROID)
+    if nlist < 2:
+        return "Flat"
+    if kind == "ivf" or count < _PQ_TRAINING_POINTS:
+        return f"IVF{nlist},Flat"
+    # 8-bit codes over sub-vectors of about 8 dimensions; m must divide the dimension.
+    m = max(d for d in range(1, dimension // 8 + 1) if dimension % d == 0)
+    return f"IVF{nlist},PQ{m}"
+
+
+class _RowIds:
+    """FAISS row i is document i, so `index_to_docstore_id` needs no dict."""
+
+    def __init__(self, count: int):
+        self.count = count
+
+    def __getitem__(self, row: int) -> int:
+        if not 0 <= row < self.count:
+            raise KeyError(row)
+        return row
+
+    def __len__(self) -> int:
+        return self.count
+
+    def values(self):
+        return range(self.count)
+
+
+class BlobDocstore:
+    """Chunk texts and metadata in one file, read lazily by row id.
+
+    Layout, little-endian:
+        preamble  "SGDS", u16 format version, 2 pad bytes, u64 count
+        offsets   count + 1 u64 file offsets; entry i spans offsets[i]..offsets[i + 1]
+        entries   u32 length + UTF-8 text, u32 length + metadata as UTF-8 JSON
+
+    The file is mmapped and nothing is decoded on open: a lookup reads two
+    offsets and decodes one entry, so a search materializes only its top-k
+    chunks. Unlike index.pkl, loading it never executes code.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < _BLOB_PREAMBLE.size:
+            raise ValueError(f"{path} is not a version {_BLOB_VERSION} docstore")
+        magic, version, self.count = _BLOB_PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != _BLOB_MAGIC or version != _BLOB_VERSION:
+            raise ValueError(f"{path} is not a version {_BLOB_VERSION} docstore")
+        if _BLOB_PREAMBLE.size + (self.count + 1) * _OFFSET.size > len(self._mmap):
+            raise ValueError(f"{path} is truncated")
+
+    @staticmethod
+    def write(path: str, documents: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Write (text, metadata) pairs as rows 0..n-1, replacing `path` atomically; returns n."""
+        entries = bytearray()
+        offsets = []
+        for text, metadata in documents:
+            offsets.append(len(entries))
+            for blob in (text.encode("utf-8"), json.dumps(metadata or {}, ensure_ascii=False).encode("utf-8")):
+                entries += _LENGTH.pack(len(blob))
+                entries += blob
+        offsets.append(len(entries))
+        start = _BLOB_PREAMBLE.size + len(offsets) * _OFFSET.size
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(prefix=".docstore-", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_BLOB_PREAMBLE.pack(_BLOB_MAGIC, _BLOB_VERSION, len(offsets) - 1))
+                f.write(b"".join(_OFFSET.pack(start + offset) for offset in offsets))
+                f.write(entries)
+            # mkstemp creates the file 0600; give it the mode open() would.
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp, 0o666 & ~umask)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        return len(offsets) - 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _blob(self, position: int) -> Tuple[str, int]:
+        (length,) = _LENGTH.unpack_from(self._mmap, position)
+        start = position + _LENGTH.size
+        return self._mmap[start:start + length].decode("utf-8"), start + length
+
+    def get(self, row: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        row = int(row)
+        if not 0 <= row < self.count:
+            return None
+        (position,) = _OFFSET.unpack_from(self._mmap, _BLOB_PREAMBLE.size + row * _OFFSET.size)
+        text, position = self._blob(position)
+        metadata, _ = self._blob(position)
+        return text, json.loads(metadata)
+
+    def search(self, search: Any):
+        from langchain_core.documents import Document
+
+        found = self.get(search)
+        if found is None:
+            return f"ID {search} not found."
+        text, metadata = found
+        return Document(page_content=text, metadata=metadata)
+
+    def add(self, texts: Dict[str, Any]) -> None:
+        raise NotImplementedError("docstore.bin is read-only; rebuild the policy index instead")
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("docstore.bin is read-only; rebuild the policy index instead")
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+def store_exists(directory: str) -> bool:
+    return all(os.path.exists(os.path.join(directory, name)) for name in (INDEX_FILE, DOCSTORE_FILE, MANIFEST_FILE))
+
+
+def pickle_store_exists(directory: str) -> bool:
+    """Whether `directory` holds an unconverted FAISS.save_local store."""
+    return os.path.exists(os.path.join(directory, PICKLE_FILE)) and not store_exists(directory)
+
+
+def embed_chunks(directory: str, documents: Sequence[Any], embeddings) -> List[List[float]]:
+    """Embeddings of `documents`, checkpointed in `directory` as batches finish."""
+    from shoppinggpt.llm.bulk_embeddings import BulkEmbedder
+
+    os.makedirs(directory, exist_ok=True)
+    embedder = BulkEmbedder(embeddings, checkpoint=os.path.join(directory, EMBEDDINGS_FILE))
+    return embedder.embed([doc.page_content for doc in documents])
+
+
+def write_store(directory: str, index, documents: Iterable[Tuple[str, Dict[str, Any]]],
+                description: str) -> Dict[str, Any]:
+    """Write a FAISS index and its (text, metadata) rows to `directory`; returns the manifest.
+
+    Files are written under temporary names and renamed, with the manifest
+    last, so readers never see a half-written store.
+    """
+    import faiss
+
+    documents = list(documents)
+    if len(documents) != index.ntotal:
+        raise ValueError(f"{directory}: index has {index.ntotal} vectors for {len(documents)} chunks")
+    os.makedirs(directory, exist_ok=True)
+    count = BlobDocstore.write(os.path.join(directory, DOCSTORE_FILE), documents)
+    tmp = os.path.join(directory, f".{INDEX_FILE}.tmp")
+    faiss.write_index(index, tmp)
+    os.replace(tmp, os.path.join(directory, INDEX_FILE))
+    manifest = {"dimension": index.d, "count": count, "factory": description}
+    tmp = os.path.join(directory, f".{MANIFEST_FILE}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(directory, MANIFEST_FILE))
+    return manifest
+
+
+def build_store(directory: str, documents: Sequence[Any], embeddings,
+                quantization: str = QUANTIZATION) -> Dict[str, Any]:
+    """Embed LangChain `documents` and write them to `directory`; returns the manifest."""
+    import faiss
+    import numpy as np
+
+    vectors = np.asarray(embed_chunks(directory, documents, embeddings), dtype=np.float32)
+    count, dimension = vectors.shape
+    description = factory_string(quantization, count, dimension)
+    index = faiss.index_factory(dimension, description, faiss.METRIC_L2)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return write_store(directory, index, ((doc.page_content, doc.metadata) for doc in documents), description)
+
+
+def convert_pickle_store(directory: str, embeddings) -> Dict[str, Any]:
+    """Rewrite a FAISS.save_local store as docstore.bin and manifest.json.
+
+    This unpickles index.pkl once, so only run it on a store you built.
+    The index is written back unchanged.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    vectorstore = FAISS.load_local(directory, embeddings, allow_dangerous_deserialization=True)
+    ids = vectorstore.index_to_docstore_id
+    documents = (vectorstore.docstore.search(ids[row]) for row in range(vectorstore.index.ntotal))
+    # FAISS.from_texts and from_embeddings only ever build flat indexes.
+    return write_store(directory, vectorstore.index, ((doc.page_content, doc.metadata) for doc in documents),
+                       "Flat")
+
+
+def read_index(path: str, nprobe: int = NPROBE):
+    """Open a FAISS index memory-mapped and read-only.
+
+    IO_FLAG_MMAP only maps IVF inverted lists; flat codes need
+    IO_FLAG_MMAP_IFC (faiss >= 1.11). Without it a flat index is read into
+    each process's heap.
+    """
+    import faiss
+
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    mmap_flat = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if mmap_flat is not None:
+        flags |= mmap_flat
+    index = faiss.read_index(path, flags)
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        if mmap_flat is None:
+            logger.warning("faiss %s cannot memory-map the non-IVF index %s; each process holds a copy. "
+                           "Install faiss-cpu>=1.11.", faiss.__version__, path)
+    return index
+
+
+def load_store(directory: str, embeddings, nprobe: int = NPROBE):
+    """A LangChain FAISS vectorstore over the store in `directory`.
+
+    The index is memory-mapped and docstore.bin is read lazily, so loading
+    reads neither into the heap and never unpickles anything.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+        manifest = json.load(f)
+    index = read_index(os.path.join(directory, INDEX_FILE), nprobe)
+    if index.ntotal != manifest["count"]:
+        raise ValueError(f"{directory}: index has {index.ntotal} vectors, manifest says {manifest['count']}")
+    docstore = BlobDocstore(os.path.join(directory, DOCSTORE_FILE))
+    if len(docstore) != index.ntotal:
+        raise ValueError(f"{directory}: index has {index.ntotal} vectors, {DOCSTORE_FILE} has {len(docstore)} chunks")
+    return FAISS(embedding_function=embeddings, index=index, docstore=docstore,
+                 index_to_docstore_id=_RowIds(index.ntotal))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from shoppinggpt.config import DATA_TEXT_PATH, STORE_DIRECTORY, get_embeddings
+    from shoppinggpt.tool.policy_search import load_policy_chunks
+
+    parser = argparse.ArgumentParser(description="Build the policy index")
+    parser.add_argument("--data", default=DATA_TEXT_PATH, help="policy text file")
+    parser.add_argument("--store", default=STORE_DIRECTORY, help="store directory")
+    parser.add_argument("--quantization", default=QUANTIZATION,
+                        help="flat, ivf, ivfpq or a faiss.index_factory string")
+    parser.add_argument("--convert-pickle", action="store_true",
+                        help="instead, rewrite the store's index.pkl as docstore.bin")
+    args = parser.parse_args()
+
+    if args.convert_pickle:
+        print(convert_pickle_store(args.store, get_embeddings()))
+    else:
+        print(build_store(args.store, load_policy_chunks(args.data), get_embeddings(), args.quantization))
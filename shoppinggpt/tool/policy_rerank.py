@@ -0,0 +1,176 @@
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+from shoppinggpt.llm.prompt_budget import count_tokens, trim_text
+
+# FAISS returns this many candidates; MMR keeps at most `k` of them.
+FETCH_K = int(os.getenv("POLICY_FETCH_K", "20"))
+# 1 ranks by relevance only, 0 by novelty only.
+MMR_LAMBDA = float(os.getenv("POLICY_MMR_LAMBDA", "0.7"))
+# Candidates at least this similar to a chunk already kept are dropped.
+DUPLICATE_THRESHOLD = float(os.getenv("POLICY_DUPLICATE_THRESHOLD", "0.9"))
+TOKEN_BUDGET = int(os.getenv("POLICY_TOKEN_BUDGET", "1200"))
+CACHE_SIZE = int(os.getenv("POLICY_CACHE_SIZE", "512"))
+
+# The splitter overlaps neighbouring chunks by up to 200 characters; text
+# shared with a chunk already kept is cut when it is at least this long.
+_MIN_OVERLAP = 40
+_MAX_OVERLAP = 400
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a query: NFC, case-folded, whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFC", query).casefold().split())
+
+
+def _terms(text: str) -> List[str]:
+    words = _WORD.findall(text.casefold())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def term_matrix(texts: Sequence[str], query: str):
+    """Unit-length tf-idf rows for `texts` plus the query's row, over their joint vocabulary."""
+    import numpy as np
+
+    documents = [_terms(text) for text in texts] + [_terms(query)]
+    vocabulary: Dict[str, int] = {}
+    for terms in documents:
+        for term in terms:
+            vocabulary.setdefault(term, len(vocabulary))
+    counts = np.zeros((len(documents), max(len(vocabulary), 1)))
+    for row, terms in enumerate(documents):
+        for term in terms:
+            counts[row, vocabulary[term]] += 1
+    tf = np.log1p(counts)
+    df = (counts[:-1] > 0).sum(axis=0)
+    weights = tf * np.log((1 + len(texts)) / (1 + df) + 1)
+    norms = np.linalg.norm(weights, axis=1, keepdims=True)
+    weights = weights / np.where(norms > 0, norms, 1)
+    return weights[:-1], weights[-1]
+
+
+def relevance(distances: Sequence[float], lexical) -> Any:
+    """Blend of the vector ranking and the local lexical reranker, both in [0, 1]."""
+    import numpy as np
+
+    distances = np.asarray(distances, dtype=np.float64)
+    spread = distances.max() - distances.min() if distances.size else 0.0
+    semantic = 1.0 - (distances - distances.min()) / spread if spread > 0 else np.ones_like(distances)
+    return 0.5 * semantic + 0.5 * lexical
+
+
+def mmr(scores, similarity, k: int, mmr_lambda: float = MMR_LAMBDA,
+        duplicate_threshold: float = DUPLICATE_THRESHOLD) -> List[int]:
+    """Greedy maximal marginal relevance over a precomputed similarity matrix.
+
+    Each step is one vectorized update of every candidate's similarity to
+    the chunks kept so far; near duplicates are masked out for good.
+    """
+    import numpy as np
+
+    scores = np.asarray(scores, dtype=np.float64)
+    available = np.ones(len(scores), dtype=bool)
+    redundancy = np.zeros(len(scores))
+    chosen: List[int] = []
+    while len(chosen) < k and available.any():
+        marginal = np.where(available, mmr_lambda * scores - (1 - mmr_lambda) * redundancy, -np.inf)
+        best = int(np.argmax(marginal))
+        chosen.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+        available &= similarity[best] < duplicate_threshold
+    return chosen
+
+
+def strip_overlap(text: str, kept: Sequence[str]) -> str:
+    """`text` without a prefix or suffix it shares with a chunk already kept."""
+    for other in kept:
+        for n in range(min(len(other), len(text), _MAX_OVERLAP), _MIN_OVERLAP - 1, -1):
+            if text.startswith(other[-n:]):
+                text = text[n:].lstrip()
+                break
+        for n in range(min(len(other), len(text), _MAX_OVERLAP), _MIN_OVERLAP - 1, -1):
+            if text.endswith(other[:n]):
+                text = text[:-n].rstrip()
+                break
+    return text
+
+
+def select_chunks(query: str, texts: Sequence[str], distances: Sequence[float], k: int,
+                  token_budget: int = TOKEN_BUDGET, mmr_lambda: float = MMR_LAMBDA,
+                  duplicate_threshold: float = DUPLICATE_THRESHOLD) -> Dict[str, Any]:
+    """Rerank FAISS candidates, drop redundancy and fit them into `token_budget`.
+
+    Returns the chunks in rank order with the estimated tokens before and
+    after trimming.
+    """
+    if not texts:
+        return {"chunks": [], "tokens": 0, "candidate_tokens": 0, "trimmed": False}
+    vectors, query_vector = term_matrix(texts, query)
+    scores = relevance(distances, vectors @ query_vector)
+    order = mmr(scores, vectors @ vectors.T, k, mmr_lambda, duplicate_threshold)
+
+    chunks: List[str] = []
+    kept: List[str] = []
+    used = 0
+    for i in order:
+        text = strip_overlap(texts[i], kept)
+        if not text:
+            continue
+        cost = count_tokens(text)
+        if used + cost > token_budget:
+            if not chunks:
+                # Never return nothing: cut the best chunk to the budget.
+                chunks.append(trim_text(text, token_budget))
+                used = count_tokens(chunks[0])
+            break
+        chunks.append(text)
+        kept.append(texts[i])
+        used += cost
+    candidate_tokens = sum(count_tokens(texts[i]) for i in order)
+    return {"chunks": chunks, "tokens": used, "candidate_tokens": candidate_tokens,
+            "trimmed": used < candidate_tokens}
+
+
+class ResultCache:
+    """Bounded LRU of final policy search results, shared by threads and coroutines."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
@@ -1,13 +1,30 @@
-import os
-from typing import List
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from shoppinggpt.config import get_embeddings, DATA_TEXT_PATH, STORE_DIRECTORY
+from shoppinggpt.tool.policy_rerank import FETCH_K, ResultCache, normalize_query, select_chunks
+from shoppinggpt.tracing import span
+
+
+def load_policy_chunks(data_path: str):
+    from langchain_community.document_loaders import TextLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    loader = TextLoader(data_path, encoding='utf8')
+    documents = loader.load()
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200
+    )
+    return text_splitter.split_documents(documents)
 
-from langchain.tools import tool
-from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from shoppinggpt.config import EMBEDDINGS, DATA_TEXT_PATH, STORE_DIRECTORY
 
 class VectorStoreManager:
+    """The policy index in `store_directory`, built on first use.
+
+    See shoppinggpt.tool.policy_index for the on-disk format.
+    """
+
     def __init__(self, data_path: str, store_directory: str, embeddings):
         self.data_path = data_path
         self.store_directory = store_directory
@@ -15,27 +32,24 @@ class VectorStoreManager:
         self.vectorstore = self.load_or_create_vectorstore()
 
     def load_vectorstore(self):
-        return FAISS.load_local(
-            self.store_directory,
-            self.embeddings,
-            allow_dangerous_deserialization=True
-        )
+        from shoppinggpt.tool.policy_index import load_store
+
+        return load_store(self.store_directory, self.embeddings)
 
     def create_vectorstore(self):
-        loader = TextLoader(self.data_path, encoding='utf8')
-        documents = loader.load()
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        document_chunks = text_splitter.split_documents(documents)
-
-        vectorstore = FAISS.from_documents(document_chunks, self.embeddings)
-        vectorstore.save_local(self.store_directory)
-        return vectorstore
+        from shoppinggpt.tool.policy_index import build_store
+
+        build_store(self.store_directory, load_policy_chunks(self.data_path), self.embeddings)
+        return self.load_vectorstore()
 
     def check_existing_vectorstore(self):
-        return os.path.exists(os.path.join(self.store_directory, "index.faiss"))
+        from shoppinggpt.tool.policy_index import pickle_store_exists, store_exists
+
+        if pickle_store_exists(self.store_directory):
+            # Never unpickled at serve time, and not silently rebuilt over.
+            raise ValueError(f"{self.store_directory} holds a pickled index.pkl; convert it with "
+                             "`python -m shoppinggpt.tool.policy_index --convert-pickle`")
+        return store_exists(self.store_directory)
 
     def load_or_create_vectorstore(self):
         if self.check_existing_vectorstore():
@@ -48,8 +62,77 @@ class VectorStoreManager:
         return VectorStoreManager(data_path, store_directory, embeddings)
 
 
-@tool
-def policy_search_tool(query: str) -> List[str]:
+@lru_cache(maxsize=None)
+def get_vector_store_manager() -> VectorStoreManager:
+    """The policy index, loaded (or built) once per process."""
+    return VectorStoreManager.create(DATA_TEXT_PATH, STORE_DIRECTORY, get_embeddings())
+
+
+POLICY_TOP_K = 5
+
+# Final results per normalized query; the index is loaded once per process,
+# so entries never go stale.
+RESULT_CACHE = ResultCache()
+
+
+def _cached(query: str, k: int) -> Tuple[Tuple[str, int], Optional[List[str]]]:
+    key = (normalize_query(query), k)
+    with span("policy_search.cache") as lookup:
+        chunks = RESULT_CACHE.get(key)
+        lookup.set_attribute("hit", chunks is not None)
+    return key, chunks
+
+
+def _rerank(query: str, candidates, k: int) -> List[str]:
+    with span("policy_search.rerank", candidates=len(candidates)) as rerank:
+        selected = select_chunks(query, [doc.page_content for doc, _ in candidates],
+                                 [distance for _, distance in candidates], k)
+        rerank.set_attribute("tokens", selected["tokens"])
+        rerank.set_attribute("candidate_tokens", selected["candidate_tokens"])
+        rerank.set_attribute("trimmed", selected["trimmed"])
+    return selected["chunks"]
+
+
+def search_policies(query: str, k: int = POLICY_TOP_K, fetch_k: int = FETCH_K) -> List[str]:
+    """Up to `k` policy chunks for `query`, reranked, deduplicated and trimmed to the token budget.
+
+    FAISS returns `fetch_k` candidates; see shoppinggpt.tool.policy_rerank.
+    """
+    key, chunks = _cached(query, k)
+    if chunks is not None:
+        return list(chunks)
+
+    with span("policy_search.load_index"):
+        vector_store_manager = get_vector_store_manager()
+
+    with span("policy_search.faiss_search", k=fetch_k) as search:
+        candidates = vector_store_manager.vectorstore.similarity_search_with_score(query, k=max(k, fetch_k))
+        search.set_attribute("results", len(candidates))
+    chunks = _rerank(query, candidates, k)
+    RESULT_CACHE.put(key, tuple(chunks))
+    return chunks
+
+
+async def asearch_policies(query: str, k: int = POLICY_TOP_K, fetch_k: int = FETCH_K) -> List[str]:
+    """`search_policies` with the query embedding awaited, so cancelling it stops the request."""
+    import asyncio
+
+    key, chunks = _cached(query, k)
+    if chunks is not None:
+        return list(chunks)
+
+    with span("policy_search.load_index"):
+        vector_store_manager = await asyncio.to_thread(get_vector_store_manager)
+
+    with span("policy_search.faiss_search", k=fetch_k) as search:
+        candidates = await vector_store_manager.vectorstore.asimilarity_search_with_score(query, k=max(k, fetch_k))
+        search.set_attribute("results", len(candidates))
+    chunks = _rerank(query, candidates, k)
+    RESULT_CACHE.put(key, tuple(chunks))
+    return chunks
+
+
+def _policy_search_tool(query: str) -> List[str]:
     """
     Search for information related to company policies.
 
@@ -59,11 +142,27 @@ def policy_search_tool(query: str) -> List[str]:
     Returns:
         List[str]: The search results as a list of text strings.
     """
-    vector_store_manager = VectorStoreManager.create(
-        DATA_TEXT_PATH,
-        STORE_DIRECTORY,
-        EMBEDDINGS
+    with span("tool.policy_search"):
+        return search_policies(query)
+
+
+async def _apolicy_search_tool(query: str) -> List[str]:
+    with span("tool.policy_search"):
+        return await asearch_policies(query)
+
+
+@lru_cache(maxsize=None)
+def get_policy_search_tool():
+    """The agent tool, built on first use so importing this module skips langchain_core."""
+    from langchain_core.tools import StructuredTool
+    return StructuredTool.from_function(
+        func=_policy_search_tool,
+        coroutine=_apolicy_search_tool,
+        name="policy_search_tool",
     )
 
-    results = vector_store_manager.vectorstore.similarity_search(query, k=5)
-    return [doc.page_content for doc in results]
+
+def __getattr__(name):
+    if name == "policy_search_tool":
+        return get_policy_search_tool()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
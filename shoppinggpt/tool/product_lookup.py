@@ -0,0 +1,51 @@
+import math
+import os
+import re
+import sqlite3
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from shoppinggpt.config import DATA_PRODUCT_PATH
+from shoppinggpt.tracing import span
+
+# Columns matched by the fast path; names, brands and colours carry the words
+# customers use ("áo sơ mi trắng", "jean xanh").
+FAST_LOOKUP_COLUMNS = ("product_name", "brand", "color", "material", "gender")
+_WORD = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=8)
+def _lookup_table(db_path: str, mtime_ns: int) -> Tuple[List[Dict], List[Dict[str, float]]]:
+    """Products and the idf-weighted words of each, for one version of the database."""
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        products = [dict(row) for row in conn.execute("SELECT * FROM products")]
+    words = [
+        set(_WORD.findall(" ".join(str(product.get(column) or "") for column in FAST_LOOKUP_COLUMNS).lower()))
+        for product in products
+    ]
+    frequency: Dict[str, int] = {}
+    for product_words in words:
+        for word in product_words:
+            frequency[word] = frequency.get(word, 0) + 1
+    weights = [{word: math.log(1 + len(products) / frequency[word]) for word in product_words}
+               for product_words in words]
+    return products, weights
+
+
+def product_fast_lookup(query: str, limit: int = 5, db_path: str = DATA_PRODUCT_PATH) -> List[Dict]:
+    """Products sharing words with the query, best first, without asking the LLM for SQL.
+
+    Meant for prefetching likely context; the SQL-generating tool stays the
+    authority for precise questions (prices, stock filters, aggregates).
+    """
+    with span("product_search.fast_lookup") as lookup:
+        products, weights = _lookup_table(db_path, os.stat(db_path).st_mtime_ns)
+        query_words = set(_WORD.findall(query.lower()))
+        scored = [
+            (sum(product_weights.get(word, 0.0) for word in query_words), index)
+            for index, product_weights in enumerate(weights)
+        ]
+        best = sorted((item for item in scored if item[0] > 0), key=lambda item: (-item[0], item[1]))[:limit]
+        lookup.set_attribute("rows", len(best))
+        return [products[index] for _, index in best]
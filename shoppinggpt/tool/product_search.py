@@ -1,12 +1,12 @@
+import asyncio
 import sqlite3
+from functools import lru_cache
 from typing import Union, List, Dict
 
-from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain.tools import tool
-from langchain_google_genai import ChatGoogleGenerativeAI
-
-from shoppinggpt.config import GOOGLE_API_KEY, DATA_PRODUCT_PATH
+from shoppinggpt.accounting import attribute
+from shoppinggpt.config import DATA_PRODUCT_PATH
+from shoppinggpt.llm.prompt_budget import fit_rows
+from shoppinggpt.tracing import span
 
 PRODUCT_RECOMMENDATION_PROMPT = """
     You are a chatbot assistant specializing in providing product information and
@@ -72,8 +72,7 @@ class ProductDataLoader:
         columns = [col[0] for col in cursor.description]
         return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
-@tool
-def product_search_tool(input: str) -> Union[List[Dict], str]:
+def _product_search_tool(input: str) -> Union[List[Dict], str]:
     """
     Tìm kiếm thông tin liên quan tới sản phẩm và trả về các thông tin liên quan sử dụng SQLite.
 
@@ -83,26 +82,74 @@ def product_search_tool(input: str) -> Union[List[Dict], str]:
     Returns:
         Union[List[Dict], str]: Kết quả tìm kiếm dưới dạng danh sách từ điển hoặc thông báo lỗi nếu có.
     """
-    try:
-        llm = ChatGoogleGenerativeAI(temperature=0, model="gemini-1.5-flash", google_api_key=GOOGLE_API_KEY)
-        prompt = PromptTemplate(
-            template=PRODUCT_RECOMMENDATION_PROMPT,
-            input_variables=["input"]
-        )
-        
-        with ProductDataLoader(f"{DATA_PRODUCT_PATH}") as product_data_loader:
-            def execute_sql_query(query: str) -> List[Dict]:
-                return product_data_loader.execute_query(query)
-            
-            chain = (
-                {"input": RunnablePassthrough()}
-                | prompt
-                | llm
-                | (lambda x: execute_sql_query(x.content))
-            )
-            result = chain.invoke(input)
-        
+    with span("tool.product_search") as tool_span, attribute(tool="product_search"):
+        result = _product_search(input)
+        if isinstance(result, list):
+            result = fit_rows(result, site="tool.product_search")
+        if isinstance(result, str):
+            tool_span.set_attribute("error", result)
+        return result
+
+
+async def _aproduct_search_tool(input: str) -> Union[List[Dict], str]:
+    with span("tool.product_search") as tool_span, attribute(tool="product_search"):
+        result = await _aproduct_search(input)
+        if isinstance(result, list):
+            result = fit_rows(result, site="tool.product_search")
+        if isinstance(result, str):
+            tool_span.set_attribute("error", result)
         return result
+
+
+@lru_cache(maxsize=None)
+def get_product_search_tool():
+    """The agent tool, built on first use so importing this module skips langchain_core.
+
+    The agent's async path awaits the coroutine, so a product search can run
+    alongside the other tool calls of the same step.
+    """
+    from langchain_core.tools import StructuredTool
+    return StructuredTool.from_function(
+        func=_product_search_tool,
+        coroutine=_aproduct_search_tool,
+        name="product_search_tool",
+    )
+
+
+def __getattr__(name):
+    if name == "product_search_tool":
+        return get_product_search_tool()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _default_llm():
+    from shoppinggpt.llm.factory import create_llm
+    return create_llm("gemini")
+
+
+def _execute_sql_query(db_path: str, query: str) -> List[Dict]:
+    with ProductDataLoader(db_path) as product_data_loader, span("product_search.sql_execution") as sql_span:
+        rows = product_data_loader.execute_query(query)
+        sql_span.set_attribute("rows", len(rows))
+        return rows
+
+
+def _product_search(input: str, llm=None, db_path: str = DATA_PRODUCT_PATH) -> Union[List[Dict], str]:
+    try:
+        llm = llm or _default_llm()
+        with span("product_search.sql_generation"):
+            sql = llm.invoke(PRODUCT_RECOMMENDATION_PROMPT.format(input=input))
+        return _execute_sql_query(db_path, sql.content)
     except Exception as e:
         return f"An error occurred: {str(e)}"
 
+
+async def _aproduct_search(input: str, llm=None, db_path: str = DATA_PRODUCT_PATH) -> Union[List[Dict], str]:
+    """`_product_search` with the SQL generation awaited and the query run in a worker thread."""
+    try:
+        llm = llm or _default_llm()
+        with span("product_search.sql_generation"):
+            sql = await llm.ainvoke(PRODUCT_RECOMMENDATION_PROMPT.format(input=input))
+        return await asyncio.to_thread(_execute_sql_query, db_path, sql.content)
+    except Exception as e:
+        return f"An error occurred: {str(e)}"
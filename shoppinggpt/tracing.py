@@ -0,0 +1,314 @@
+import asyncio
+import atexit
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Histogram bucket upper bounds, in seconds.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "shoppinggpt")
+
+_CURRENT_SPAN: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation; ids and fields follow the OpenTelemetry data model."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def duration(self) -> float:
+        """Seconds, or the time elapsed so far for a span still open."""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """The span in OTLP/JSON form."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: List[Span], service_name: str = SERVICE_NAME) -> Dict[str, Any]:
+    """An OTLP/JSON `ExportTraceServiceRequest` body for `spans`."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "shoppinggpt.tracing"}, "spans": [span.to_otlp() for span in spans]}],
+        }]
+    }
+
+
+class InMemoryExporter:
+    """Keeps finished spans in a list; meant for tests."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def names(self) -> List[str]:
+        return [span.name for span in self.spans]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+class JSONLExporter:
+    """Appends each finished span to a file as one OTLP/JSON request per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(otlp_payload([span]), ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class OTLPExporter:
+    """Batches spans and POSTs them to an OTLP/HTTP collector (`/v1/traces`).
+
+    Export happens on a daemon thread so request handlers never wait on the
+    collector; failed batches are dropped.
+    """
+
+    def __init__(self, endpoint: str, batch_size: int = 64, flush_interval: float = 5.0,
+                 service_name: str = SERVICE_NAME):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.service_name = service_name
+        self.dropped = 0
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        threading.Thread(target=self._run, name="otlp-exporter", daemon=True).start()
+        atexit.register(self.flush)
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        import urllib.request
+
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        body = json.dumps(otlp_payload(batch, self.service_name)).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+        except Exception:
+            self.dropped += len(batch)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if error:
+            self.errors += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Tracer:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.exporters: List[Any] = []
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def add_exporter(self, exporter) -> None:
+        self.exporters.append(exporter)
+
+    def remove_exporter(self, exporter) -> None:
+        if exporter in self.exporters:
+            self.exporters.remove(exporter)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Time the enclosed block as a child of the current span."""
+        span = Span(name, _CURRENT_SPAN.get(), attributes)
+        token = _CURRENT_SPAN.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            if not isinstance(e, (GeneratorExit, asyncio.CancelledError)):
+                span.record_exception(e)
+            raise
+        finally:
+            _CURRENT_SPAN.reset(token)
+            self._finish(span)
+
+    def traced(self, name: Optional[str] = None) -> Callable:
+        """Decorator form of `span` for plain and async functions."""
+        def decorator(fn):
+            span_name = name or fn.__qualname__
+            if asyncio.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _finish(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        with self._lock:
+            histogram = self.histograms.get(span.name)
+            if histogram is None:
+                histogram = self.histograms[span.name] = Histogram(self.buckets)
+            histogram.observe(span.duration, span.error is not None)
+        for exporter in list(self.exporters):
+            try:
+                exporter.export(span)
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {
+                    "count": h.count,
+                    "errors": h.errors,
+                    "mean": h.sum / h.count if h.count else 0.0,
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "p99": h.quantile(0.99),
+                }
+                for name, h in sorted(self.histograms.items())
+            }
+
+    def render_prometheus(self) -> str:
+        """Span latency histograms in the Prometheus text exposition format."""
+        metric = "shoppinggpt_span_duration_seconds"
+        lines = [
+            f"# HELP {metric} Latency of traced pipeline stages.",
+            f"# TYPE {metric} histogram",
+        ]
+        errors = []
+        with self._lock:
+            for name, h in sorted(self.histograms.items()):
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{span="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{span="{label}",le="+Inf"}} {h.count}')
+                lines.append(f'{metric}_sum{{span="{label}"}} {h.sum}')
+                lines.append(f'{metric}_count{{span="{label}"}} {h.count}')
+                errors.append(f'shoppinggpt_span_errors_total{{span="{label}"}} {h.errors}')
+        lines += ["# HELP shoppinggpt_span_errors_total Traced stages that raised.",
+                  "# TYPE shoppinggpt_span_errors_total counter"] + errors
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+
+
+def current_span() -> Optional[Span]:
+    return _CURRENT_SPAN.get()
+
+
+def configure_from_env(tracer: "Tracer") -> None:
+    """TRACE_OTLP_ENDPOINT ships spans to a collector; TRACE_FILE appends them to a file."""
+    endpoint = os.getenv("TRACE_OTLP_ENDPOINT")
+    if endpoint:
+        tracer.add_exporter(OTLPExporter(endpoint))
+    path = os.getenv("TRACE_FILE")
+    if path:
+        tracer.add_exporter(JSONLExporter(path))
+
+
+TRACER = Tracer()
+configure_from_env(TRACER)
+
+span = TRACER.span
+traced = TRACER.traced
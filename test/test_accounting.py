@@ -0,0 +1,52 @@
+from shoppinggpt.accounting import UsageAccountant, attribute, current_attribution, price_for
+
+
+def make_accountant(tmp_path, **kwargs):
+    return UsageAccountant(str(tmp_path / "usage.db"), background=False, **kwargs)
+
+
+def test_attribution_nests_and_resets():
+    with attribute(session="s1", route="products"):
+        with attribute(tool="product_search"):
+            assert current_attribution() == {"session": "s1", "route": "products", "tool": "product_search"}
+        assert current_attribution() == {"session": "s1", "route": "products"}
+    assert current_attribution() == {}
+
+
+def test_records_are_buffered_until_flush(tmp_path):
+    accountant = make_accountant(tmp_path, flush_every=3)
+    with attribute(session="s1"):
+        accountant.record("groq", "gemma-7b-it", "hello", 10, 5)
+        accountant.record("groq", "gemma-7b-it", "hello", 10, 5)
+    assert accountant.stats()["pending"] == 2
+    accountant.record("groq", "gemma-7b-it", "bye", 1, 1)
+    assert accountant.stats()["pending"] == 0
+    assert accountant.stats()["totals"]["provider:groq"] == {"calls": 3, "tokens": 32}
+
+
+def test_top_sessions_and_prompts(tmp_path):
+    accountant = make_accountant(tmp_path)
+    catalog_prompt = "system: CATALOG " * 50
+    with attribute(session="heavy", route="recommendation"):
+        for _ in range(3):
+            accountant.record("azure", "gpt-4o", catalog_prompt, 4000, 200)
+    with attribute(session="light", route="chitchat"):
+        accountant.record("gemini", "gemini-1.5-flash", "human: hi", 20, 10)
+
+    sessions = accountant.top_sessions(5)
+    assert [row["session"] for row in sessions] == ["heavy", "light"]
+    assert sessions[0]["total_tokens"] == 12600 and sessions[0]["calls"] == 3
+    assert abs(sessions[0]["cost"] - 3 * (4000 * 2.5 + 200 * 10.0) / 1e6) < 1e-9
+
+    top = accountant.top_prompts(1)[0]
+    assert top["calls"] == 3 and top["route"] == "recommendation"
+    assert top["prompt_preview"] == catalog_prompt[:200]
+
+    by_route = {row["route"]: row["prompt_tokens"] for row in accountant.breakdown("route")}
+    assert by_route == {"recommendation": 12000, "chitchat": 20}
+
+
+def test_price_override_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_PRICE_GEMMA_7B_IT", "1,2")
+    assert price_for("gemma-7b-it") == (1.0, 2.0)
+    assert price_for(None) == (0.0, 0.0)
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from shoppinggpt.agent import parse_tool_timeouts, run_tool
+
+
+def sleeper(seconds, result, log=None):
+    async def call():
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append("cancelled")
+            raise
+        return result
+    return call
+
+
+def test_tool_calls_of_one_step_overlap():
+    async def step():
+        semaphore = asyncio.Semaphore(4)
+        return await asyncio.gather(
+            run_tool("product_search_tool", sleeper(0.2, "products"), 1.0, semaphore),
+            run_tool("policy_search_tool", sleeper(0.15, "policies"), 1.0, semaphore),
+        )
+
+    start = time.perf_counter()
+    assert asyncio.run(step()) == ["products", "policies"]
+    assert time.perf_counter() - start < 0.3
+
+
+def test_concurrency_bound_serialises_tool_calls():
+    async def step():
+        semaphore = asyncio.Semaphore(1)
+        return await asyncio.gather(*(run_tool("t", sleeper(0.1, i), 1.0, semaphore) for i in range(3)))
+
+    start = time.perf_counter()
+    assert asyncio.run(step()) == [0, 1, 2]
+    assert time.perf_counter() - start >= 0.3
+
+
+def test_timeout_becomes_the_observation_and_cancels_the_call():
+    log = []
+
+    async def step():
+        semaphore = asyncio.Semaphore(2)
+        return await asyncio.gather(
+            run_tool("product_search_tool", sleeper(0.01, "products"), 1.0, semaphore),
+            run_tool("policy_search_tool", sleeper(5, "policies", log), 0.05, semaphore),
+        )
+
+    products, policies = asyncio.run(step())
+    assert products == "products"
+    assert policies == "policy_search_tool did not respond within 0.05s."
+    assert log == ["cancelled"]
+
+
+def test_parse_tool_timeouts():
+    assert parse_tool_timeouts(None) == {}
+    assert parse_tool_timeouts("policy_search_tool=5, product_search_tool=12.5") == {
+        "policy_search_tool": 5.0, "product_search_tool": 12.5}
+    with pytest.raises(ValueError):
+        parse_tool_timeouts("policy_search_tool=0")
+
+
+def test_sync_callers_share_one_long_lived_loop():
+    import contextvars
+
+    from shoppinggpt.background_loop import run_sync
+
+    request_id = contextvars.ContextVar("request_id", default=None)
+
+    async def loop_and_request():
+        await asyncio.sleep(0)
+        return asyncio.get_running_loop(), request_id.get()
+
+    first, _ = run_sync(loop_and_request())
+    request_id.set("r-1")
+    second, seen = run_sync(loop_and_request())
+    assert first is second and not first.is_closed()
+    assert seen == "r-1"
+
+    async def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        run_sync(fail())
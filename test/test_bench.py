@@ -0,0 +1,61 @@
+import asyncio
+
+from shoppinggpt.bench.harness import Scenario, compare, percentile, run_scenario
+from shoppinggpt.llm.fake import FakeChatModel, FakeEmbeddings, _message_types, lognormal_latency
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 0.5) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile(values, 1.0) == 100.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_fakes_are_deterministic():
+    first, second = lognormal_latency(0.8, seed=3), lognormal_latency(0.8, seed=3)
+    assert [first() for _ in range(5)] == [second() for _ in range(5)]
+    embeddings = FakeEmbeddings(size=64)
+    vector = embeddings.embed_query("áo sơ mi trắng")
+    assert vector == FakeEmbeddings(size=64).embed_query("áo sơ mi trắng")
+    assert abs(sum(value * value for value in vector) - 1.0) < 1e-9
+    assert asyncio.run(embeddings.aembed_query("áo sơ mi trắng")) == vector
+
+
+def test_runs_sync_and_async_scenarios():
+    sync = run_scenario(Scenario("sync", lambda: (lambda i: sum(range(100))), iterations=50, warmup=2))
+    assert sync["iterations"] == 50 and sync["p50_ms"] <= sync["p99_ms"]
+    assert "peak_kib" in sync and sync["throughput_per_s"] > 0
+
+    _message_types.cache_clear()
+    model = FakeChatModel(latency=0.01)
+    # The message classes (and their langchain_core import) are resolved
+    # before any timed call.
+    assert _message_types.cache_info().currsize == 1
+
+    def setup():
+        async def op(i):
+            await model.ainvoke(i)
+        return op
+
+    concurrent = run_scenario(Scenario("async", setup, iterations=40, warmup=0, concurrency=8),
+                              allocation_samples=0)
+    assert concurrent["p50_ms"] >= 10
+    # Eight requests in flight: far faster than 40 sequential 10ms calls.
+    assert concurrent["throughput_per_s"] > 300
+
+
+def test_missing_dependencies_skip_the_scenario():
+    def setup():
+        import not_a_real_dependency  # noqa: F401
+
+    result = run_scenario(Scenario("needs-deps", setup))
+    assert result == {"scenario": "needs-deps", "skipped": "No module named 'not_a_real_dependency'"}
+
+
+def test_compare_flags_regressions_past_tolerance():
+    baseline = {"chat": {"p50_ms": 10.0, "p95_ms": 20.0, "p99_ms": 30.0, "throughput_per_s": 100.0}}
+    current = {"chat": {"p50_ms": 11.0, "p95_ms": 30.0, "p99_ms": 30.0, "throughput_per_s": 70.0},
+               "new": {"p50_ms": 1.0}}
+    flagged = {(row["metric"]) for row in compare(current, baseline, tolerance=0.2) if row["regression"]}
+    assert flagged == {"p95_ms", "throughput_per_s"}
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from shoppinggpt.llm.bulk_embeddings import BulkEmbedder, batches
+from shoppinggpt.llm.fake import FakeEmbeddings
+from shoppinggpt.synthetic.writer import iter_jsonl
+
+
+class RecordingEmbeddings(FakeEmbeddings):
+    """FakeEmbeddings that records batches, tracks concurrency and can fail on cue."""
+
+    def __init__(self, fail=()):
+        super().__init__(size=16)
+        self.fail = list(fail)
+        self.batches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def aembed_documents(self, texts):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if self.fail:
+                raise self.fail.pop(0)
+            self.batches.append(list(texts))
+            return [self._vector(text) for text in texts]
+        finally:
+            self.in_flight -= 1
+
+
+def corpus(n):
+    return [f"chính sách số {i}" for i in range(n)]
+
+
+def test_batches_respect_count_and_token_limits():
+    assert batches(["a"] * 5, batch_size=2) == [[0, 1], [2, 3], [4]]
+    # Each 40-character text is ~11 tokens.
+    assert batches(["x" * 40] * 4, batch_size=10, batch_tokens=25) == [[0, 1], [2, 3]]
+    assert batches([], batch_size=2) == []
+
+
+def test_bulk_embedding_is_concurrent_ordered_and_deduplicated():
+    embeddings = RecordingEmbeddings()
+    texts = corpus(10) + ["chính sách số 3"]
+    progress = []
+    vectors = BulkEmbedder(embeddings, batch_size=2, concurrency=3,
+                           progress=lambda done, total: progress.append((done, total))).embed(texts)
+    assert vectors == [embeddings._vector(text) for text in texts]
+    assert sum(len(batch) for batch in embeddings.batches) == 10
+    assert 1 < embeddings.max_in_flight <= 3
+    assert progress[-1] == (10, 10)
+
+
+def test_failed_batches_are_retried_with_backoff():
+    error = RuntimeError("429 Resource has been exhausted")
+    error.retry_after = 0.01
+    embeddings = RecordingEmbeddings(fail=[error, ConnectionError("reset")])
+    embedder = BulkEmbedder(embeddings, batch_size=5, backoff=0.001, progress=None)
+    assert embedder.embed(corpus(5)) == [embeddings._vector(text) for text in corpus(5)]
+    assert embedder.retries == 2
+
+    with pytest.raises(ConnectionError):
+        BulkEmbedder(RecordingEmbeddings(fail=[ConnectionError("down")] * 3),
+                     max_retries=2, backoff=0.001, progress=None).embed(corpus(2))
+
+
+def test_checkpoint_resumes_after_a_crash(tmp_path):
+    checkpoint = str(tmp_path / "embeddings.jsonl")
+    texts = corpus(6)
+    crashing = RecordingEmbeddings()
+    original = crashing.aembed_documents
+
+    async def fail_second_batch(batch):
+        if crashing.batches:
+            raise ValueError("boom")
+        return await original(batch)
+
+    crashing.aembed_documents = fail_second_batch
+    with pytest.raises(ValueError):
+        BulkEmbedder(crashing, batch_size=3, concurrency=1, max_retries=0, checkpoint=checkpoint,
+                     progress=None).embed(texts)
+    assert len(list(iter_jsonl(checkpoint))) == 3
+
+    resumed = RecordingEmbeddings()
+    vectors = BulkEmbedder(resumed, batch_size=3, checkpoint=checkpoint, progress=None).embed(texts)
+    assert resumed.batches == [texts[3:]]
+    assert vectors == [resumed._vector(text) for text in texts]
+
+    # A smaller corpus reuses its vectors and compacts the checkpoint.
+    again = RecordingEmbeddings()
+    BulkEmbedder(again, checkpoint=checkpoint, progress=None).embed(texts[:2])
+    assert again.batches == [] and len(list(iter_jsonl(checkpoint))) == 2
+
+
+def test_query_mode_and_calls_from_a_running_loop():
+    embeddings = FakeEmbeddings(size=16)
+
+    async def inside_loop():
+        return BulkEmbedder(embeddings, query=True, progress=None).embed(["xin chào", "áo sơ mi"])
+
+    assert asyncio.run(inside_loop()) == [embeddings.embed_query("xin chào"), embeddings.embed_query("áo sơ mi")]
+
+
+def test_query_mode_bounds_calls_in_flight_and_retries_one_text():
+    class QueryEmbeddings(RecordingEmbeddings):
+        async def aembed_query(self, text):
+            return (await self.aembed_documents([text]))[0]
+
+    embeddings = QueryEmbeddings(fail=[ConnectionError("reset")])
+    texts = corpus(12)
+    vectors = BulkEmbedder(embeddings, query=True, batch_size=100, concurrency=3, backoff=0.001,
+                           progress=None).embed(texts)
+    assert vectors == [embeddings._vector(text) for text in texts]
+    assert 1 < embeddings.max_in_flight <= 3
+    # The failed call is resent on its own, not with eleven other texts.
+    assert sorted(len(batch) for batch in embeddings.batches) == [1] * 12
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from shoppinggpt.catalog.snapshot import CatalogSnapshot, compile_catalog
+
+np = pytest.importorskip("numpy")
+
+from shoppinggpt.catalog.bundles import FACTORS, BundleEngine, BundleWeights, explain  # noqa: E402
+from shoppinggpt.catalog.index import CatalogIndex  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES = {
+    "devices": os.path.join(REPO_ROOT, "backend", "data", "devices.csv"),
+    "plans": os.path.join(REPO_ROOT, "backend", "data", "plans.csv"),
+}
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("catalog") / "catalog.snapshot")
+    compile_catalog(SOURCES, path)
+    return BundleEngine(CatalogIndex(CatalogSnapshot(path)))
+
+
+def test_rank_matches_a_full_sort_of_the_score_grid(engine):
+    constraints = engine.index.parse("5G phone under 600 euros with Netflix")
+    bundles = engine.rank(constraints, top=5)
+    total = engine.scores(constraints)["total"]
+    assert [b["score"] for b in bundles] == sorted(np.round(total.ravel(), 4), reverse=True)[:5]
+
+    best = bundles[0]
+    assert best["scores"]["budget"] == 1.0 and best["scores"]["features"] == 1.0
+    assert best["matched_features"] == ["5G", "StreamOn Music & Video"]
+    assert best["score"] == round(sum(BundleWeights()[i] * best["scores"][f] for i, f in enumerate(FACTORS)), 4)
+    assert "fits your budget" in explain(best)
+
+
+def test_hard_filters_and_weights(engine):
+    samsung = engine.rank(engine.index.parse("Samsung phone and a prepaid plan"), top=50)
+    assert samsung and {b["device"].split()[0] for b in samsung} == {"Galaxy"}
+    assert {b["plan"].split()[0] for b in samsung} == {"Prepaid"}
+    assert len(samsung) == 3 * 3
+
+    cheapest = engine.rank(engine.index.parse(""), top=1, weights=BundleWeights(0, 0, 0, 1))[0]
+    assert cheapest["scores"]["value"] == 1.0
+    assert cheapest["total_cost"] == engine.cost.min()
+
+
+def test_weights_parse():
+    assert BundleWeights.parse("budget=1, value=0", BundleWeights()) == BundleWeights(1.0, 0.30, 0.15, 0.0)
+    with pytest.raises(ValueError):
+        BundleWeights.parse("price=1")
+    with pytest.raises(ValueError):
+        BundleWeights.parse("budget=0,features=0,data=0,value=0")
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from shoppinggpt.catalog.snapshot import CatalogSnapshot, compile_catalog
+
+np = pytest.importorskip("numpy")
+
+from shoppinggpt.catalog.index import CatalogIndex, Constraints  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES = {
+    "devices": os.path.join(REPO_ROOT, "backend", "data", "devices.csv"),
+    "plans": os.path.join(REPO_ROOT, "backend", "data", "plans.csv"),
+}
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("catalog") / "catalog.snapshot")
+    compile_catalog(SOURCES, path)
+    return CatalogIndex(CatalogSnapshot(path))
+
+
+def brute_force(records, constraints):
+    return [
+        r for r in records
+        if (constraints.max_price is None or r["price"] <= constraints.max_price)
+        and all(any(f in r["features"] for f in group) for group in constraints.features)
+        and (not constraints.brands or r["brand"].lower() in constraints.brands)
+    ]
+
+
+def test_parse_and_search_budget_feature_query(index):
+    constraints = index.parse("Looking for a 5G phone under 600 euros with Netflix")
+    assert constraints["devices"] == Constraints(max_price=600.0, features=(("5G",),))
+    assert constraints["plans"].features == (("5G",), ("StreamOn Music & Video", "StreamOn All"))
+
+    result = index.search("Looking for a 5G phone under 600 euros with Netflix")
+    devices = index.devices.table.records()
+    expected = sorted(brute_force(devices, constraints["devices"]), key=lambda r: r["price"])
+    assert [d["id"] for d in result["devices"]] == [d["id"] for d in expected]
+    assert {p["name"] for p in result["plans"]} == {"MagentaMobil L", "MagentaMobil XL"}
+
+
+def test_brand_storage_plan_price_and_data(index):
+    constraints = index.parse("Samsung with 256GB and a plan under 30 per month")
+    assert constraints["devices"].brands == ("samsung",) and constraints["devices"].min_storage_gb == 256
+    assert constraints["plans"].max_price == 30 and constraints["devices"].max_price is None
+    assert {d["name"] for d in index.devices.search(constraints["devices"])} == {"Galaxy S24", "Galaxy S24 Ultra"}
+
+    unlimited = index.search("unlimited data plan")
+    assert [p["name"] for p in unlimited["plans"]] == ["MagentaMobil XL"]
+    assert unlimited["constraints"]["plans"]["min_data_gb"] == "unlimited"
+    prepaid = index.parse("prepaid plan with at least 3GB data")["plans"]
+    assert prepaid.types == ("prepaid",) and prepaid.min_data_gb == 3 and prepaid.min_price is None
+
+
+def test_sizes_are_never_read_as_part_of_a_price(index):
+    plans = index.parse("plan with up to 50GB data")["plans"]
+    assert plans.max_price is None and plans.min_data_gb == 50
+    devices = index.parse("phone with at least 128GB storage")["devices"]
+    assert devices.min_price is None and devices.min_storage_gb == 128
+    assert index.parse("plan with at least 100GB data")["plans"].min_price is None
+    assert index.parse("phone under 599.99, with 5G.")["devices"].max_price == 599.99
+    assert index.parse("I want a phone under 600.")["devices"].max_price == 600
+    assert index.search("plan with up to 50GB data")["plans"]
+
+
+def test_unconstrained_query_returns_everything_cheapest_first(index):
+    result = index.search("hello there", limit=3)
+    assert not any(Constraints(**c) for c in result["constraints"].values())
+    prices = [d["price"] for d in index.devices.search(Constraints())]
+    assert prices == sorted(prices) and len(result["devices"]) == 3
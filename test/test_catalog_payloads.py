@@ -0,0 +1,54 @@
+import gzip
+import os
+
+import orjson
+
+from shoppinggpt.catalog.payloads import CatalogPayloads, negotiate, prepare
+from shoppinggpt.catalog.snapshot import CatalogStore, read_catalog_csv
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEVICES_CSV = os.path.join(REPO_ROOT, "backend", "data", "devices.csv")
+
+
+def test_read_catalog_csv_types_columns_and_splits_features(tmp_path):
+    path = tmp_path / "plans.csv"
+    path.write_text('id,name,price,features\n1,S,39.95,"5G;EU Roaming"\n2,M,49,\n', encoding="utf-8")
+    assert read_catalog_csv(str(path)) == [
+        {"id": 1, "name": "S", "price": 39.95, "features": ["5G", "EU Roaming"]},
+        {"id": 2, "name": "M", "price": 49.0, "features": []},
+    ]
+    devices = read_catalog_csv(DEVICES_CSV)
+    assert isinstance(devices[0]["id"], int) and isinstance(devices[0]["features"], list)
+
+
+def test_negotiate_compresses_and_answers_revalidation_with_304():
+    prepared = prepare([{"id": 1, "name": "iPhone"}] * 50)
+    status, body, headers = negotiate(prepared, accept_encoding="gzip, deflate")
+    assert status == 200 and headers["Content-Encoding"] == "gzip"
+    assert orjson.loads(gzip.decompress(body)) == orjson.loads(prepared.bodies["identity"])
+
+    status, body, plain = negotiate(prepared, accept_encoding="gzip;q=0")
+    assert status == 200 and "Content-Encoding" not in plain and plain["ETag"] != headers["ETag"]
+
+    for tag in (headers["ETag"], plain["ETag"], "W/" + plain["ETag"], '"other", ' + headers["ETag"], "*"):
+        status, body, _ = negotiate(prepared, if_none_match=tag, accept_encoding="gzip")
+        assert (status, body) == (304, b"")
+    assert negotiate(prepared, if_none_match='"stale"')[0] == 200
+
+
+def test_payloads_rebuild_only_when_the_catalog_version_changes(tmp_path):
+    path = tmp_path / "devices.csv"
+    path.write_text("id,price\n1,10\n", encoding="utf-8")
+    store = CatalogStore({"devices": str(path), "missing": str(tmp_path / "nope.csv")},
+                         str(tmp_path / "catalog.snapshot"))
+    payloads = CatalogPayloads(store, ("devices", "missing"))
+    first = payloads.get("devices")
+    assert payloads.get("missing").bodies["identity"] == b"[]"
+    assert payloads.get("devices") is first and payloads.builds == 1
+
+    path.write_text("id,price\n1,12\n", encoding="utf-8")
+    assert payloads.get("devices") is first  # until the store notices
+    store.refresh()
+    second = payloads.get("devices")
+    assert second.etag != first.etag and orjson.loads(second.bodies["identity"]) == [{"id": 1, "price": 12}]
+    assert payloads.builds == 2
@@ -0,0 +1,67 @@
+import os
+
+from shoppinggpt.catalog.snapshot import CatalogSnapshot, CatalogStore, compile_catalog, read_catalog_csv
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES = {
+    "devices": os.path.join(REPO_ROOT, "backend", "data", "devices.csv"),
+    "plans": os.path.join(REPO_ROOT, "backend", "data", "plans.csv"),
+}
+
+
+def test_snapshot_round_trips_the_csvs(tmp_path):
+    path = str(tmp_path / "catalog.snapshot")
+    version = compile_catalog(SOURCES, path)
+    snapshot = CatalogSnapshot(path)
+    assert snapshot.version == version == CatalogSnapshot.read_version(path)
+    for name, source in SOURCES.items():
+        assert snapshot.table(name).records() == read_catalog_csv(source)
+
+    devices = snapshot.table("devices")
+    assert devices.values("price").format == "q" and devices.values("price")[0] == devices.column("price")[0]
+    vocabulary = devices.vocabulary()
+    for row, record in enumerate(devices.records()):
+        mask = devices.mask(row)
+        assert {vocabulary[i] for i in range(len(vocabulary)) if mask >> i & 1} == set(record["features"])
+
+
+def test_missing_cells_and_empty_tables(tmp_path):
+    source = tmp_path / "plans.csv"
+    source.write_text('id,name,price,features\n1,S,,"5G"\n2,,9.5,\n', encoding="utf-8")
+    path = str(tmp_path / "catalog.snapshot")
+    compile_catalog({"plans": str(source), "devices": str(tmp_path / "missing.csv")}, path)
+    snapshot = CatalogSnapshot(path)
+    assert snapshot.table("plans").records() == [
+        {"id": 1, "name": "S", "price": None, "features": ["5G"]},
+        {"id": 2, "name": None, "price": 9.5, "features": []},
+    ]
+    assert len(snapshot.table("devices")) == 0 and snapshot.table("devices").records() == []
+
+
+def test_store_swaps_snapshots_and_invalidates_cached_values(tmp_path):
+    source = tmp_path / "devices.csv"
+    source.write_text("id,price\n1,10\n", encoding="utf-8")
+    store = CatalogStore({"devices": str(source)}, str(tmp_path / "catalog.snapshot"))
+    seen = []
+    store.subscribe(seen.append)
+    calls = []
+
+    @store.cached
+    def total(snapshot):
+        calls.append(snapshot.version)
+        return sum(snapshot.table("devices").column("price"))
+
+    assert total() == 10 and total() == 10 and len(calls) == 1
+    held = store.table("devices")
+    os.utime(source, ns=(1, 1))
+    assert store.refresh() is False  # touched but unchanged
+
+    source.write_text("id,price\n1,10\n2,5\n", encoding="utf-8")
+    assert store.refresh() is True
+    assert total() == 15 and len(calls) == 2 and seen == calls
+    assert held.column("price") == [10]  # readers keep the snapshot they hold
+
+    # Another worker finds the snapshot already compiled and just maps it.
+    other = CatalogStore({"devices": str(source)}, store.snapshot_path)
+    mtime = os.stat(store.snapshot_path).st_mtime_ns
+    assert other.version == store.version and os.stat(store.snapshot_path).st_mtime_ns == mtime
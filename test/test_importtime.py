@@ -0,0 +1,108 @@
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, Set
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Packages that must only be imported when a request actually needs them.
+HEAVY_MODULES = (
+    "numpy",
+    "faiss",
+    "torch",
+    "transformers",
+    "semantic_router",
+    "langchain_google_genai",
+    "langchain_groq",
+    "langchain_core",
+    "langchain_community.vectorstores",
+    "langchain.agents",
+)
+
+LIGHT_MODULES = (
+    "shoppinggpt.agent",
+    "shoppinggpt.chain",
+    "shoppinggpt.config",
+    "shoppinggpt.router.lib_semantic_router",
+    "shoppinggpt.router.consine_algo_semantic",
+    "shoppinggpt.tool.product_search",
+    "shoppinggpt.tool.policy_search",
+    "shoppinggpt.service",
+    "shoppinggpt.tracing",
+)
+
+# Cumulative import budget for a single shoppinggpt module, in microseconds.
+IMPORT_BUDGET_US = int(os.getenv("SHOPPINGGPT_IMPORT_BUDGET_US", "500000"))
+
+# Import names that differ from their requirements.txt distribution.
+DISTRIBUTIONS = {"dotenv": "python-dotenv", "faiss": "faiss-cpu", "yaml": "PyYAML"}
+
+
+def declared_requirements() -> Set[str]:
+    with open(os.path.join(REPO_ROOT, "requirements.txt")) as f:
+        names = (re.split(r"[=<>~!\[;\s]", line.strip(), 1)[0] for line in f)
+        return {name.lower().replace("_", "-") for name in names if name and not name.startswith("#")}
+
+
+def is_declared(module: str) -> bool:
+    top = module.split(".")[0]
+    return DISTRIBUTIONS.get(top, top).lower().replace("_", "-") in declared_requirements()
+
+
+def import_profile(module: str) -> Dict[str, int]:
+    """Import `module` in a fresh interpreter and return cumulative us per module."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        missing = re.findall(r"ModuleNotFoundError: No module named '([^']+)'", proc.stderr)
+        if missing and not is_declared(missing[-1]):
+            pytest.skip(f"{module}: optional dependency {missing[-1]} is not installed")
+        # A declared dependency that is missing would hide an over-budget
+        # import behind a skip, so the environment is reported as broken.
+        pytest.fail(f"{module} failed to import:\n{proc.stderr}", pytrace=False)
+
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            profile[name.strip()] = int(cumulative)
+    return profile
+
+
+@pytest.mark.parametrize("module", LIGHT_MODULES)
+def test_no_heavy_imports(module):
+    profile = import_profile(module)
+    loaded = [name for name in HEAVY_MODULES if name in profile]
+    assert not loaded, f"{module} eagerly imports {loaded}"
+
+
+@pytest.mark.parametrize("module", LIGHT_MODULES)
+def test_import_budget(module):
+    profile = import_profile(module)
+    assert profile[module] <= IMPORT_BUDGET_US, (
+        f"{module} took {profile[module]}us to import (budget {IMPORT_BUDGET_US}us)"
+    )
+
+
+def main():
+    for module in LIGHT_MODULES + ("app", "main"):
+        try:
+            profile = import_profile(module)
+        except (pytest.skip.Exception, pytest.fail.Exception) as e:
+            print(f"{module:45s} not measured ({e})")
+            continue
+        top = sorted(profile.items(), key=lambda kv: kv[1], reverse=True)[1:4]
+        print(f"{module:45s} {profile[module] / 1000:8.1f} ms  slowest: {top}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+from shoppinggpt.llm.fake import FakeChatModel
+from shoppinggpt.llm.json_stream import (
+    StreamingJSONParser,
+    astream_recommendation,
+    extract_recommendation,
+    invoke_recommendation,
+    iter_partial_recommendations,
+    strip_trailing_commas,
+)
+
+RECOMMENDATION = {
+    "devices": [{"id": 1, "name": "iPhone 15 Pro", "reasoning": "Best camera {pro}"}],
+    "plans": [{"id": "101", "name": "MagentaMobil S", "reasoning": "Cheap"}],
+    "response": "Here you go",
+    "needs_clarification": False,
+}
+
+
+def test_extract_from_fenced_block_with_surrounding_braces():
+    text = (
+        "Sure {see below}:\n```json\n" + json.dumps(RECOMMENDATION, indent=2)
+        + "\n```\nLet me know {anything} else."
+    )
+    result = extract_recommendation(text)
+    assert result["devices"][0] == {"id": "1", "name": "iPhone 15 Pro", "reasoning": "Best camera {pro}"}
+    assert result["needs_clarification"] is False
+
+
+def test_extract_repairs_trailing_commas_and_truncation():
+    assert extract_recommendation('{"response": "hi", "devices": [],}')["response"] == "hi"
+    truncated = json.dumps(RECOMMENDATION)[:-40]
+    result = extract_recommendation("Answer: " + truncated)
+    assert result["devices"][0]["id"] == "1"
+
+
+def test_no_json_returns_none():
+    assert extract_recommendation("I need more details about your budget.") is None
+    assert extract_recommendation('{"unrelated": true}') is None
+
+
+def test_partial_values_while_streaming():
+    text = json.dumps(RECOMMENDATION)
+    parser = StreamingJSONParser()
+    parser.feed(text[:30])
+    assert parser.partial() == {"devices": [{"id": 1}]}
+    partials = list(iter_partial_recommendations(text[i:i + 7] for i in range(0, len(text), 7)))
+    assert partials[-1]["response"] == "Here you go"
+    assert len(partials) > 1
+
+
+def test_mismatched_brackets_are_not_an_object():
+    parser = StreamingJSONParser()
+    assert parser.feed('{"a": [1} then {"response": "ok"}') == [{"response": "ok"}]
+    assert extract_recommendation('{"response": "x", "devices": [}') is None
+
+
+def test_stream_yields_partials_then_the_final_answer():
+    model = FakeChatModel(respond=lambda messages: "Sure:\n" + json.dumps(RECOMMENDATION))
+
+    async def collect():
+        return [event async for event in astream_recommendation(model, [])]
+
+    events = asyncio.run(collect())
+    kinds = [kind for kind, _ in events]
+    assert kinds[-1] == "final" and kinds.count("partial") > 1
+    raw, result = events[-1][1]
+    assert raw.startswith("Sure:") and result["plans"][0]["id"] == "101"
+
+
+def test_strip_trailing_commas_keeps_strings():
+    assert strip_trailing_commas('{"a": "x,}", "b": [1, 2, ],}') == '{"a": "x,}", "b": [1, 2 ]}'
+
+
+class _Message:
+    def __init__(self, content):
+        self.content = content
+
+
+class _TextModel:
+    def invoke(self, messages, config=None):
+        return _Message("```json\n" + json.dumps(RECOMMENDATION) + "\n```")
+
+    def with_structured_output(self, schema):
+        raise NotImplementedError
+
+
+class _StructuredModel(_TextModel):
+    def with_structured_output(self, schema):
+        class _Structured:
+            def invoke(self, messages, config=None):
+                return dict(RECOMMENDATION)
+
+        return _Structured()
+
+
+def test_invoke_prefers_structured_output():
+    raw, result = invoke_recommendation(_StructuredModel(), [])
+    assert json.loads(raw)["plans"][0]["id"] == "101"
+    raw, fallback = invoke_recommendation(_TextModel(), [])
+    assert raw.startswith("```json")
+    assert fallback == result
@@ -0,0 +1,67 @@
+import asyncio
+import itertools
+import time
+
+from shoppinggpt.loadtest import TARGETS, recommend, replay, run_load
+from shoppinggpt.loop_lag import LoopLagMonitor
+
+
+def test_replay_interleaves_sessions_and_cycles():
+    pairs = list(itertools.islice(replay([["a1", "a2"], ["b1"]]), 5))
+    assert pairs == [("load-0-0", "a1"), ("load-0-1", "b1"), ("load-0-0", "a2"),
+                     ("load-1-0", "a1"), ("load-1-1", "b1")]
+
+
+def test_run_load_is_open_loop_and_counts_errors():
+    async def send(session, text):
+        await asyncio.sleep(0.05)
+        return 500 if text == "bad" else 200
+
+    requests = itertools.cycle([("s", "ok"), ("s", "ok"), ("s", "bad")])
+    result = asyncio.run(run_load(send, requests, rps=100, duration=0.5, arrival="constant"))
+    summary = result.summary()
+    assert 45 <= summary["sent"] <= 50
+    assert summary["completed"] == summary["sent"]
+    assert summary["errors"]["http_500"] == summary["statuses"]["500"]
+    # 50ms responses at 100 rps overlap; a closed loop would manage only 20 rps.
+    assert result.wall < 1.0
+    assert summary["latency_ms"]["p50"] >= 50
+
+
+def test_loop_lag_monitor_sees_blocking_calls():
+    async def scenario():
+        monitor = LoopLagMonitor(interval=0.01).start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)
+        await asyncio.sleep(0.05)
+        monitor.stop()
+        return monitor.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["max_ms"] >= 150
+    assert stats["blocked_fraction"] > 0.4
+
+
+def _summary(**overrides):
+    summary = {
+        "target_rps": 20, "achieved_rps": 20, "goodput_rps": 20, "latency_mean_ms": 900.0,
+        "latency_ms": {"p50": 800.0, "p95": 2000.0, "p99": 3000.0},
+        "client_loop_lag": {"p99_ms": 1.0}, "server_loop_lag": None,
+        "dropped": 0, "error_rate": 0.0, "errors": {},
+    }
+    summary.update(overrides)
+    return summary
+
+
+def test_recommendations():
+    flask = recommend(_summary(), TARGETS["flask"], cpu_count=8)
+    assert flask["workers"] * flask["threads"] >= 50  # 20 rps * 2s p95 * 1.25
+
+    idle = recommend(_summary(server_loop_lag={"blocked_fraction": 0.05, "p99_ms": 5.0}), TARGETS["backend"], cpu_count=8)
+    busy = recommend(_summary(goodput_rps=10, server_loop_lag={"blocked_fraction": 0.9, "p99_ms": 400.0}),
+                     TARGETS["backend"], cpu_count=8)
+    assert idle["workers"] == 1 and busy["workers"] == 4
+    assert any("block the event loop" in note for note in busy["notes"])
+
+    behind = recommend(_summary(achieved_rps=10), TARGETS["backend"], cpu_count=8)
+    assert any("fell behind" in note for note in behind["notes"])
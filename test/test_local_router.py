@@ -0,0 +1,42 @@
+import json
+
+from shoppinggpt.router.hashed_ngram_router import (
+    CHITCHAT_ROUTE_NAME,
+    PRODUCT_ROUTE_NAME,
+    HashedNgramClassifier,
+    SemanticRouter,
+)
+from shoppinggpt.router.train import build_dataset, train
+
+
+def test_save_and_load_round_trip(tmp_path):
+    model = HashedNgramClassifier(bits=12).fit(
+        ["how much is this dress", "tell me a joke"], [PRODUCT_ROUTE_NAME, CHITCHAT_ROUTE_NAME]
+    )
+    path = str(tmp_path / "router.bin")
+    model.save(path)
+    loaded = HashedNgramClassifier.load(path)
+    assert loaded.labels == model.labels and loaded.bits == 12
+    for text in ["how much is this dress", "tell me a joke", "something else"]:
+        assert abs(loaded.decision(text) - model.decision(text)) < 1e-4
+
+
+def test_dataset_uses_human_turns_of_synthetic_conversations(tmp_path):
+    path = tmp_path / "synthetic.jsonl"
+    records = [
+        {"conversation": "Human: Áo khoác này giá bao nhiêu?\nAI: 500 nghìn ạ.", "category": "product"},
+        {"conversation": "Human: Hôm nay trời đẹp quá.\nAI: Đúng vậy!", "category": "chitchat"},
+    ]
+    path.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in records) + "\n", encoding="utf-8")
+    examples = build_dataset([str(path)])
+    assert ("Áo khoác này giá bao nhiêu?", PRODUCT_ROUTE_NAME) in examples
+    assert ("Hôm nay trời đẹp quá.", CHITCHAT_ROUTE_NAME) in examples
+    assert not any(text.startswith("500") for text, _ in examples)
+
+
+def test_trained_router_guides_queries(tmp_path):
+    path = str(tmp_path / "router.bin")
+    train([], path, holdout=0)
+    router = SemanticRouter(path)
+    assert router.guide("do you have this jacket in a larger size") == PRODUCT_ROUTE_NAME
+    assert router.guide("what's your favorite movie") == CHITCHAT_ROUTE_NAME
@@ -0,0 +1,109 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from shoppinggpt.llm.fake import FakeEmbeddings
+from shoppinggpt.tool.policy_index import (
+    DOCSTORE_FILE,
+    INDEX_FILE,
+    PICKLE_FILE,
+    BlobDocstore,
+    _RowIds,
+    factory_string,
+    pickle_store_exists,
+    store_exists,
+)
+
+CHUNKS = [
+    ("Đổi trả miễn phí trong 30 ngày.", {"source": "policy.txt"}),
+    ("Giao hàng toàn quốc từ 2 đến 5 ngày.", {"source": "policy.txt"}),
+    ("Bảo hành 6 tháng cho mọi sản phẩm.", {}),
+]
+
+
+def test_factory_string_scales_with_the_corpus():
+    assert factory_string("flat", 100_000, 768) == "Flat"
+    assert factory_string("ivf", 50, 768) == "Flat"  # too few vectors to train centroids
+    assert factory_string("ivf", 10_000, 768) == "IVF256,Flat"
+    assert factory_string("ivfpq", 10_000, 768) == "IVF256,PQ96"
+    assert factory_string("ivfpq", 1_000, 768) == "IVF25,Flat"
+    assert factory_string("IVF64,PQ16", 10, 768) == "IVF64,PQ16"
+
+
+def test_blob_docstore_reads_single_entries(tmp_path):
+    path = str(tmp_path / "docstore.bin")
+    assert BlobDocstore.write(path, CHUNKS) == 3
+    store = BlobDocstore(path)
+    assert len(store) == 3
+    assert [store.get(row) for row in (2, 0, 1)] == [(CHUNKS[2][0], {}), CHUNKS[0], CHUNKS[1]]
+    assert store.get(3) is None and store.get(-1) is None
+    with pytest.raises(NotImplementedError):
+        store.delete([0])
+    store.close()
+
+    BlobDocstore.write(path, [])
+    assert len(BlobDocstore(path)) == 0
+
+
+def test_blob_docstore_rejects_other_files(tmp_path):
+    path = tmp_path / "index.pkl"
+    path.write_bytes(b"\x80\x04\x95" + b"\0" * 32)
+    with pytest.raises(ValueError):
+        BlobDocstore(str(path))
+    path.write_bytes(b"SGDS\x01\x00\x00\x00" + (1000).to_bytes(8, "little"))
+    with pytest.raises(ValueError, match="truncated"):
+        BlobDocstore(str(path))
+
+
+def test_row_ids_map_rows_to_themselves():
+    ids = _RowIds(3)
+    assert ids[2] == 2 and len(ids) == 3
+    with pytest.raises(KeyError):
+        ids[3]
+
+
+def test_a_pickled_store_is_only_converted(tmp_path):
+    from shoppinggpt.tool.policy_search import VectorStoreManager
+
+    (tmp_path / INDEX_FILE).write_bytes(b"")
+    (tmp_path / PICKLE_FILE).write_bytes(b"\x80\x04\x95")
+    assert pickle_store_exists(str(tmp_path)) and not store_exists(str(tmp_path))
+    with pytest.raises(ValueError, match="--convert-pickle"):
+        VectorStoreManager("policy.txt", str(tmp_path), FakeEmbeddings(size=64))
+
+
+def test_build_and_mmap_store(tmp_path):
+    pytest.importorskip("faiss")
+    from shoppinggpt.tool.policy_index import build_store, read_index
+
+    embeddings = FakeEmbeddings(size=64)
+    documents = [SimpleNamespace(page_content=text, metadata=metadata) for text, metadata in CHUNKS]
+    manifest = build_store(str(tmp_path), documents, embeddings)
+    assert manifest == {"dimension": 64, "count": 3, "factory": "Flat"}
+    assert store_exists(str(tmp_path))
+
+    import numpy as np
+
+    index = read_index(str(tmp_path / INDEX_FILE))
+    query = np.asarray([embeddings.embed_query("đổi trả trong 30 ngày")], dtype=np.float32)
+    _, rows = index.search(query, 1)
+    assert BlobDocstore(str(tmp_path / DOCSTORE_FILE)).get(int(rows[0][0])) == CHUNKS[0]
+
+
+def test_the_shipped_store_is_converted():
+    directory = os.path.join(os.path.dirname(__file__), os.pardir, "data", "datastore")
+    assert store_exists(directory) and not pickle_store_exists(directory)
+    assert len(BlobDocstore(os.path.join(directory, DOCSTORE_FILE))) == 369
+
+
+def test_flat_index_without_mmap_support_warns(tmp_path, monkeypatch, caplog):
+    faiss = pytest.importorskip("faiss")
+    from shoppinggpt.tool.policy_index import read_index
+
+    path = str(tmp_path / INDEX_FILE)
+    faiss.write_index(faiss.IndexFlatL2(8), path)
+    assert read_index(path).ntotal == 0 and not caplog.records
+    monkeypatch.delattr(faiss, "IO_FLAG_MMAP_IFC", raising=False)
+    read_index(path)
+    assert "cannot memory-map" in caplog.text
@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from shoppinggpt.tool.policy_rerank import (
+    ResultCache,
+    count_tokens,
+    mmr,
+    normalize_query,
+    select_chunks,
+    strip_overlap,
+)
+
+RETURNS = ("Chính sách đổi trả: khách hàng được đổi trả sản phẩm trong vòng 30 ngày kể từ ngày nhận hàng, "
+           "sản phẩm còn nguyên tem mác và hóa đơn mua hàng.")
+SHIPPING = "Chính sách giao hàng: miễn phí giao hàng cho đơn từ 500.000đ, thời gian giao từ 2 đến 5 ngày."
+WARRANTY = "Bảo hành: sản phẩm lỗi do nhà sản xuất được bảo hành 6 tháng tại mọi cửa hàng."
+
+
+def test_overlapping_chunk_loses_the_shared_text():
+    overlap = RETURNS[-60:]
+    follow_up = overlap + " Phí vận chuyển khi đổi trả do khách hàng chi trả."
+    assert strip_overlap(follow_up, [RETURNS]) == "Phí vận chuyển khi đổi trả do khách hàng chi trả."
+    assert strip_overlap(SHIPPING, [RETURNS]) == SHIPPING
+
+
+def test_duplicates_are_dropped_and_relevant_chunks_lead():
+    texts = [SHIPPING, RETURNS, RETURNS + " ", WARRANTY]
+    selected = select_chunks("đổi trả trong bao nhiêu ngày", texts, [0.4, 0.3, 0.3, 0.9], k=3)
+    assert selected["chunks"][0] == RETURNS
+    assert selected["chunks"].count(RETURNS) == 1 and len(selected["chunks"]) == 3
+    assert selected["tokens"] == sum(count_tokens(chunk) for chunk in selected["chunks"])
+
+
+def test_mmr_prefers_novel_chunks_over_near_copies():
+    import numpy as np
+
+    similarity = np.array([[1.0, 0.8, 0.0], [0.8, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    assert mmr([1.0, 0.95, 0.6], similarity, 2, mmr_lambda=0.5) == [0, 2]
+    assert mmr([1.0, 0.95, 0.6], similarity, 2, mmr_lambda=1.0) == [0, 1]
+
+
+def test_token_budget_trims_and_never_returns_nothing():
+    texts = [RETURNS, SHIPPING, WARRANTY]
+    selected = select_chunks("chính sách", texts, [0.1, 0.2, 0.3], k=3, token_budget=count_tokens(RETURNS) + 5)
+    assert len(selected["chunks"]) == 1 and selected["trimmed"]
+    cut = select_chunks("chính sách", texts, [0.1, 0.2, 0.3], k=3, token_budget=10)
+    assert len(cut["chunks"]) == 1 and cut["tokens"] <= 10
+    assert select_chunks("x", [], [], k=3)["chunks"] == []
+
+
+def test_cache_is_keyed_by_normalized_query():
+    assert normalize_query("  Đổi   TRẢ\tthế nào ") == "đổi trả thế nào"
+    cache = ResultCache(maxsize=2)
+    cache.put(("a", 5), ("one",))
+    cache.put(("b", 5), ("two",))
+    assert cache.get(("a", 5)) == ("one",)
+    cache.put(("c", 5), ("three",))
+    assert cache.get(("b", 5)) is None
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 1, "misses": 1}
@@ -0,0 +1,13 @@
+import os
+
+from shoppinggpt.tool.product_lookup import product_fast_lookup
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRODUCTS_DB = os.path.join(REPO_ROOT, "data", "products.db")
+
+
+def test_fast_lookup_ranks_products_by_shared_rare_words():
+    names = [p["product_name"] for p in product_fast_lookup("áo sơ mi trắng còn size L không", db_path=PRODUCTS_DB)]
+    assert names[0] == "Áo sơ mi trắng" and len(names) == 5
+    assert product_fast_lookup("quần jean nam", limit=1, db_path=PRODUCTS_DB)[0]["product_name"] == "Quần jean xanh"
+    assert product_fast_lookup("hello there", db_path=PRODUCTS_DB) == []
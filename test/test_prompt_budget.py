@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+from shoppinggpt.llm.prompt_budget import (
+    BUDGET_STATS,
+    CATALOG,
+    HISTORY,
+    TOOL_OUTPUT,
+    Part,
+    budget_for,
+    count_tokens,
+    fit_prompt,
+    fit_rows,
+    model_of,
+    trim_history,
+    trim_text,
+)
+
+CATALOG_TEXT = "Available Devices:\n" + "".join(f"- Phone {i} (id:{i}): €{100 + i} - 5G, NFC\n" for i in range(40))
+HISTORY_TEXT = "".join(f"Human: question {i}\nAI: answer {i}\n" for i in range(40))
+
+
+def test_token_counts_are_cached():
+    count_tokens.cache_clear()
+    assert count_tokens("") == 0
+    assert count_tokens(CATALOG_TEXT) == count_tokens(CATALOG_TEXT) > 0
+    assert count_tokens.cache_info().hits >= 1
+
+
+def test_trim_text_keeps_whole_lines_from_the_chosen_end():
+    head = trim_text(CATALOG_TEXT, 60)
+    assert CATALOG_TEXT.startswith(head) and head.endswith("\n") and count_tokens(head) <= 60
+    tail = trim_text(HISTORY_TEXT, 40, keep="tail")
+    assert HISTORY_TEXT.endswith(tail) and "answer 39" in tail and "question 0\n" not in tail
+    assert count_tokens(trim_text("x" * 1000, 10)) <= 10
+    assert trim_text("short", 100) == "short"
+
+
+def test_history_is_trimmed_before_catalog_before_tool_output():
+    BUDGET_STATS.reset()
+    parts = [
+        Part("instructions", "You are a shopping assistant."),
+        Part("bundles", "1. Phone 1 + Plan 2\n", TOOL_OUTPUT),
+        Part("devices", CATALOG_TEXT, CATALOG),
+        Part("history", HISTORY_TEXT, HISTORY, keep="tail"),
+    ]
+    whole = sum(count_tokens(part.text) for part in parts)
+    fitted = fit_prompt(parts, whole - count_tokens(HISTORY_TEXT) // 2, "test")
+    assert set(fitted.trimmed) == {"history"}
+    assert fitted.texts["devices"] == CATALOG_TEXT and fitted.tokens <= fitted.budget
+
+    tight = fit_prompt(parts, count_tokens(CATALOG_TEXT) // 2, "test")
+    assert tight.texts["history"] == "" and "devices" in tight.trimmed
+    assert tight.texts["instructions"] == parts[0].text
+
+    stats = BUDGET_STATS.stats()["test"]
+    assert stats["prompts"] == stats["trimmed_prompts"] == 2
+    assert stats["trimmed_tokens"]["history"] == fitted.trimmed["history"] + tight.trimmed["history"]
+    assert stats["tokens_after"] < stats["tokens_before"]
+
+
+def test_prompts_within_budget_are_untouched():
+    fitted = fit_prompt([Part("history", HISTORY_TEXT, HISTORY)], 100000, "roomy")
+    assert fitted.texts["history"] == HISTORY_TEXT and fitted.trimmed == {}
+
+
+def test_message_history_drops_the_oldest_messages():
+    messages = [SimpleNamespace(content=f"message {i}") for i in range(10)]
+    kept = trim_history(messages, 30)
+    assert kept == messages[-len(kept):] and 0 < len(kept) < 10
+
+
+def test_tool_rows_are_capped_with_a_note():
+    rows = [{"product_name": f"Áo sơ mi {i}", "price": 350000 + i} for i in range(100)]
+    kept = fit_rows(rows, max_tokens=100, site="test.rows")
+    assert kept[:-1] == rows[:len(kept) - 1]
+    assert kept[-1].startswith(f"... {100 - (len(kept) - 1)} more rows omitted")
+    assert fit_rows(rows[:2], max_tokens=100, site="test.rows") == rows[:2]
+
+
+def test_budget_follows_the_model():
+    wrapped = SimpleNamespace(model=SimpleNamespace(model=SimpleNamespace(model_name="gemma-7b-it")))
+    assert model_of(wrapped) == "gemma-7b-it"
+    # AzureChatOpenAI's model_name is a default; the deployment names the model.
+    azure = SimpleNamespace(model_name="gpt-3.5-turbo", deployment_name="gpt-4o")
+    assert model_of(azure) == "gpt-4o"
+    assert budget_for("gemma-7b-it", 100000) == 8192 - 512
+    assert budget_for("unknown-model", 6000) == 6000
@@ -0,0 +1,155 @@
+import asyncio
+import itertools
+import threading
+import time
+
+from shoppinggpt.llm.fake import FakeChatModel, FakeProviderError
+from shoppinggpt.llm.provider_pool import (
+    CLOSED,
+    OPEN,
+    CircuitBreaker,
+    Provider,
+    ProviderHealth,
+    ProviderPool,
+    ProviderPoolError,
+)
+from shoppinggpt.llm.rate_limit import GRANTED_AT, RateLimitExceeded
+
+
+def test_routes_to_fastest_provider():
+    slow = Provider("slow", FakeChatModel("slow", latency=0.02))
+    fast = Provider("fast", FakeChatModel("fast", latency=0.001))
+    pool = ProviderPool([slow, fast])
+    for _ in range(4):
+        pool.invoke("hi")
+    assert pool.ranked()[0].name == "fast"
+    assert pool.invoke("hi").content == "reply from fast"
+
+
+def test_fails_over_and_opens_circuit():
+    broken = Provider(
+        "broken",
+        FakeChatModel("broken", fail_rate=1.0),
+        ProviderHealth(breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60)),
+    )
+    backup = Provider("backup", FakeChatModel("backup", latency=0.001))
+    # No error penalty, so only the breaker keeps "broken" out of rotation.
+    pool = ProviderPool([broken, backup], error_penalty=0)
+    for _ in range(3):
+        assert pool.invoke("hi").content == "reply from backup"
+    assert broken.health.breaker.state == OPEN
+    assert broken.model.calls == 2
+    assert pool.stats()["broken"]["circuit"] == OPEN
+
+
+def test_half_open_probe_closes_circuit():
+    now = itertools.count()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=lambda: next(now))
+    breaker.record_failure()
+    assert not breaker.available()
+    for _ in range(5):
+        breaker.available()
+    assert breaker.acquire()
+    assert not breaker.acquire()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_all_failing_raises():
+    pool = ProviderPool([Provider("a", FakeChatModel("a", fail_rate=1.0))])
+    try:
+        pool.invoke("hi")
+    except ProviderPoolError as e:
+        assert "a failed" in str(e)
+    else:
+        raise AssertionError("expected ProviderPoolError")
+
+
+def test_sync_hedge_uses_backup_for_slow_primary():
+    primary = Provider("primary", FakeChatModel("primary", latency=0.3))
+    backup = Provider("backup", FakeChatModel("backup", latency=0.001))
+    pool = ProviderPool([primary, backup], hedge=True, hedge_delay=0.01)
+    assert pool.invoke("hi").content == "reply from backup"
+    assert backup.health.hedges_won == 1
+
+
+def test_async_hedge_cancels_loser():
+    primary = Provider("primary", FakeChatModel("primary", latency=0.3))
+    backup = Provider("backup", FakeChatModel("backup", latency=0.001))
+    pool = ProviderPool([primary, backup], hedge=True, hedge_delay=0.01)
+    result = asyncio.run(pool.ainvoke("hi"))
+    assert result.content == "reply from backup"
+    assert primary.health.requests == 0
+    assert primary.health.breaker.state == CLOSED
+
+
+def test_async_no_hedge_when_primary_is_fast():
+    primary = Provider("primary", FakeChatModel("primary", latency=0.001))
+    backup = Provider("backup", FakeChatModel("backup", latency=0.001))
+    pool = ProviderPool([primary, backup], hedge=True, hedge_delay=0.2)
+    assert asyncio.run(pool.ainvoke("hi")).content == "reply from primary"
+    assert backup.model.calls == 0
+
+
+def test_bind_shares_health():
+    provider = Provider("p", FakeChatModel("p"))
+    pool = ProviderPool([provider])
+    bound = pool.bind_tools([])
+    bound.invoke("hi")
+    assert provider.health.requests == 1
+
+
+def test_stream_fails_over_before_the_first_chunk():
+    broken = Provider("broken", FakeChatModel("broken", fail_rate=1.0))
+    backup = Provider("backup", FakeChatModel("backup", latency=0.001))
+    pool = ProviderPool([broken, backup], error_penalty=0)
+
+    async def collect():
+        return "".join([chunk.content async for chunk in pool.astream("hi")])
+
+    assert asyncio.run(collect()) == "reply from backup"
+    assert broken.health.failures == 1 and backup.health.requests == 1
+
+
+def test_local_sheds_fail_over_without_hurting_health():
+    class Shedding:
+        def invoke(self, input, config=None):
+            raise RateLimitExceeded("local quota exhausted")
+
+    shed = Provider("shed", Shedding(), ProviderHealth(breaker=CircuitBreaker(failure_threshold=1)))
+    backup = Provider("backup", FakeChatModel("backup", latency=0.001))
+    pool = ProviderPool([shed, backup], error_penalty=0)
+    for _ in range(3):
+        assert pool.invoke("hi").content == "reply from backup"
+    assert shed.health.breaker.state == CLOSED and shed.health.failures == 0
+
+
+def test_latency_excludes_time_queued_in_the_limiter():
+    class Queued:
+        def invoke(self, input, config=None):
+            time.sleep(0.05)  # waiting for quota
+            GRANTED_AT.set(time.perf_counter())
+            return "ok"
+
+    provider = Provider("queued", Queued())
+    ProviderPool([provider]).invoke("hi")
+    assert provider.health.latency < 0.02
+
+
+def test_only_one_thread_claims_the_half_open_probe():
+    clock = itertools.count()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1, clock=lambda: next(clock))
+    breaker.record_failure()
+    barrier = threading.Barrier(16)
+    claimed = []
+
+    def claim():
+        barrier.wait()
+        claimed.append(breaker.acquire())
+
+    threads = [threading.Thread(target=claim) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert claimed.count(True) == 1
@@ -0,0 +1,138 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from shoppinggpt.llm.rate_limit import (
+    RateLimiter,
+    RateLimitExceeded,
+    TokenBucket,
+    estimate_tokens,
+    get_limiter,
+    is_rate_limit_error,
+    retry_after,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    bucket = TokenBucket(60, 1.0, clock)
+    bucket.take(60)
+    assert bucket.wait_time(10) == pytest.approx(10)
+    clock.now = 10
+    assert bucket.wait_time(10) == 0
+
+
+def test_estimate_tokens_counts_messages():
+    assert estimate_tokens("a" * 400) == 101
+    assert estimate_tokens(["a" * 40, {"x": "b" * 40}]) == 22
+
+
+def test_tpm_limit_sheds_when_wait_exceeds_budget():
+    clock = FakeClock()
+    limiter = RateLimiter("test", rpm=100, tpm=1000, max_wait=5, clock=clock)
+    limiter.acquire(900)
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire(900)
+    assert limiter.stats()["shed"] == 1
+    clock.now = 60
+    limiter.acquire(900)
+    assert limiter.stats()["granted"] == 2
+
+
+def test_queue_limit_only_sheds_requests_that_must_wait():
+    limiter = RateLimiter("test", rpm=60, max_queue=0)
+    limiter.acquire()
+    limiter.requests.tokens = 0
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire()
+    assert limiter.stats()["granted"] == 1 and limiter.stats()["waiting"] == 0
+
+
+def test_only_real_rate_limit_errors_are_detected():
+    class RateLimitError(Exception):
+        pass
+
+    http_429 = RuntimeError("Too Many Requests")
+    http_429.status_code = 429
+    assert is_rate_limit_error(http_429)
+    assert is_rate_limit_error(RateLimitError("slow down"))
+    assert is_rate_limit_error(RuntimeError("429 Resource has been exhausted"))
+    assert not is_rate_limit_error(RuntimeError("request 14290 used 1429 tokens"))
+    not_found = RuntimeError("429 mentioned in a 404 body")
+    not_found.status_code = 404
+    assert not is_rate_limit_error(not_found)
+
+
+def test_limits_are_opt_in(monkeypatch):
+    monkeypatch.delenv("GEMINI_RPM", raising=False)
+    monkeypatch.delenv("GEMINI_TPM", raising=False)
+    assert get_limiter("gemini", "m", "key") is None
+    monkeypatch.setenv("GEMINI_RPM", "15")
+    assert get_limiter("gemini", "m", "key").stats()["rpm_available"] == 15
+
+
+def test_retry_after_comes_from_the_error_or_its_headers():
+    error = RuntimeError("429")
+    assert retry_after(error) is None
+    error.response = SimpleNamespace(headers={"retry-after": "7"})
+    assert retry_after(error) == 7
+    error.response.headers["retry-after-ms"] = "1500"
+    assert retry_after(error) == 1.5
+    error.retry_after = 3
+    assert retry_after(error) == 3
+
+
+def test_each_api_key_gets_its_own_limiter(monkeypatch):
+    monkeypatch.setenv("GROQ_RPM", "30")
+    first, second = get_limiter("groq", "m", "key-one"), get_limiter("groq", "m", "key-two")
+    assert first is not second and first is get_limiter("groq", "m", "key-one")
+    assert "key-one" not in first.name
+
+
+def test_settle_refunds_unused_tokens():
+    clock = FakeClock()
+    limiter = RateLimiter("test", tpm=1000, clock=clock)
+    limiter.acquire(800)
+    limiter.settle(800, 100)
+    assert limiter.stats()["tpm_available"] == pytest.approx(900)
+
+
+def test_round_robin_across_sessions():
+    limiter = RateLimiter("test", rpm=6000, max_wait=5)
+    limiter.requests.tokens = 0
+    order = []
+
+    async def request(session, n):
+        await limiter.aacquire(session=session)
+        order.append((session, n))
+
+    async def scenario():
+        tasks = [asyncio.create_task(request("chatty", n)) for n in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("quiet", 0)))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order.index(("quiet", 0)) <= 1
+
+
+def test_sync_waiters_are_released_as_quota_refills():
+    limiter = RateLimiter("test", rpm=600, max_wait=5)
+    limiter.requests.tokens = 0
+    threads = [threading.Thread(target=limiter.acquire) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert limiter.stats()["granted"] == 3
+    assert limiter.stats()["waiting"] == 0
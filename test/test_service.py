@@ -0,0 +1,125 @@
+import asyncio
+
+import shoppinggpt.service
+from shoppinggpt.service import UNKNOWN_ROUTE_RESPONSE, ShoppingAssistant
+from shoppinggpt.tracing import InMemoryExporter, TRACER
+
+
+class FakeChatMemory:
+    def __init__(self):
+        self.messages = []
+
+    def add_user_message(self, message):
+        self.messages.append(("human", message))
+
+    def add_ai_message(self, message):
+        self.messages.append(("ai", message))
+
+
+class FakeMemory:
+    def __init__(self):
+        self.chat_memory = FakeChatMemory()
+
+
+class FakeRouter:
+    def __init__(self, route="other"):
+        self.route = route
+
+    def guide(self, query):
+        if query == "warn":
+            raise RuntimeWarning("invalid value encountered in divide")
+        return self.route
+
+
+class FakeAgent:
+    contexts = []
+
+    def __init__(self, llm, memory, context=None):
+        self.contexts.append(context)
+
+    async def ainvoke(self, query):
+        return {"output": "agent answer"}
+
+
+def make_assistant(route="other", **kwargs):
+    kwargs.setdefault("prefetchers", {})
+    assistant = ShoppingAssistant(memory_factory=FakeMemory, **kwargs)
+    assistant.router = FakeRouter(route)
+    assistant.llm = object()
+    return assistant
+
+
+def prefetcher(result, delay=0.0, log=None):
+    async def fetch(query):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append("cancelled")
+            raise
+        return result
+    return fetch
+
+
+def test_sessions_have_their_own_bounded_memory():
+    assistant = make_assistant(max_sessions=2)
+    assistant.handle_query("hello", "a")
+    assistant.handle_query("hi", "b")
+    assert assistant.memory("a").chat_memory.messages == [("human", "hello"), ("ai", UNKNOWN_ROUTE_RESPONSE)]
+    assistant.memory("c")
+    # "a" was used most recently, so "b" is evicted.
+    assert list(assistant._memories) == ["a", "c"]
+
+
+def test_async_handle_query_matches_sync_and_is_traced():
+    assistant = make_assistant()
+    exporter = InMemoryExporter()
+    TRACER.add_exporter(exporter)
+    try:
+        result = asyncio.run(assistant.ahandle_query("anything"))
+    finally:
+        TRACER.remove_exporter(exporter)
+    assert result == assistant.handle_query("anything") == {"response": UNKNOWN_ROUTE_RESPONSE, "type": "other"}
+    [handled] = [s for s in exporter.spans if s.name == "handle_query"]
+    assert handled.attributes["route"] == "other"
+    assert len(assistant.memory().chat_memory.messages) == 4
+
+
+def test_router_warning_falls_back_to_chitchat():
+    assert make_assistant().guide("warn") == "chitchat"
+
+
+def test_warmup_times_every_step_and_survives_failures():
+    assistant = make_assistant(llm_provider="no-such-provider")
+    timings = assistant.warmup()
+    assert set(timings) == {"llm", "router", "agent", "policy_index", "product_lookup"}
+    assert all(seconds >= 0 for seconds in timings.values())
+
+
+def test_product_turns_hand_prefetched_context_to_the_agent(monkeypatch):
+    monkeypatch.setattr(shoppinggpt.service, "ShoppingAgent", FakeAgent)
+    FakeAgent.contexts = []
+    log = []
+    assistant = make_assistant("products", prefetch_timeout=0.2, prefetchers={
+        "policies": prefetcher(["Returns accepted within 30 days."], delay=0.01),
+        "products": prefetcher([{"product_name": "Áo sơ mi trắng", "price": 350000}]),
+        "slow": prefetcher("never", delay=5, log=log),
+    })
+    result = asyncio.run(assistant.ahandle_query("áo sơ mi trắng, đổi trả thế nào?"))
+    assert result == {"response": "agent answer", "type": "products"}
+    [context] = FakeAgent.contexts
+    assert "Returns accepted within 30 days." in context and "product_name: Áo sơ mi trắng" in context
+    assert "never" not in context and log == ["cancelled"]
+
+
+def test_other_routes_cancel_the_speculative_work():
+    log = []
+    assistant = make_assistant(prefetchers={"policies": prefetcher(["unused"], delay=5, log=log)})
+
+    async def run():
+        result = await assistant.ahandle_query("hi")
+        await asyncio.sleep(0)  # let the cancellation land
+        return result
+
+    assert asyncio.run(run())["type"] == "other"
+    assert log == ["cancelled"]
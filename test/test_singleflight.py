@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from shoppinggpt.llm.singleflight import SingleFlight, request_key
+
+
+def test_sync_calls_are_coalesced():
+    flight = SingleFlight("test")
+    executions = []
+    release = threading.Event()
+
+    def slow_call(prompt):
+        executions.append(prompt)
+        release.wait(1)
+        return prompt.upper()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("k", slow_call, "hi")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    while flight.stats()["calls"] < 8:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["HI"] * 8
+    assert executions == ["hi"]
+    stats = flight.stats()
+    assert stats["executions"] == 1 and stats["coalesced"] == 7 and stats["in_flight"] == 0
+
+
+def test_sync_error_is_shared_and_not_cached():
+    flight = SingleFlight("test")
+
+    def failing():
+        raise RuntimeError("429")
+
+    with pytest.raises(RuntimeError):
+        flight.do("k", failing)
+    assert flight.do("k", lambda: "ok") == "ok"
+    assert flight.stats()["errors"] == 1
+
+
+def test_async_calls_are_coalesced_and_survive_cancellation():
+    flight = SingleFlight("test")
+    executions = []
+
+    async def slow_call(prompt):
+        executions.append(prompt)
+        await asyncio.sleep(0.02)
+        return prompt.upper()
+
+    async def scenario():
+        first = asyncio.create_task(flight.ado("k", slow_call, "hi"))
+        others = [asyncio.create_task(flight.ado("k", slow_call, "hi")) for _ in range(4)]
+        await asyncio.sleep(0)
+        first.cancel()
+        return await asyncio.gather(*others), first
+
+    results, first = asyncio.run(scenario())
+    assert results == ["HI"] * 4
+    assert first.cancelled()
+    assert executions == ["hi"]
+    assert flight.stats()["coalesced"] == 4
+
+
+def test_request_key_depends_on_model_and_prompt():
+    assert request_key("gpt", ["hello"]) == request_key("gpt", ["hello"])
+    assert request_key("gpt", ["hello"]) != request_key("gemini", ["hello"])
+    assert request_key("gpt", ["hello"]) != request_key("gpt", ["hello!"])
+
+
+def test_structured_output_identity_includes_schema_and_steps():
+    pytest.importorskip("langchain_core")
+    from types import SimpleNamespace
+
+    from shoppinggpt.llm.wrappers import model_identity
+
+    chat = SimpleNamespace(model_name="gpt-4o", temperature=0)
+
+    def structured(schema):
+        bound = SimpleNamespace(bound=chat, kwargs={"tools": [{"name": schema}]})
+        parser = SimpleNamespace(dict=lambda: {"key_name": schema, "first_tool_only": True})
+        return SimpleNamespace(steps=[bound, parser])
+
+    assert model_identity(structured("Recommendation")) == model_identity(structured("Recommendation"))
+    assert model_identity(structured("Recommendation")) != model_identity(structured("Router"))
+    assert model_identity(structured("Recommendation")) != model_identity(chat)
+    assert model_identity(SimpleNamespace(steps=[chat, object()])) is None
+
+
+def test_azure_deployments_have_distinct_identities():
+    pytest.importorskip("langchain_core")
+    from types import SimpleNamespace
+
+    from shoppinggpt.llm.wrappers import model_identity
+
+    def azure(deployment):
+        return SimpleNamespace(model_name="gpt-3.5-turbo", deployment_name=deployment, temperature=0)
+
+    assert model_identity(azure("gpt4o-prod")) != model_identity(azure("gpt35-cheap"))
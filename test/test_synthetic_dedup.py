@@ -0,0 +1,37 @@
+from shoppinggpt.synthetic.dedup import MinHash, NearDuplicateFilter, shingles
+
+CONVERSATION = (
+    "Human: Chào bạn, tôi đang tìm một chiếc áo khoác cho mùa đông.\n"
+    "AI: Xin chào! Bạn thích áo khoác lông vũ hay áo khoác dạ?\n"
+    "Human: Tôi nghĩ áo khoác lông vũ sẽ phù hợp, size M màu xanh đậm.\n"
+    "AI: Chúng tôi có mẫu áo khoác lông vũ màu xanh đậm size M của thương hiệu ABC."
+)
+
+
+def test_shingles_ignore_speaker_tags_and_punctuation():
+    assert shingles("Human: Xin chào bạn!") == shingles("xin chào, bạn")
+
+
+def test_signature_similarity_tracks_jaccard():
+    minhash = MinHash()
+    a = shingles(CONVERSATION)
+    b = shingles(CONVERSATION.replace("size M", "size L"))
+    estimate = MinHash.similarity(minhash.signature(a), minhash.signature(b))
+    assert abs(estimate - len(a & b) / len(a | b)) < 0.15
+
+
+def test_filter_rejects_near_duplicates_and_tracks_rates():
+    dedup = NearDuplicateFilter()
+    assert dedup.check(CONVERSATION, "product")
+    assert not dedup.check(CONVERSATION.replace("Xin chào!", "Chào bạn!"), "product")
+    assert dedup.check("Human: Hôm nay trời đẹp quá.\nAI: Đúng vậy, rất hợp để đi dạo công viên.", "chitchat")
+    rates = dedup.rates()
+    assert rates["product"] == {"accepted": 1, "rejected": 1, "reject_rate": 0.5}
+    assert rates["chitchat"]["rejected"] == 0
+    assert len(dedup) == 2
+
+
+def test_seeded_records_block_regeneration():
+    dedup = NearDuplicateFilter()
+    dedup.add(CONVERSATION)
+    assert not dedup.check(CONVERSATION, "product")
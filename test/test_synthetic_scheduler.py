@@ -0,0 +1,71 @@
+import asyncio
+
+from shoppinggpt.synthetic.scheduler import QuotaScheduler, Slot
+
+
+class RateLimited(Exception):
+    status_code = 429
+    retry_after = 0.01
+
+
+def run(slots, remaining, generate, accept=lambda record: True):
+    scheduler = QuotaScheduler(slots, remaining, generate, accept, tokens_per_request=10)
+    asyncio.run(scheduler.run())
+    return scheduler
+
+
+def test_stops_exactly_at_target_per_category():
+    written = []
+
+    async def generate(slot, category):
+        await asyncio.sleep(0.001)
+        return {"category": category, "slot": slot.name}, 10
+
+    def accept(record):
+        written.append(record)
+        return True
+
+    slots = [Slot(f"m{i}", "key-0001", rpm=6000, tpm=10 ** 6, daily_limit=10 ** 6) for i in range(3)]
+    scheduler = run(slots, {"product": 7, "chitchat": 6}, generate, accept)
+    assert len(written) == 13
+    assert sum(r["category"] == "product" for r in written) == 7
+    assert scheduler.remaining == {"product": 0, "chitchat": 0}
+    assert len({r["slot"] for r in written}) == 3
+
+
+def test_rejected_records_are_regenerated():
+    calls = []
+
+    async def generate(slot, category):
+        calls.append(category)
+        return {"category": category, "n": len(calls)}, None
+
+    accepted = run(
+        [Slot("m", "key-0001", rpm=6000, tpm=10 ** 6, daily_limit=10 ** 6)],
+        {"product": 3},
+        generate,
+        accept=lambda record: record["n"] % 2 == 0,
+    )
+    assert accepted.remaining == {"product": 0}
+    assert len(calls) >= 6
+
+
+def test_backs_off_on_429_and_uses_other_slot():
+    async def generate(slot, category):
+        if slot.model == "limited":
+            raise RateLimited("429 Too Many Requests")
+        return {"category": category}, 10
+
+    limited = Slot("limited", "key-0001", rpm=6000, tpm=10 ** 6, daily_limit=10 ** 6)
+    healthy = Slot("healthy", "key-0001", rpm=6000, tpm=10 ** 6, daily_limit=10 ** 6)
+    scheduler = run([limited, healthy], {"product": 5}, generate)
+    assert scheduler.rate_limited >= 1
+    assert healthy.completed == 5
+    assert limited.failures >= 1
+
+
+def test_daily_limit_blocks_slot():
+    slot = Slot("m", "key-0001", rpm=30, tpm=14400, daily_limit=100)
+    slot.reserve(100)
+    slot.settle(100, 100)
+    assert slot.ready_in(50) > 60
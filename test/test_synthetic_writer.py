@@ -0,0 +1,61 @@
+import json
+
+from shoppinggpt.synthetic.writer import (
+    JSONLWriter,
+    iter_jsonl,
+    jsonl_to_json,
+    remaining_per_category,
+)
+
+
+def test_writer_appends_and_resumes_after_torn_write(tmp_path):
+    path = str(tmp_path / "conversations.jsonl")
+    with JSONLWriter(path, fsync_every=1) as writer:
+        writer.write({"conversation": "Xin chào", "category": "product"})
+        writer.write({"conversation": "Hi", "category": "chitchat"})
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"conversation": "cut of')
+
+    with JSONLWriter(path) as writer:
+        assert writer.counts == {"product": 1, "chitchat": 1}
+        writer.write({"conversation": "again", "category": "product"})
+
+    assert [r["conversation"] for r in iter_jsonl(path)] == ["Xin chào", "Hi", "again"]
+
+
+def test_corrupt_line_mid_file_is_skipped_not_truncated(tmp_path):
+    path = tmp_path / "conversations.jsonl"
+    path.write_text('{"category": "product"}\n{"category": "prod\n{"category": "chitchat"}\n'
+                    '{"category": "product"}', encoding="utf-8")
+
+    with JSONLWriter(str(path)) as writer:
+        assert writer.counts == {"product": 2, "chitchat": 1} and writer.corrupt == 1
+        writer.write({"category": "chitchat"})
+
+    assert [r["category"] for r in iter_jsonl(str(path))] == ["product", "chitchat", "product", "chitchat"]
+
+
+def test_records_missing_a_required_field_count_as_corrupt(tmp_path):
+    path = tmp_path / "conversations.jsonl"
+    path.write_text('{"category": "product", "conversation": "a"}\n{"category": "product"}\n[1, 2]\n'
+                    '{"category": "chitchat"}', encoding="utf-8")
+    required = ("category", "conversation")
+
+    with JSONLWriter(str(path), required=required) as writer:
+        assert writer.counts == {"product": 1} and writer.corrupt == 3
+
+    assert [r["conversation"] for r in iter_jsonl(str(path), required)] == ["a"]
+
+
+def test_remaining_per_category_skips_existing():
+    remaining = remaining_per_category({"product": 400}, ["product", "chitchat"], 1001)
+    assert remaining == {"product": 101, "chitchat": 500}
+
+
+def test_jsonl_to_json_matches_legacy_format(tmp_path):
+    records = [{"conversation": "Xin chào\nAI: Chào bạn", "category": "chitchat"}]
+    src = tmp_path / "conversations.jsonl"
+    src.write_text("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records), encoding="utf-8")
+    dst = jsonl_to_json(str(src))
+    with open(dst, encoding="utf-8") as f:
+        assert f.read() == json.dumps(records, ensure_ascii=False, indent=4)
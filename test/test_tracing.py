@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from shoppinggpt.tracing import Histogram, InMemoryExporter, Tracer, current_span, otlp_payload
+
+
+@pytest.fixture
+def tracer():
+    tracer = Tracer()
+    exporter = InMemoryExporter()
+    tracer.add_exporter(exporter)
+    tracer.exporter = exporter
+    return tracer
+
+
+def test_nested_spans_share_trace_and_link_parents(tracer):
+    with tracer.span("handle_query") as root:
+        with tracer.span("router.guide") as child:
+            assert current_span() is child
+        root.set_attribute("route", "products")
+    assert current_span() is None
+
+    guide, handle = tracer.exporter.spans
+    assert (guide.name, handle.name) == ("router.guide", "handle_query")
+    assert guide.trace_id == handle.trace_id and guide.parent_id == handle.span_id
+    assert handle.parent_id is None and handle.attributes == {"route": "products"}
+
+
+def test_decorator_records_errors_for_sync_and_async(tracer):
+    @tracer.traced("tool.fail")
+    def fail():
+        raise ValueError("boom")
+
+    @tracer.traced()
+    async def fetch():
+        with tracer.span("llm.invoke"):
+            return 42
+
+    with pytest.raises(ValueError):
+        fail()
+    assert asyncio.run(fetch()) == 42
+
+    failed, llm, fetched = tracer.exporter.spans
+    assert failed.error == "ValueError: boom"
+    assert llm.parent_id == fetched.span_id and fetched.name.endswith("fetch")
+    assert tracer.stats()["tool.fail"]["errors"] == 1
+
+
+def test_otlp_payload_shape(tracer):
+    with tracer.span("policy_search.faiss_search", k=5, cached=False):
+        pass
+    (span,) = otlp_payload(tracer.exporter.spans)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(span["traceId"]) == 32 and len(span["spanId"]) == 16
+    assert {"key": "k", "value": {"intValue": "5"}} in span["attributes"]
+    assert {"key": "cached", "value": {"boolValue": False}} in span["attributes"]
+    assert span["status"] == {"code": 1}
+    assert int(span["endTimeUnixNano"]) >= int(span["startTimeUnixNano"])
+
+
+def test_prometheus_histogram_is_cumulative(tracer):
+    for _ in range(3):
+        with tracer.span("router.guide"):
+            pass
+    text = tracer.render_prometheus()
+    assert 'shoppinggpt_span_duration_seconds_bucket{span="router.guide",le="+Inf"} 3' in text
+    assert 'shoppinggpt_span_duration_seconds_count{span="router.guide"} 3' in text
+    assert 'shoppinggpt_span_errors_total{span="router.guide"} 0' in text
+    buckets = [
+        int(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+        if line.startswith('shoppinggpt_span_duration_seconds_bucket{span="router.guide"')
+    ]
+    assert buckets == sorted(buckets)
+
+
+def test_histogram_quantiles_use_bucket_bounds():
+    histogram = Histogram()
+    for seconds in [0.003] * 90 + [0.2] * 9 + [50.0]:
+        histogram.observe(seconds)
+    assert histogram.quantile(0.5) == 0.005
+    assert histogram.quantile(0.95) == 0.25
+    assert histogram.quantile(1.0) == float("inf")